@@ -9,18 +9,38 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import tkinterdnd2 as tkdnd
+import multiprocessing
 import subprocess
 import os
 import threading
-import re
-import json
-from pathlib import Path
-import cv2
-from PIL import Image, ImageTk
 import time
 
+import app_deps
+import frame_batch
+import frame_engine
+import media_probe
+
+
+VIDEO_FILETYPES = [
+    ('视频文件', ' '.join('*' + ext for ext in frame_engine.VIDEO_EXTENSIONS)),
+    ('所有文件', '*.*')
+]
+
+
+def format_timestamp(seconds):
+    """把秒数格式化为mm:ss.xx，用于显示区间"""
+    return f"{frame_engine.format_duration(seconds)}.{int(seconds * 100) % 100:02d}"
+
 
 class VideoFrameConverter:
+    # 预览预读缓冲区：最多缓存的帧数和内存上限
+    PREVIEW_BUFFER_FRAMES = 32
+    PREVIEW_BUFFER_MB = 256
+    # 拖动预览的帧缓存上限
+    PREVIEW_CACHE_MB = 128
+    # 转换进度刷新间隔（毫秒）
+    PROGRESS_INTERVAL = 200
+    
     def __init__(self):
         self.root = tkdnd.Tk()  # 支持拖拽的根窗口
         self.root.title("视频转序列帧工具")
@@ -32,9 +52,13 @@ class VideoFrameConverter:
         
         # 变量初始化
         self.video_file = None
+        self.preview_file = None  # 预览读取的文件：原视频或预览代理
+        self.proxy_builder = None  # 后台生成预览代理
         self.original_fps = None
-        self.conversion_process = None
+        self.conversion_job = None
+        self.conversion_progress = None  # 后台线程写入的最新进度
         self.is_converting = False
+        self.batch_window = None
         
         # 视频播放相关变量
         self.cap = None
@@ -43,18 +67,33 @@ class VideoFrameConverter:
         self.total_frames = 0
         self.video_thread = None
         self.video_fps = 30
+        self.decoder = None  # 播放用的顺序解码器
+        self.decoder_position = 0  # 解码器下一帧的帧号
+        self.frame_cache = None  # 拖动预览的帧缓存，首次打开视频时创建
+        self.renderer = None  # 预览画面绘制，首次打开视频时创建
+        self.scrubber = None  # 拖动进度条用的精确帧解码器
+        self.pending_frame = None  # 等待界面线程显示的最新帧
+        self.pending_lock = threading.Lock()
+        self.play_token = 0
+        
+        # 提取区间（秒），由播放器的入点/出点按钮设置
+        self.ranges = []
+        self.mark_in = None
+        
+        # 附加输出（与主输出共用一次解码）
+        self.targets = []
         
         # 创建变量
         self.setup_variables()
         
-        # 检查FFmpeg和OpenCV
-        self.check_dependencies()
-        
         # 创建界面
         self.create_interface()
         
         # 绑定事件
         self.bind_events()
+        
+        # 窗口显示后在后台检查FFmpeg和OpenCV
+        self.root.after_idle(self.check_dependencies)
     
     def setup_styles(self):
         """设置界面样式"""
@@ -75,34 +114,82 @@ class VideoFrameConverter:
         """初始化界面变量"""
         self.fps_var = tk.StringVar(value="30")
         self.format_var = tk.StringVar(value="png")
+        self.size_var = tk.StringVar(value="")
+        self.quality_var = tk.StringVar(value="")
+        self.compression_var = tk.StringVar(value="")
+        self.png_pred_var = tk.StringVar(value="默认")
+        self.target_format_var = tk.StringVar(value="jpg")
+        self.target_size_var = tk.StringVar(value="512")
+        self.target_quality_var = tk.StringVar(value="")
+        self.target_folder_var = tk.StringVar(value="512")
         self.prefix_var = tk.StringVar(value="")
         self.start_num_var = tk.StringVar(value="1")
         self.digits_var = tk.StringVar(value="3")
         self.output_folder_var = tk.StringVar(value="")
+        self.workers_var = tk.StringVar(value="1")
+        self.resume_var = tk.BooleanVar(value=False)
+        self.pack_var = tk.StringVar(value="不打包")
+        self.atlas_var = tk.BooleanVar(value=False)
+        self.atlas_columns_var = tk.StringVar(value="0")
+        self.atlas_max_size_var = tk.StringVar(value=str(frame_engine.DEFAULT_ATLAS_MAX_SIZE))
+        self.atlas_padding_var = tk.StringVar(value=str(frame_engine.DEFAULT_ATLAS_PADDING))
+        self.atlas_trim_var = tk.BooleanVar(value=False)
+        self.pool_engine_var = tk.BooleanVar(value=False)
+        self.proxy_var = tk.BooleanVar(value=False)
+        self.mode_var = tk.StringVar(value=frame_engine.MODE_TEXT[frame_engine.MODE_FPS])
+        self.scene_threshold_var = tk.StringVar(
+            value=str(frame_engine.DEFAULT_SCENE_THRESHOLD))
+        self.stride_var = tk.StringVar(value=str(frame_engine.DEFAULT_STRIDE))
+        self.frame_list_var = tk.StringVar(value="")
+        self.dedupe_var = tk.BooleanVar(value=False)
+        self.per_range_numbering_var = tk.BooleanVar(value=False)
+        self.dedupe_threshold_var = tk.StringVar(
+            value=str(frame_engine.DEFAULT_DEDUPE_THRESHOLD))
         self.status_var = tk.StringVar(value="等待开始转换")
         self.progress_var = tk.DoubleVar(value=0)
     
     def check_dependencies(self):
-        """检查FFmpeg和OpenCV是否安装"""
-        # 检查FFmpeg
-        try:
-            result = subprocess.run(['ffmpeg', '-version'], 
-                                  capture_output=True, text=True, timeout=5)
-            if result.returncode == 0:
-                print("FFmpeg检测成功")
-            else:
-                raise FileNotFoundError
-        except (FileNotFoundError, subprocess.TimeoutExpired):
-            messagebox.showerror("错误", "请先安装FFmpeg并配置环境变量\n"
-                               "下载地址: https://ffmpeg.org/download.html")
-        
-        # 检查OpenCV
-        try:
-            import cv2
-            print("OpenCV检测成功")
-        except ImportError:
-            messagebox.showerror("错误", "请先安装OpenCV库\n"
-                               "安装命令: pip install opencv-python")
+        """在后台检查FFmpeg、FFprobe和OpenCV（结果跨启动缓存），不阻塞窗口显示"""
+        app_deps.check_dependencies_async(
+            lambda results: self.root.after(0, self.show_dependency_results, results))
+    
+    def show_dependency_results(self, results):
+        """显示依赖检查结果，缺少时提示安装"""
+        print("，".join(dependency.describe() for dependency in results.values()))
+        messages = app_deps.missing_messages(results)
+        if messages:
+            messagebox.showerror("错误", "\n\n".join(messages))
+        elif results[app_deps.DEP_FFMPEG].available:
+            self.apply_ffmpeg_capabilities(frame_engine.ffmpeg_capabilities())
+    
+    def apply_ffmpeg_capabilities(self, caps):
+        """只启用本机FFmpeg支持的输出格式和去重滤镜"""
+        if caps is None:
+            return
+        print(caps.describe())
+        formats = frame_engine.supported_formats(caps)
+        for combo, var in ((self.format_combo, self.format_var),
+                           (self.target_format_combo, self.target_format_var)):
+            combo.configure(values=formats)
+            if formats and var.get() not in formats:
+                var.set(formats[0])
+        self.on_format_changed()
+        if not caps.has_filter('mpdecimate'):
+            self.dedupe_var.set(False)
+            self.dedupe_check.configure(state='disabled')
+            self.on_mode_changed()
+    
+    def ensure_preview(self):
+        """首次打开视频时加载OpenCV/PIL并创建预览缓存和画面绘制，返回cv2模块"""
+        # OpenCV和PIL加载较慢，仅在打开视频时导入，不影响启动速度
+        import cv2
+        from preview_cache import LRUFrameCache
+        from preview_render import FrameRenderer
+        if self.frame_cache is None:
+            self.frame_cache = LRUFrameCache(self.PREVIEW_CACHE_MB * 1024 * 1024)
+        if self.renderer is None:
+            self.renderer = FrameRenderer(self.video_canvas)
+        return cv2
     
     def create_interface(self):
         """创建主界面"""
@@ -173,6 +260,7 @@ class VideoFrameConverter:
         # 视频画布
         self.video_canvas = tk.Canvas(self.video_frame, bg='black', highlightthickness=0)
         self.video_canvas.pack(fill='both', expand=True)
+        self.video_canvas.bind('<Configure>', self.on_canvas_resize)
         
         # 关闭按钮
         self.close_btn = tk.Button(self.video_frame, text="✕", 
@@ -194,6 +282,16 @@ class VideoFrameConverter:
                                  command=self.toggle_play)
         self.play_btn.pack(side='left', padx=10, pady=8)
         
+        # 入点/出点：把当前帧设为提取区间的开始和结束
+        mark_in_btn = tk.Button(control_frame, text="[", width=2, relief='flat',
+                                bg='#34495e', fg='white', font=('Microsoft YaHei', 10, 'bold'),
+                                command=self.set_mark_in)
+        mark_in_btn.pack(side='left', pady=8)
+        mark_out_btn = tk.Button(control_frame, text="]", width=2, relief='flat',
+                                 bg='#34495e', fg='white', font=('Microsoft YaHei', 10, 'bold'),
+                                 command=self.set_mark_out)
+        mark_out_btn.pack(side='left', padx=(2, 0), pady=8)
+        
         # 进度条
         self.video_progress_var = tk.DoubleVar()
         self.video_progress = ttk.Scale(control_frame, from_=0, to=100, 
@@ -209,9 +307,22 @@ class VideoFrameConverter:
         self.time_label.pack(side='right', padx=10, pady=8)
         
         # 选择文件按钮
-        select_btn = ttk.Button(import_frame, text="选择视频文件",
+        button_frame = ttk.Frame(import_frame)
+        button_frame.pack(pady=10)
+        
+        select_btn = ttk.Button(button_frame, text="选择视频文件",
                                command=self.select_video_file)
-        select_btn.pack(pady=10)
+        select_btn.pack(side='left', padx=5)
+        
+        batch_btn = ttk.Button(button_frame, text="批量队列",
+                              command=self.show_batch_window)
+        batch_btn.pack(side='left', padx=5)
+        
+        # 大分辨率视频在后台生成低分辨率代理用于预览，提取仍使用原视频
+        proxy_check = ttk.Checkbutton(button_frame, text="预览代理",
+                                      variable=self.proxy_var,
+                                      command=self.on_proxy_changed)
+        proxy_check.pack(side='left', padx=5)
         
         # 导入成功显示区
         self.success_frame = ttk.Frame(import_frame)
@@ -265,16 +376,116 @@ class VideoFrameConverter:
         
         # 参数预览
         self.create_preview_section(right_frame)
+        
+        # 提取区间
+        self.create_range_section(right_frame)
     
     def create_fps_config(self, parent):
         """创建帧率配置"""
         fps_frame = ttk.LabelFrame(parent, text="帧率设置", padding=10)
         fps_frame.pack(fill='x', pady=5)
         
-        fps_entry = ttk.Entry(fps_frame, textvariable=self.fps_var, width=15)
-        fps_entry.pack(side='left')
-        
-        ttk.Label(fps_frame, text="fps").pack(side='left', padx=(5, 0))
+        rate_row = ttk.Frame(fps_frame)
+        rate_row.pack(fill='x')
+        
+        self.fps_entry = ttk.Entry(rate_row, textvariable=self.fps_var, width=15)
+        self.fps_entry.pack(side='left')
+        
+        ttk.Label(rate_row, text="fps").pack(side='left', padx=(5, 0))
+        
+        # 并行分段进程数
+        workers_spin = ttk.Spinbox(rate_row, textvariable=self.workers_var,
+                                   from_=1, to=os.cpu_count() or 1, width=4)
+        workers_spin.pack(side='right')
+        ttk.Label(rate_row, text="并行进程:").pack(side='right', padx=(0, 5))
+        
+        # 进程池编码：FFmpeg只解码，由多个进程并行编码图片
+        ttk.Checkbutton(rate_row, text="多进程编码",
+                        variable=self.pool_engine_var).pack(side='right', padx=(0, 10))
+        
+        # 取帧方式：按帧率 / 仅关键帧 / 场景切换 / 每N帧 / 指定帧
+        mode_row = ttk.Frame(fps_frame)
+        mode_row.pack(fill='x', pady=(8, 0))
+        
+        ttk.Label(mode_row, text="取帧方式:").pack(side='left')
+        mode_combo = ttk.Combobox(mode_row, textvariable=self.mode_var, width=10,
+                                  values=[frame_engine.MODE_TEXT[mode]
+                                          for mode in frame_engine.MODES],
+                                  state='readonly')
+        mode_combo.pack(side='left', padx=(5, 0))
+        mode_combo.bind('<<ComboboxSelected>>', self.on_mode_changed)
+        
+        self.scene_threshold_entry = ttk.Entry(
+            mode_row, textvariable=self.scene_threshold_var, width=6, state='disabled')
+        self.scene_threshold_entry.pack(side='right')
+        ttk.Label(mode_row, text="场景阈值:").pack(side='right', padx=(0, 5))
+        
+        # 每N帧的间隔；指定帧的帧号/时间点列表，或从文件读取
+        select_row = ttk.Frame(fps_frame)
+        select_row.pack(fill='x', pady=(8, 0))
+        
+        ttk.Label(select_row, text="间隔N:").pack(side='left')
+        self.stride_entry = ttk.Entry(select_row, textvariable=self.stride_var, width=5,
+                                      state='disabled')
+        self.stride_entry.pack(side='left', padx=(5, 10))
+        
+        ttk.Label(select_row, text="指定帧:").pack(side='left')
+        self.frame_list_button = ttk.Button(select_row, text="文件...", width=6,
+                                            command=self.select_frame_list_file,
+                                            state='disabled')
+        self.frame_list_button.pack(side='right')
+        self.frame_list_entry = ttk.Entry(select_row, textvariable=self.frame_list_var,
+                                          state='disabled')
+        self.frame_list_entry.pack(side='left', fill='x', expand=True, padx=(5, 5))
+        
+        # 去除与上一保留帧几乎相同的帧，并在输出文件夹中写入清单
+        dedupe_row = ttk.Frame(fps_frame)
+        dedupe_row.pack(fill='x', pady=(8, 0))
+        
+        self.dedupe_check = ttk.Checkbutton(dedupe_row, text="去除重复帧",
+                                            variable=self.dedupe_var,
+                                            command=self.on_mode_changed)
+        self.dedupe_check.pack(side='left')
+        self.dedupe_threshold_entry = ttk.Entry(
+            dedupe_row, textvariable=self.dedupe_threshold_var, width=6, state='disabled')
+        self.dedupe_threshold_entry.pack(side='right')
+        ttk.Label(dedupe_row, text="差异阈值:").pack(side='right', padx=(0, 5))
+    
+    def selected_mode(self):
+        """当前选择的取帧方式"""
+        for mode, text in frame_engine.MODE_TEXT.items():
+            if text == self.mode_var.get():
+                return mode
+        return frame_engine.MODE_FPS
+    
+    def on_mode_changed(self, event=None):
+        """切换取帧方式时启用对应的参数输入"""
+        mode = self.selected_mode()
+        self.fps_entry.configure(
+            state='normal' if mode == frame_engine.MODE_FPS else 'disabled')
+        self.scene_threshold_entry.configure(
+            state='normal' if mode == frame_engine.MODE_SCENE else 'disabled')
+        self.stride_entry.configure(
+            state='normal' if mode == frame_engine.MODE_STRIDE else 'disabled')
+        for widget in (self.frame_list_entry, self.frame_list_button):
+            widget.configure(state='normal' if mode == frame_engine.MODE_LIST else 'disabled')
+        self.dedupe_threshold_entry.configure(
+            state='normal' if self.dedupe_var.get() else 'disabled')
+    
+    def select_frame_list_file(self):
+        """从帧列表文件（每行一个帧号或时间点，也可逗号分隔）读入指定帧"""
+        filename = filedialog.askopenfilename(
+            title="选择帧列表文件",
+            filetypes=[("文本文件", "*.txt *.csv"), ("所有文件", "*.*")])
+        if not filename:
+            return
+        try:
+            with open(filename, 'r', encoding='utf-8') as f:
+                lines = [line.split('#')[0].strip() for line in f]
+        except (OSError, UnicodeDecodeError) as e:
+            messagebox.showerror("错误", f"读取帧列表文件失败：{e}")
+            return
+        self.frame_list_var.set(", ".join(line for line in lines if line))
     
     def create_prefix_config(self, parent):
         """创建前缀配置"""
@@ -311,9 +522,115 @@ class VideoFrameConverter:
         format_frame = ttk.LabelFrame(parent, text="输出格式", padding=10)
         format_frame.pack(fill='x', pady=5)
         
-        format_combo = ttk.Combobox(format_frame, textvariable=self.format_var,
-                                   values=['png', 'jpg', 'jpeg'], state='readonly')
-        format_combo.pack(fill='x')
+        # 主输出：格式、长边尺寸（空为原尺寸）、JPG质量（空为默认）
+        main_row = ttk.Frame(format_frame)
+        main_row.pack(fill='x')
+        
+        self.format_combo = ttk.Combobox(main_row, textvariable=self.format_var, width=6,
+                                         values=frame_engine.OUTPUT_FORMATS, state='readonly')
+        self.format_combo.pack(side='left')
+        self.format_combo.bind('<<ComboboxSelected>>', self.on_format_changed)
+        ttk.Entry(main_row, textvariable=self.quality_var, width=5).pack(side='right')
+        ttk.Label(main_row, text="质量:").pack(side='right', padx=(10, 5))
+        ttk.Entry(main_row, textvariable=self.size_var, width=6).pack(side='right')
+        ttk.Label(main_row, text="长边:").pack(side='right', padx=(0, 5))
+        
+        # 编码参数：压缩级别（空为默认）、PNG行预测方式
+        encoder_row = ttk.Frame(format_frame)
+        encoder_row.pack(fill='x', pady=(5, 0))
+        
+        ttk.Label(encoder_row, text="压缩级别:").pack(side='left')
+        self.compression_entry = ttk.Entry(encoder_row, textvariable=self.compression_var,
+                                           width=5)
+        self.compression_entry.pack(side='left', padx=(5, 0))
+        self.png_pred_combo = ttk.Combobox(encoder_row, textvariable=self.png_pred_var,
+                                           width=7, state='readonly',
+                                           values=["默认"] + frame_engine.PNG_PREDICTIONS)
+        self.png_pred_combo.pack(side='right')
+        ttk.Label(encoder_row, text="PNG预测:").pack(side='right', padx=(0, 5))
+        
+        # 当前格式的速度/体积说明
+        self.format_hint = ttk.Label(format_frame, font=('Microsoft YaHei', 8),
+                                     foreground='#7f8c8d',
+                                     text=frame_engine.FORMAT_HINTS[self.format_var.get()])
+        self.format_hint.pack(anchor='w', pady=(5, 0))
+        
+        # 图集输出：帧直接排入图集图片，列数为0时按最大边长排满
+        atlas_row = ttk.Frame(format_frame)
+        atlas_row.pack(fill='x', pady=(5, 0))
+        
+        ttk.Checkbutton(atlas_row, text="图集", variable=self.atlas_var).pack(side='left')
+        ttk.Label(atlas_row, text="列数:").pack(side='left', padx=(5, 2))
+        ttk.Entry(atlas_row, textvariable=self.atlas_columns_var, width=4).pack(side='left')
+        ttk.Label(atlas_row, text="最大边长:").pack(side='left', padx=(5, 2))
+        ttk.Entry(atlas_row, textvariable=self.atlas_max_size_var, width=5).pack(side='left')
+        ttk.Label(atlas_row, text="间距:").pack(side='left', padx=(5, 2))
+        ttk.Entry(atlas_row, textvariable=self.atlas_padding_var, width=3).pack(side='left')
+        ttk.Checkbutton(atlas_row, text="裁边",
+                        variable=self.atlas_trim_var).pack(side='right')
+        
+        # 附加输出列表：同一次解码同时输出其他尺寸和格式
+        self.target_listbox = tk.Listbox(format_frame, height=2, font=('Microsoft YaHei', 9))
+        self.target_listbox.pack(fill='x', pady=(8, 0))
+        
+        target_row = ttk.Frame(format_frame)
+        target_row.pack(fill='x', pady=(5, 0))
+        
+        self.target_format_combo = ttk.Combobox(
+            target_row, textvariable=self.target_format_var, width=5,
+            values=frame_engine.OUTPUT_FORMATS, state='readonly')
+        self.target_format_combo.pack(side='left')
+        ttk.Label(target_row, text="长边:").pack(side='left', padx=(5, 2))
+        ttk.Entry(target_row, textvariable=self.target_size_var, width=5).pack(side='left')
+        ttk.Label(target_row, text="质量:").pack(side='left', padx=(5, 2))
+        ttk.Entry(target_row, textvariable=self.target_quality_var, width=4).pack(side='left')
+        ttk.Label(target_row, text="子文件夹:").pack(side='left', padx=(5, 2))
+        ttk.Entry(target_row, textvariable=self.target_folder_var,
+                  width=8).pack(side='left', fill='x', expand=True)
+        
+        ttk.Button(target_row, text="删除", width=5,
+                   command=self.remove_selected_target).pack(side='right')
+        ttk.Button(target_row, text="添加", width=5,
+                   command=self.add_target).pack(side='right', padx=(5, 5))
+    
+    def on_format_changed(self, event=None):
+        """切换输出格式时更新说明，并只启用该格式支持的编码参数"""
+        ext = self.format_var.get()
+        self.format_hint.configure(text=frame_engine.FORMAT_HINTS.get(ext, ""))
+        if ext not in frame_engine.COMPRESSION_LEVELS:
+            self.compression_var.set("")
+        self.compression_entry.configure(
+            state='normal' if ext in frame_engine.COMPRESSION_LEVELS else 'disabled')
+        self.png_pred_combo.configure(state='readonly' if ext == 'png' else 'disabled')
+    
+    def add_target(self):
+        """按输入的格式、尺寸、质量和子文件夹添加一路附加输出"""
+        try:
+            size = int(self.target_size_var.get() or 0)
+            quality = self.target_quality_var.get().strip()
+            quality = int(quality) if quality else None
+        except ValueError:
+            messagebox.showerror("参数错误", "请检查附加输出的尺寸和质量")
+            return
+        folder = self.target_folder_var.get().strip()
+        if not folder:
+            messagebox.showwarning("提示", "请输入附加输出的子文件夹")
+            return
+        self.targets.append(frame_engine.OutputTarget(
+            folder, format_ext=self.target_format_var.get(), size=size, quality=quality))
+        self.refresh_targets()
+    
+    def remove_selected_target(self):
+        """删除选中的附加输出"""
+        for index in reversed(self.target_listbox.curselection()):
+            del self.targets[index]
+        self.refresh_targets()
+    
+    def refresh_targets(self):
+        """刷新附加输出列表"""
+        self.target_listbox.delete(0, tk.END)
+        for target in self.targets:
+            self.target_listbox.insert(tk.END, target.describe())
     
     def create_folder_config(self, parent):
         """创建文件夹配置"""
@@ -330,6 +647,16 @@ class VideoFrameConverter:
                                command=self.select_output_folder)
         browse_btn.pack(side='right', padx=(5, 0))
         
+        # 续转：跳过输出文件夹中已转换的帧；打包：所有帧写入单个归档文件
+        option_row = ttk.Frame(folder_frame)
+        option_row.pack(fill='x', pady=(5, 0))
+        
+        ttk.Checkbutton(option_row, text="续转（跳过已存在的帧）",
+                        variable=self.resume_var).pack(side='left')
+        ttk.Combobox(option_row, textvariable=self.pack_var, width=8, state='readonly',
+                     values=["不打包"] + frame_engine.PACK_FORMATS).pack(side='right')
+        ttk.Label(option_row, text="打包输出:").pack(side='right', padx=(0, 5))
+        
         # 提示信息
         self.folder_tip = ttk.Label(folder_frame, text="请选择输出文件夹", 
                                    foreground='red', font=('Microsoft YaHei', 8))
@@ -350,6 +677,78 @@ class VideoFrameConverter:
                                       font=('Microsoft YaHei', 10, 'bold'))
         self.preview_label.pack(anchor='w', padx=10, pady=(0, 5))
     
+    def create_range_section(self, parent):
+        """创建提取区间列表"""
+        range_frame = ttk.LabelFrame(parent, text="提取区间（播放器中用 [ ] 设置入点/出点）",
+                                     padding=10)
+        range_frame.pack(fill='x', pady=5)
+        
+        self.range_listbox = tk.Listbox(range_frame, height=3, font=('Microsoft YaHei', 9))
+        self.range_listbox.pack(fill='x')
+        
+        range_buttons = ttk.Frame(range_frame)
+        range_buttons.pack(fill='x', pady=(5, 0))
+        
+        ttk.Button(range_buttons, text="删除", width=6,
+                   command=self.remove_selected_range).pack(side='left')
+        ttk.Button(range_buttons, text="清空", width=6,
+                   command=self.clear_ranges).pack(side='left', padx=(5, 0))
+        ttk.Checkbutton(range_buttons, text="每段单独编号",
+                        variable=self.per_range_numbering_var).pack(side='right')
+        
+        self.mark_label = ttk.Label(range_frame, text="未设置区间时转换整个视频",
+                                    font=('Microsoft YaHei', 8), foreground='#7f8c8d')
+        self.mark_label.pack(anchor='w', pady=(5, 0))
+    
+    def current_time(self):
+        """播放器当前帧对应的时间（秒）"""
+        return self.current_frame / self.video_fps if self.video_fps > 0 else 0
+    
+    def set_mark_in(self):
+        """把当前帧设为入点"""
+        if not self.cap:
+            return
+        self.mark_in = self.current_time()
+        self.mark_label.configure(text=f"入点：{format_timestamp(self.mark_in)}，请设置出点")
+    
+    def set_mark_out(self):
+        """把当前帧设为出点，与入点组成一个提取区间（未设入点时从视频开头开始）"""
+        if not self.cap:
+            return
+        start = self.mark_in if self.mark_in is not None else 0.0
+        end = self.current_time()
+        if end <= start:
+            messagebox.showwarning("提示", "出点必须晚于入点")
+            return
+        self.ranges.append((start, end))
+        self.mark_in = None
+        self.refresh_ranges()
+    
+    def remove_selected_range(self):
+        """删除选中的区间"""
+        for index in reversed(self.range_listbox.curselection()):
+            del self.ranges[index]
+        self.refresh_ranges()
+    
+    def clear_ranges(self):
+        """清空所有区间"""
+        self.ranges = []
+        self.mark_in = None
+        self.refresh_ranges()
+    
+    def refresh_ranges(self):
+        """刷新区间列表"""
+        self.range_listbox.delete(0, tk.END)
+        for start, end in self.ranges:
+            self.range_listbox.insert(
+                tk.END, f"{format_timestamp(start)} - {format_timestamp(end)}"
+                        f"  ({end - start:.2f} 秒)")
+        if self.ranges:
+            total = sum(end - start for start, end in self.ranges)
+            self.mark_label.configure(text=f"共 {len(self.ranges)} 个区间，{total:.2f} 秒")
+        else:
+            self.mark_label.configure(text="未设置区间时转换整个视频")
+    
     def create_action_section(self, parent):
         """创建操作状态区"""
         action_frame = ttk.Frame(parent, style='Section.TFrame')
@@ -365,7 +764,8 @@ class VideoFrameConverter:
         
         # 状态文字
         self.status_label = ttk.Label(action_frame, textvariable=self.status_var,
-                                     font=('Microsoft YaHei', 9))
+                                     font=('Microsoft YaHei', 9), wraplength=740,
+                                     justify='center')
         self.status_label.pack(pady=10)
         
         # 按钮组
@@ -414,29 +814,51 @@ class VideoFrameConverter:
         """拖拽释放"""
         files = self.root.tk.splitlist(event.data)
         if files:
-            self.load_video_file(files[0])
+            self.open_paths(files)
         self.on_drag_leave(event)
     
     def select_video_file(self):
         """选择视频文件"""
-        filetypes = [
-            ('视频文件', '*.mp4 *.avi *.mov *.mkv *.wmv *.flv *.webm'),
-            ('所有文件', '*.*')
-        ]
-        
-        filename = filedialog.askopenfilename(
+        filenames = filedialog.askopenfilenames(
             title="选择视频文件",
-            filetypes=filetypes
+            filetypes=VIDEO_FILETYPES
         )
         
-        if filename:
-            self.load_video_file(filename)
+        if filenames:
+            self.open_paths(self.root.tk.splitlist(filenames))
+    
+    def open_paths(self, paths):
+        """打开文件或文件夹：单个视频直接预览，多个视频加入批量队列"""
+        if len(paths) == 1 and os.path.isfile(paths[0]):
+            self.load_video_file(paths[0])
+            return
+        
+        videos = frame_batch.collect_video_files(paths)
+        if not videos:
+            messagebox.showerror("错误", "未找到视频文件")
+            return
+        
+        self.load_video_file(videos[0])
+        self.show_batch_window()
+        self.batch_window.add_files(videos)
+    
+    def show_batch_window(self):
+        """显示批量队列窗口"""
+        if self.batch_window is None or not self.batch_window.winfo_exists():
+            self.batch_window = BatchQueueWindow(self)
+        self.batch_window.deiconify()
+        self.batch_window.lift()
     
     def load_video_file(self, filepath):
         """加载视频文件"""
         try:
             # 停止当前播放
             self.stop_video()
+            self.stop_scrubber()
+            self.stop_proxy()
+            
+            cv2 = self.ensure_preview()
+            from preview_cache import ScrubDecoder
             
             # 打开视频文件
             self.cap = cv2.VideoCapture(filepath)
@@ -445,28 +867,49 @@ class VideoFrameConverter:
                 messagebox.showerror("错误", "无法打开视频文件")
                 return
             
-            # 获取视频信息
-            self.total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            self.video_fps = self.cap.get(cv2.CAP_PROP_FPS)
+            # 获取视频信息（ffprobe结果有缓存，转换时不再重复探测）
+            info = media_probe.probe(filepath)
+            if info and info.fps:
+                self.video_fps = info.fps
+                self.total_frames = media_probe.count_source_frames(
+                    filepath, allow_packets=False)[0]
+            else:
+                self.total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+                self.video_fps = self.cap.get(cv2.CAP_PROP_FPS)
             self.current_frame = 0
             
             # 设置变量
             self.video_file = filepath
+            self.preview_file = filepath
+            if self.proxy_var.get():
+                # 已生成过代理时直接使用
+                import preview_proxy
+                self.preview_file = preview_proxy.cached_proxy(filepath) or filepath
+            self.clear_ranges()
             self.original_fps = self.video_fps
             self.fps_var.set(str(int(self.video_fps)))
             
+            # 拖动预览：后台建立关键帧索引并缓存解码结果
+            self.scrubber = ScrubDecoder(self.preview_file, self.video_fps or 30,
+                                         self.frame_cache, self.on_scrub_frame,
+                                         self.preview_size())
+            
             # 切换到视频播放界面
             self.switch_to_video_view()
             
             # 显示文件信息
             filename = os.path.basename(filepath)
             self.filename_label.configure(text=filename)
-            self.fps_label.configure(text=f"原视频帧率：{self.video_fps:.2f}fps, 总帧数：{self.total_frames}")
+            self.update_file_info("，预览使用代理" if self.preview_file != filepath else "")
             
             # 显示第一帧
             self.display_current_frame()
             self.update_time_label()
             
+            # 预览代理模式下在后台生成代理
+            if self.preview_file == filepath:
+                self.start_proxy()
+            
             # 更新界面状态
             self.check_start_button()
             
@@ -490,6 +933,8 @@ class VideoFrameConverter:
         """清除视频，返回初始状态"""
         # 停止播放
         self.stop_video()
+        self.stop_scrubber()
+        self.stop_proxy()
         
         # 释放资源
         if self.cap:
@@ -498,12 +943,15 @@ class VideoFrameConverter:
         
         # 重置变量
         self.video_file = None
+        self.preview_file = None
         self.original_fps = None
         self.current_frame = 0
         self.total_frames = 0
         self.is_playing = False
         
         # 重置界面
+        if self.renderer:
+            self.renderer.clear()
         self.switch_to_drop_view()
         self.filename_label.configure(text="")
         self.fps_label.configure(text="")
@@ -511,6 +959,7 @@ class VideoFrameConverter:
         self.video_progress_var.set(0)
         self.time_label.configure(text="00:00 / 00:00")
         self.play_btn.configure(text="▶")
+        self.clear_ranges()
         
         # 更新界面状态
         self.check_start_button()
@@ -531,10 +980,24 @@ class VideoFrameConverter:
             return
         
         self.is_playing = True
+        self.play_token += 1
         self.play_btn.configure(text="⏸")
         
+        # 顺序解码器只在当前位置与预读位置不一致（用户跳转过）时重新定位
+        if self.decoder is None:
+            from preview_buffer import SequentialDecoder
+            self.decoder = SequentialDecoder(
+                self.preview_file, self.current_frame,
+                max_frames=self.PREVIEW_BUFFER_FRAMES,
+                max_bytes=self.PREVIEW_BUFFER_MB * 1024 * 1024,
+                preview_size=self.preview_size())
+        elif self.decoder_position != self.current_frame:
+            self.decoder.seek(self.current_frame)
+        self.decoder_position = self.current_frame
+        
         # 开始播放线程
-        self.video_thread = threading.Thread(target=self.video_play_loop)
+        self.video_thread = threading.Thread(target=self.video_play_loop,
+                                             args=(self.play_token, self.decoder))
         self.video_thread.daemon = True
         self.video_thread.start()
     
@@ -546,90 +1009,200 @@ class VideoFrameConverter:
     def stop_video(self):
         """停止视频"""
         self.is_playing = False
-        if self.video_thread and self.video_thread.is_alive():
-            self.video_thread = None
+        self.video_thread = None
+        if self.decoder:
+            self.decoder.stop()
+            self.decoder = None
     
-    def video_play_loop(self):
-        """视频播放循环"""
+    def video_play_loop(self, token, decoder):
+        """视频播放循环：从预读缓冲区取帧，按原帧率定时显示"""
         frame_duration = 1.0 / self.video_fps if self.video_fps > 0 else 1.0 / 30
-        
-        while self.is_playing and self.cap and self.current_frame < self.total_frames:
-            start_time = time.time()
+        next_time = time.perf_counter()
+        
+        while self.is_playing and self.play_token == token and \
+                self.current_frame < self.total_frames:
+            item = decoder.read()
+            if item is None:
+                if decoder.finished:
+                    break
+                continue
             
-            # 设置当前帧位置
-            self.cap.set(cv2.CAP_PROP_POS_FRAMES, self.current_frame)
+            frame_number, frame = item
+            if frame_number < self.current_frame:
+                # 跳转前残留的帧
+                continue
+            self.current_frame = frame_number
+            self.decoder_position = frame_number + 1
             
-            # 读取并显示帧
-            ret, frame = self.cap.read()
-            if not ret:
-                break
+            # 落后超过一帧时丢弃该帧，保持实时播放速度
+            now = time.perf_counter()
+            if now - next_time > frame_duration:
+                next_time = max(next_time + frame_duration, now - 1.0)
+                self.current_frame += 1
+                continue
             
             # 在主线程中更新显示
-            self.root.after(0, self.update_video_display, frame)
+            self.queue_video_display(frame)
             
             # 更新进度
             progress = (self.current_frame / self.total_frames) * 100
-            self.root.after(0, lambda: self.video_progress_var.set(progress))
+            self.root.after(0, lambda p=progress: self.video_progress_var.set(p))
             self.root.after(0, self.update_time_label)
             
             # 下一帧
             self.current_frame += 1
             
             # 控制播放速度
-            elapsed = time.time() - start_time
-            sleep_time = max(0, frame_duration - elapsed)
-            time.sleep(sleep_time)
+            next_time += frame_duration
+            sleep_time = next_time - time.perf_counter()
+            if sleep_time > 0:
+                time.sleep(sleep_time)
         
         # 播放结束
-        if self.current_frame >= self.total_frames:
+        if self.play_token == token and (self.current_frame >= self.total_frames or
+                                         decoder.finished and not len(decoder.buffer)):
             self.current_frame = 0  # 重置到开始
             self.root.after(0, self.pause_video)
     
     def update_video_display(self, frame):
-        """更新视频显示"""
-        if frame is None:
+        """更新视频显示（frame为解码线程已转换好的预览尺寸RGB图像）"""
+        self.renderer.render(frame)
+    
+    def queue_video_display(self, frame):
+        """从播放线程提交一帧，界面线程来不及显示时只保留最新的一帧"""
+        with self.pending_lock:
+            schedule = self.pending_frame is None
+            self.pending_frame = frame
+        if schedule:
+            self.root.after(0, self.flush_video_display)
+    
+    def flush_video_display(self):
+        """显示最新提交的帧"""
+        with self.pending_lock:
+            frame, self.pending_frame = self.pending_frame, None
+        if frame is not None:
+            self.update_video_display(frame)
+    
+    def display_current_frame(self):
+        """显示当前帧：先显示缓存中最接近的帧，再由后台解码精确帧"""
+        if not self.cap or not self.scrubber:
             return
         
-        # 调整帧大小以适应画布
-        canvas_width = self.video_canvas.winfo_width()
-        canvas_height = self.video_canvas.winfo_height()
+        frame = self.frame_cache.get(self.current_frame)
+        if frame is not None:
+            self.update_video_display(frame)
+            return
         
-        if canvas_width > 1 and canvas_height > 1:
-            # 计算缩放比例，保持宽高比
-            h, w = frame.shape[:2]
-            scale = min(canvas_width/w, canvas_height/h)
-            
-            new_w = int(w * scale)
-            new_h = int(h * scale)
-            
-            # 调整大小
-            frame_resized = cv2.resize(frame, (new_w, new_h))
-            
-            # 转换颜色空间
-            frame_rgb = cv2.cvtColor(frame_resized, cv2.COLOR_BGR2RGB)
-            
-            # 转换为PIL图像
-            pil_image = Image.fromarray(frame_rgb)
-            photo = ImageTk.PhotoImage(pil_image)
-            
-            # 在画布中央显示
-            self.video_canvas.delete("all")
-            x = canvas_width // 2
-            y = canvas_height // 2
-            self.video_canvas.create_image(x, y, image=photo, anchor='center')
-            
-            # 保持引用，防止被垃圾回收
-            self.video_canvas.image = photo
+        # 同一GOP内最近的已缓存帧（通常是关键帧）作为临时画面
+        keyframe = self.scrubber.index.keyframe_before(self.current_frame)
+        nearest = self.frame_cache.nearest_before(
+            self.current_frame, keyframe if keyframe is not None else 0)
+        if nearest is not None:
+            self.update_video_display(nearest[1])
+        
+        self.scrubber.request(self.current_frame)
     
-    def display_current_frame(self):
-        """显示当前帧"""
+    def on_scrub_frame(self, frame_number, frame):
+        """精确帧解码完成（在后台线程中调用）"""
+        self.root.after(0, self.show_scrub_frame, frame_number, frame)
+    
+    def show_scrub_frame(self, frame_number, frame):
+        """显示解码完成的精确帧，已拖到别处或正在播放时忽略"""
+        if not self.is_playing and frame_number == self.current_frame:
+            self.update_video_display(frame)
+    
+    def stop_scrubber(self):
+        """停止拖动预览解码器并清空缓存"""
+        if self.scrubber:
+            self.scrubber.stop()
+            self.scrubber = None
+        if self.frame_cache is not None:
+            self.frame_cache.clear()
+    
+    def update_file_info(self, note=""):
+        """显示视频帧率和总帧数，note为附加的预览状态"""
+        self.fps_label.configure(
+            text=f"原视频帧率：{self.video_fps:.2f}fps, 总帧数：{self.total_frames}{note}")
+    
+    def start_proxy(self):
+        """预览代理模式下在后台生成低分辨率代理，就绪后切换预览（视频本身足够小时不生成）"""
+        if not self.proxy_var.get() or not self.video_file or self.proxy_builder:
+            return
+        import preview_proxy
+        source = self.video_file
+        self.proxy_builder = preview_proxy.start_proxy(
+            source, self.total_frames,
+            on_done=lambda path: self.root.after(0, self.on_proxy_ready, source, path),
+            on_progress=lambda progress: self.root.after(
+                0, self.show_proxy_progress, source, progress.percent))
+    
+    def stop_proxy(self):
+        """取消正在生成的预览代理"""
+        if self.proxy_builder:
+            self.proxy_builder.cancel()
+            self.proxy_builder = None
+    
+    def show_proxy_progress(self, source, percent):
+        """显示代理生成进度"""
+        if source == self.video_file and self.proxy_builder:
+            self.update_file_info(f"，预览代理生成中 {percent:.0f}%")
+    
+    def on_proxy_ready(self, source, path):
+        """代理生成完成，切换预览到代理；已换了视频或已取消时忽略"""
+        if source != self.video_file or not self.proxy_builder:
+            return
+        builder, self.proxy_builder = self.proxy_builder, None
+        if path is None:
+            print(f"预览代理生成失败：{builder.error}")
+            self.update_file_info("，预览代理生成失败")
+            return
+        self.switch_preview_source(path)
+        self.update_file_info("，预览使用代理")
+    
+    def on_proxy_changed(self):
+        """切换预览代理模式"""
         if not self.cap:
             return
-        
-        self.cap.set(cv2.CAP_PROP_POS_FRAMES, self.current_frame)
-        ret, frame = self.cap.read()
-        if ret:
-            self.update_video_display(frame)
+        if self.proxy_var.get():
+            self.start_proxy()
+        else:
+            self.stop_proxy()
+            self.switch_preview_source(self.video_file)
+            self.update_file_info()
+    
+    def switch_preview_source(self, path):
+        """预览改读path（帧号与原视频一致），保持当前位置和播放状态"""
+        if path == self.preview_file:
+            return
+        from preview_cache import ScrubDecoder
+        was_playing = self.is_playing
+        self.stop_video()
+        if self.scrubber:
+            self.scrubber.stop()
+        self.preview_file = path
+        self.scrubber = ScrubDecoder(path, self.video_fps or 30,
+                                     self.frame_cache, self.on_scrub_frame,
+                                     self.preview_size())
+        if was_playing:
+            self.play_video()
+        else:
+            self.display_current_frame()
+    
+    def preview_size(self):
+        """预览画面尺寸（画布尚未显示时使用默认值）"""
+        width = self.video_canvas.winfo_width()
+        height = self.video_canvas.winfo_height()
+        if width > 1 and height > 1:
+            return width, height
+        return 640, 360
+    
+    def on_canvas_resize(self, event):
+        """画布尺寸变化时更新解码线程输出的预览分辨率"""
+        if event.width <= 1 or event.height <= 1:
+            return
+        for decoder in (self.scrubber, self.decoder):
+            if decoder:
+                decoder.preview_size = (event.width, event.height)
     
     def on_progress_change(self, value):
         """进度条改变"""
@@ -660,26 +1233,7 @@ class VideoFrameConverter:
     
     def get_video_fps(self, filepath):
         """获取视频帧率"""
-        try:
-            cmd = [
-                'ffprobe', '-v', 'quiet', '-select_streams', 'v:0',
-                '-show_entries', 'stream=r_frame_rate', '-of', 'csv=p=0',
-                filepath
-            ]
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
-            
-            if result.returncode == 0 and result.stdout.strip():
-                fps_str = result.stdout.strip()
-                if '/' in fps_str:
-                    num, den = fps_str.split('/')
-                    fps = float(num) / float(den)
-                else:
-                    fps = float(fps_str)
-                return round(fps, 2)
-        except Exception as e:
-            print(f"获取帧率失败：{e}")
-        
-        return None
+        return frame_engine.get_video_fps(filepath)
     
     def select_output_folder(self):
         """选择输出文件夹"""
@@ -695,11 +1249,8 @@ class VideoFrameConverter:
             digits = int(self.digits_var.get())
             format_ext = self.format_var.get()
             
-            # 生成序号
-            padded_num = str(start_num).zfill(digits)
-            
             # 生成文件名
-            filename = f"{prefix}{padded_num}.{format_ext}"
+            filename = frame_engine.format_frame_name(prefix, start_num, digits, format_ext)
             self.preview_label.configure(text=filename)
         except ValueError:
             self.preview_label.configure(text="参数错误")
@@ -735,166 +1286,131 @@ class VideoFrameConverter:
         self.progress_var.set(0)
         self.status_var.set("准备转换...")
         
+        self.conversion_job = frame_engine.create_job(
+            self.build_settings(), on_progress=self.on_conversion_progress)
+        self.conversion_progress = None
+        
         # 在新线程中执行转换
-        conversion_thread = threading.Thread(target=self.run_conversion)
+        conversion_thread = threading.Thread(target=self.run_conversion,
+                                             args=(self.conversion_job,))
         conversion_thread.daemon = True
         conversion_thread.start()
+        
+        # 按固定间隔刷新进度
+        self.poll_conversion_progress()
     
     def validate_parameters(self):
         """验证转换参数"""
         try:
-            fps = float(self.fps_var.get())
-            if fps <= 0:
-                messagebox.showerror("参数错误", "帧率必须大于0")
-                return False
-            
-            start_num = int(self.start_num_var.get())
-            if start_num < 0:
-                messagebox.showerror("参数错误", "起始序号不能为负数")
-                return False
-            
-            # 检查输出文件夹是否存在
-            output_folder = self.output_folder_var.get()
-            if not os.path.exists(output_folder):
-                try:
-                    os.makedirs(output_folder)
-                except Exception as e:
-                    messagebox.showerror("错误", f"创建输出文件夹失败：{str(e)}")
-                    return False
-            
+            settings = self.build_settings()
+            settings.validate()
+            frame_engine.ensure_output_folders(settings)
             return True
             
-        except ValueError as e:
+        except ValueError:
             messagebox.showerror("参数错误", "请检查数字参数的格式")
             return False
+        except frame_engine.ConversionError as e:
+            messagebox.showerror("参数错误", str(e))
+            return False
     
-    def run_conversion(self):
+    def build_settings(self):
+        """从界面变量构建转换参数"""
+        return frame_engine.ConversionSettings(
+            video_file=self.video_file,
+            output_folder=self.output_folder_var.get(),
+            fps=float(self.fps_var.get()),
+            prefix=self.prefix_var.get(),
+            start_number=int(self.start_num_var.get()),
+            digits=int(self.digits_var.get()),
+            format_ext=self.format_var.get(),
+            size=int(self.size_var.get() or 0),
+            quality=int(self.quality_var.get()) if self.quality_var.get().strip() else None,
+            targets=self.targets,
+            pack=self.pack_var.get() if self.pack_var.get() in frame_engine.PACK_FORMATS else None,
+            atlas=self.atlas_var.get(),
+            atlas_columns=int(self.atlas_columns_var.get() or 0),
+            atlas_max_size=int(self.atlas_max_size_var.get()),
+            atlas_padding=int(self.atlas_padding_var.get() or 0),
+            atlas_trim=self.atlas_trim_var.get(),
+            compression_level=(int(self.compression_var.get())
+                               if self.compression_var.get().strip() else None),
+            png_pred=(self.png_pred_var.get()
+                      if self.png_pred_var.get() in frame_engine.PNG_PREDICTIONS else None),
+            workers=int(self.workers_var.get()),
+            resume=self.resume_var.get(),
+            engine=(frame_engine.ENGINE_POOL if self.pool_engine_var.get()
+                    else frame_engine.ENGINE_FFMPEG),
+            mode=self.selected_mode(),
+            scene_threshold=float(self.scene_threshold_var.get()),
+            stride=int(self.stride_var.get()),
+            frame_list=[self.frame_list_var.get()] if self.frame_list_var.get().strip() else [],
+            dedupe=self.dedupe_var.get(),
+            dedupe_threshold=float(self.dedupe_threshold_var.get()),
+            ranges=self.ranges,
+            range_numbering=(frame_engine.NUMBERING_PER_RANGE
+                             if self.per_range_numbering_var.get()
+                             else frame_engine.NUMBERING_CONTINUOUS),
+        )
+    
+    def run_conversion(self, job):
         """执行转换（在后台线程中运行）"""
         try:
-            # 构建FFmpeg命令
-            output_pattern = self.build_output_pattern()
-            fps = self.fps_var.get()
-            
-            cmd = [
-                'ffmpeg', '-i', self.video_file,
-                '-r', fps,
-                '-y',  # 覆盖输出文件
-                output_pattern
-            ]
-            
-            # 获取视频总帧数用于进度计算
-            total_frames = self.get_total_frames()
-            
-            # 设置环境变量以处理中文编码
-            my_env = os.environ.copy()
-            my_env["PYTHONIOENCODING"] = "utf-8"
-            
-            # 启动FFmpeg进程，使用utf-8编码处理输出
-            self.conversion_process = subprocess.Popen(
-                cmd, 
-                stdout=subprocess.PIPE, 
-                stderr=subprocess.STDOUT,
-                env=my_env,
-                encoding='utf-8',
-                text=True,
-                creationflags=subprocess.CREATE_NO_WINDOW  # 隐藏命令行窗口
-            )
-            
-            # 监控进度
-            self.monitor_progress(total_frames)
+            result = job.run()
+            self.root.after(0, lambda: self.conversion_finished(result))
             
         except Exception as e:
-            self.root.after(0, lambda: self.conversion_error(str(e)))
+            error_msg = str(e)
+            self.root.after(0, lambda: self.conversion_error(error_msg))
     
-    def build_output_pattern(self):
-        """构建输出文件名模式"""
-        output_folder = self.output_folder_var.get()
-        prefix = self.prefix_var.get()
-        start_num = int(self.start_num_var.get())
-        digits = int(self.digits_var.get())
-        format_ext = self.format_var.get()
-        
-        # FFmpeg的序号从1开始，我们需要调整
-        pattern = f"{prefix}%0{digits}d.{format_ext}"
-        if start_num != 1:
-            # 如果起始序号不是1，需要特殊处理
-            pattern = f"{prefix}{start_num:0{digits}d}.{format_ext}"
-        
-        return os.path.join(output_folder, pattern)
+    def on_conversion_progress(self, progress):
+        """转换进度回调（在后台线程中调用），只记录最新进度，由界面定时刷新"""
+        self.conversion_progress = progress
     
-    def get_total_frames(self):
-        """获取视频总帧数"""
-        try:
-            cmd = [
-                'ffprobe', '-v', 'quiet', '-select_streams', 'v:0',
-                '-show_entries', 'stream=nb_frames', '-of', 'csv=p=0',
-                self.video_file
-            ]
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
-            
-            if result.returncode == 0 and result.stdout.strip():
-                return int(result.stdout.strip())
-        except:
-            pass
-        
-        return 0
-    
-    def monitor_progress(self, total_frames):
-        """监控转换进度"""
-        frame_count = 0
-        
-        while self.conversion_process and self.conversion_process.poll() is None:
-            try:
-                output = self.conversion_process.stdout.readline()
-                if output:
-                    # 解析FFmpeg输出中的帧数信息
-                    frame_match = re.search(r'frame=\s*(\d+)', output)
-                    if frame_match:
-                        frame_count = int(frame_match.group(1))
-                        
-                        if total_frames > 0:
-                            progress = (frame_count / total_frames) * 100
-                            progress = min(progress, 100)
-                        else:
-                            progress = 0
-                        
-                        # 更新界面
-                        self.root.after(0, lambda: self.update_progress(progress, frame_count))
-                
-            except Exception as e:
-                print(f"监控进度错误：{e}")
-                break
-        
-        # 转换完成
-        if self.conversion_process:
-            return_code = self.conversion_process.returncode
-            self.root.after(0, lambda: self.conversion_finished(return_code, frame_count))
-    
-    def update_progress(self, progress, frame_count):
+    def poll_conversion_progress(self):
+        """转换过程中定时刷新进度显示"""
+        if not self.is_converting:
+            return
+        if self.conversion_progress is not None:
+            self.update_progress(self.conversion_progress)
+        self.root.after(self.PROGRESS_INTERVAL, self.poll_conversion_progress)
+    
+    def update_progress(self, progress):
         """更新进度显示"""
-        self.progress_var.set(progress)
-        self.status_var.set(f"转换中... {progress:.1f}% (已处理 {frame_count} 帧)")
+        self.progress_var.set(progress.percent)
+        self.status_var.set(progress.describe())
     
-    def conversion_finished(self, return_code, frame_count):
+    def conversion_finished(self, result):
         """转换完成"""
-        self.is_converting = False
-        self.conversion_process = None
+        # 已取消的任务由cancel_conversion处理界面
+        if result.cancelled:
+            return
         
-        if return_code == 0:
-            self.status_var.set(f"转换完成，共生成 {frame_count} 帧")
+        self.is_converting = False
+        self.conversion_job = None
+        
+        frame_count = result.frame_count
+        if result.ok:
+            status = f"转换完成，共生成 {frame_count} 帧"
+            if result.metrics:
+                status += f"；{result.metrics.summary()}"
+            self.status_var.set(status)
             self.progress_var.set(100)
             
             # 显示完成对话框
-            result = messagebox.askyesno(
+            open_folder = messagebox.askyesno(
                 "转换完成", 
                 f"转换完成，共生成 {frame_count} 帧\n是否打开输出文件夹？"
             )
             
-            if result:
+            if open_folder:
                 self.open_output_folder()
         else:
             self.status_var.set("转换失败")
-            messagebox.showerror("转换失败", "FFmpeg转换过程中出现错误")
+            message = "FFmpeg转换过程中出现错误"
+            if result.error_output:
+                message += f"：\n{result.error_output}"
+            messagebox.showerror("转换失败", message)
         
         # 重置界面状态
         self.start_btn.configure(state='normal')
@@ -903,7 +1419,7 @@ class VideoFrameConverter:
     def conversion_error(self, error_msg):
         """转换出错"""
         self.is_converting = False
-        self.conversion_process = None
+        self.conversion_job = None
         self.status_var.set("转换失败")
         messagebox.showerror("转换失败", f"转换过程中出现错误：\n{error_msg}")
         
@@ -913,12 +1429,9 @@ class VideoFrameConverter:
     
     def cancel_conversion(self):
         """取消转换"""
-        if self.conversion_process:
-            try:
-                self.conversion_process.terminate()
-                self.conversion_process = None
-            except:
-                pass
+        if self.conversion_job:
+            self.conversion_job.cancel()
+            self.conversion_job = None
         
         self.is_converting = False
         self.status_var.set("转换已取消")
@@ -939,6 +1452,14 @@ class VideoFrameConverter:
         """程序关闭时的处理"""
         # 停止视频播放
         self.stop_video()
+        self.stop_scrubber()
+        self.stop_proxy()
+        
+        # 停止转换任务
+        if self.conversion_job:
+            self.conversion_job.cancel()
+        if self.batch_window is not None and self.batch_window.winfo_exists():
+            self.batch_window.queue.cancel_all()
         
         # 释放资源
         if self.cap:
@@ -953,6 +1474,169 @@ class VideoFrameConverter:
         self.root.mainloop()
 
 
+class BatchQueueWindow(tk.Toplevel):
+    """批量转换队列窗口"""
+    
+    REFRESH_INTERVAL = 500  # 列表刷新间隔（毫秒）
+    
+    def __init__(self, app):
+        super().__init__(app.root)
+        self.app = app
+        self.title("批量队列")
+        self.geometry("760x420")
+        
+        self.queue = frame_batch.BatchQueue(None)
+        self.max_jobs_var = tk.StringVar(value="2")
+        # 与命令行一致：默认使用各视频的原帧率，勾选后统一使用主窗口的帧率（相当于--fps）
+        self.same_fps_var = tk.BooleanVar(value=False)
+        self.summary_var = tk.StringVar(value="队列为空")
+        
+        self.create_interface()
+        self.protocol("WM_DELETE_WINDOW", self.withdraw)
+        self.refresh()
+    
+    def create_interface(self):
+        """创建队列界面"""
+        # 任务列表
+        columns = ('name', 'output', 'status', 'progress', 'speed')
+        self.tree = ttk.Treeview(self, columns=columns, show='headings',
+                                 selectmode='extended')
+        for column, text, width in [('name', "文件", 200), ('output', "输出文件夹", 240),
+                                    ('status', "状态", 70), ('progress', "进度", 70),
+                                    ('speed', "速度", 80)]:
+            self.tree.heading(column, text=text)
+            self.tree.column(column, width=width, anchor='w')
+        self.tree.pack(fill='both', expand=True, padx=10, pady=(10, 5))
+        
+        self.tree.drop_target_register(tkdnd.DND_FILES)
+        self.tree.dnd_bind('<<Drop>>', self.on_drop)
+        
+        # 按钮栏
+        button_frame = ttk.Frame(self)
+        button_frame.pack(fill='x', padx=10, pady=5)
+        
+        ttk.Button(button_frame, text="添加文件",
+                   command=self.select_files).pack(side='left', padx=2)
+        ttk.Button(button_frame, text="添加文件夹",
+                   command=self.select_folder).pack(side='left', padx=2)
+        ttk.Button(button_frame, text="上移",
+                   command=lambda: self.move_selected(-1)).pack(side='left', padx=2)
+        ttk.Button(button_frame, text="下移",
+                   command=lambda: self.move_selected(1)).pack(side='left', padx=2)
+        ttk.Button(button_frame, text="取消所选",
+                   command=self.cancel_selected).pack(side='left', padx=2)
+        
+        self.start_btn = ttk.Button(button_frame, text="开始队列",
+                                    style='Start.TButton', command=self.start_queue)
+        self.start_btn.pack(side='right', padx=2)
+        
+        ttk.Spinbox(button_frame, textvariable=self.max_jobs_var, from_=1,
+                    to=os.cpu_count() or 1, width=4).pack(side='right', padx=2)
+        ttk.Label(button_frame, text="同时任务数:").pack(side='right')
+        ttk.Checkbutton(button_frame, text="统一使用主窗口帧率",
+                        variable=self.same_fps_var).pack(side='right', padx=(0, 10))
+        
+        # 汇总信息
+        ttk.Label(self, textvariable=self.summary_var,
+                  font=('Microsoft YaHei', 9)).pack(anchor='w', padx=10, pady=(0, 10))
+    
+    def on_drop(self, event):
+        """拖拽文件或文件夹到队列"""
+        self.add_files(frame_batch.collect_video_files(self.tk.splitlist(event.data)))
+    
+    def select_files(self):
+        """选择视频文件加入队列"""
+        filenames = filedialog.askopenfilenames(title="选择视频文件",
+                                                filetypes=VIDEO_FILETYPES, parent=self)
+        if filenames:
+            self.add_files(frame_batch.collect_video_files(self.tk.splitlist(filenames)))
+    
+    def select_folder(self):
+        """选择文件夹加入队列"""
+        folder = filedialog.askdirectory(title="选择视频文件夹", parent=self)
+        if folder:
+            self.add_files(frame_batch.collect_video_files([folder]))
+    
+    def add_files(self, files):
+        """添加视频到队列"""
+        for filepath in files:
+            job = self.queue.add(filepath)
+            self.tree.insert('', 'end', iid=str(job.job_id),
+                             values=(job.name, "", frame_batch.STATUS_TEXT[job.status], "", ""))
+        self.refresh_rows()
+    
+    def selected_ids(self):
+        return [int(iid) for iid in self.tree.selection()]
+    
+    def move_selected(self, offset):
+        """调整所选任务的顺序"""
+        job_ids = self.selected_ids()
+        if offset > 0:
+            job_ids.reverse()
+        for job_id in job_ids:
+            if self.queue.move(job_id, offset):
+                self.tree.move(str(job_id), '', self.queue.jobs.index(self.queue.get(job_id)))
+    
+    def cancel_selected(self):
+        """取消所选任务"""
+        for job_id in self.selected_ids():
+            self.queue.cancel(job_id)
+        self.refresh_rows()
+    
+    def start_queue(self):
+        """使用主窗口的参数开始处理队列"""
+        try:
+            # 提取区间只属于主窗口中的视频，不用于队列
+            template = self.app.build_settings().copy(ranges=[])
+            if not self.same_fps_var.get():
+                # 由队列在任务开始时读取各视频的原帧率
+                template.fps = None
+            max_jobs = int(self.max_jobs_var.get())
+        except ValueError:
+            messagebox.showerror("参数错误", "请检查数字参数的格式", parent=self)
+            return
+        
+        if not template.output_folder.strip():
+            messagebox.showerror("参数错误", "请选择输出文件夹", parent=self)
+            return
+        try:
+            frame_engine.ensure_output_folder(template.output_folder)
+        except frame_engine.ConversionError as e:
+            messagebox.showerror("错误", str(e), parent=self)
+            return
+        
+        self.queue.template = template
+        self.queue.max_jobs = max(1, max_jobs)
+        self.queue.start()
+    
+    def refresh(self):
+        """定时刷新任务列表"""
+        if not self.winfo_exists():
+            return
+        self.refresh_rows()
+        self.after(self.REFRESH_INTERVAL, self.refresh)
+    
+    def refresh_rows(self):
+        """刷新任务行和汇总信息"""
+        for job in list(self.queue.jobs):
+            progress = f"{job.progress:.1f}%" if job.status != frame_batch.PENDING else ""
+            speed = f"{job.throughput:.1f} 帧/秒" if job.started_at else ""
+            self.tree.item(str(job.job_id), values=(
+                job.name, job.output_folder or "",
+                frame_batch.STATUS_TEXT[job.status], progress, speed))
+        
+        if not self.queue.jobs:
+            self.summary_var.set("队列为空")
+            return
+        counts = self.queue.summary()
+        text = "，".join(f"{frame_batch.STATUS_TEXT[status]} {count}"
+                        for status, count in counts.items() if count)
+        self.summary_var.set(f"共 {len(self.queue.jobs)} 个视频：{text}，"
+                             f"整体速度 {self.queue.throughput:.1f} 帧/秒")
+
+
 if __name__ == "__main__":
+    # 打包后的程序中进程池编码需要
+    multiprocessing.freeze_support()
     app = VideoFrameConverter()
     app.run()
\ No newline at end of file
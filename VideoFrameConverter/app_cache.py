@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地缓存目录
+探测结果等可重复使用的数据以JSON文件保存在用户缓存目录下，
+可通过环境变量VFC_CACHE_DIR指定位置
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+
+APP_NAME = 'VideoFrameConverter'
+
+
+def cache_dir(*parts):
+    """返回缓存子目录路径，不存在时创建"""
+    root = os.environ.get('VFC_CACHE_DIR')
+    if not root:
+        if os.name == 'nt':
+            base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+        else:
+            base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+        root = os.path.join(base, APP_NAME)
+    path = os.path.join(root, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def file_key(filepath, *extra):
+    """按路径、大小和修改时间生成文件的缓存键，文件被修改后键随之变化"""
+    stat = os.stat(filepath)
+    text = "|".join([os.path.normcase(os.path.abspath(filepath)),
+                     str(stat.st_size), str(stat.st_mtime_ns)] + [str(e) for e in extra])
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def load_json(path):
+    """读取JSON文件，不存在或已损坏时返回None"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _file_mode():
+    """按umask计算的新建文件权限（mkstemp创建的文件固定为0600）
+
+    读取umask需要临时修改它，只在导入时执行一次，避免与其他线程创建文件冲突
+    """
+    umask = os.umask(0o022)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+FILE_MODE = _file_mode()
+
+
+def write_json(path, data):
+    """原子写入JSON文件（先写临时文件再替换），失败时删除临时文件并抛出OSError"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.chmod(tmp_path, FILE_MODE)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def save_json(path, data):
+    """写入缓存文件，失败时忽略（缓存可以重新生成）"""
+    try:
+        write_json(path, data)
+    except OSError as e:
+        print(f"写入缓存失败：{e}")
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+外部依赖检测
+FFmpeg/FFprobe在PATH中查找并读取版本，OpenCV只查找模块位置、读取版本文件而不导入；
+结果按可执行文件（模块文件）的路径+大小+修改时间缓存，再次启动时不必重新执行，
+升级或替换后自动重新检测
+"""
+
+import importlib.util
+import os
+import re
+import shutil
+import subprocess
+import threading
+
+import app_cache
+from frame_engine import FFMPEG, ffmpeg_capabilities
+from media_probe import FFPROBE, popen_kwargs
+
+
+# 缓存格式版本，结构变化时递增以废弃旧缓存
+CACHE_VERSION = 1
+
+DEP_FFMPEG = 'ffmpeg'
+DEP_FFPROBE = 'ffprobe'
+DEP_OPENCV = 'opencv'
+
+# 缺少依赖时的提示
+MISSING_HINTS = {
+    DEP_FFMPEG: "请先安装FFmpeg并配置环境变量\n下载地址: https://ffmpeg.org/download.html",
+    DEP_FFPROBE: "未找到FFprobe（通常与FFmpeg一起安装），无法读取视频信息",
+    DEP_OPENCV: "请先安装OpenCV库\n安装命令: pip install opencv-python",
+}
+
+VERSION_LINE = re.compile(r'version\s+(\S+)')
+OPENCV_VERSION = re.compile(r'''opencv_version\s*=\s*['"]([^'"]+)['"]''')
+
+
+class Dependency:
+    """一项依赖的检测结果，path为可执行文件或模块路径，version为版本文本（未知时为None）"""
+
+    def __init__(self, name, available=False, path=None, version=None):
+        self.name = name
+        self.available = available
+        self.path = path
+        self.version = version
+
+    def to_dict(self):
+        return {'available': self.available, 'path': self.path, 'version': self.version}
+
+    @classmethod
+    def from_dict(cls, name, data):
+        return cls(name, data.get('available', False), data.get('path'), data.get('version'))
+
+    def describe(self):
+        if not self.available:
+            return f"{self.name}：未找到"
+        return f"{self.name} {self.version or ''}".rstrip()
+
+
+def _cache_path(key):
+    return os.path.join(app_cache.cache_dir('deps'), f"{key}.json")
+
+
+def _cached(name, path, detect):
+    """按path文件缓存detect()的结果（Dependency），文件无法访问时直接检测"""
+    try:
+        key = app_cache.file_key(path, name, CACHE_VERSION)
+    except OSError:
+        return detect()
+    data = app_cache.load_json(_cache_path(key))
+    if data is not None:
+        return Dependency.from_dict(name, data)
+    dependency = detect()
+    if dependency.available:
+        # 执行失败可能是暂时的，只缓存成功的结果
+        app_cache.save_json(_cache_path(key), dependency.to_dict())
+    return dependency
+
+
+def check_binary(name, command=None):
+    """检测FFmpeg/FFprobe：查找可执行文件并执行-version"""
+    path = shutil.which(command or name)
+    if path is None:
+        return Dependency(name)
+
+    def detect():
+        try:
+            result = subprocess.run([path, '-version'], capture_output=True,
+                                    timeout=10, **popen_kwargs())
+        except (OSError, subprocess.TimeoutExpired):
+            return Dependency(name, path=path)
+        if result.returncode != 0:
+            return Dependency(name, path=path)
+        first_line = (result.stdout or "").splitlines()[:1]
+        match = VERSION_LINE.search(first_line[0]) if first_line else None
+        return Dependency(name, True, path, match.group(1) if match else None)
+
+    return _cached(name, path, detect)
+
+
+def check_opencv():
+    """检测OpenCV：只查找cv2模块，不导入（导入需要数百毫秒）"""
+    try:
+        spec = importlib.util.find_spec('cv2')
+    except (ImportError, ValueError):
+        spec = None
+    if spec is None:
+        return Dependency(DEP_OPENCV)
+    origin = spec.origin
+    if not origin or not os.path.isfile(origin):
+        # 打包后的程序中模块没有对应文件
+        return Dependency(DEP_OPENCV, True, origin)
+
+    def detect():
+        version = None
+        try:
+            with open(os.path.join(os.path.dirname(origin), 'version.py'),
+                      encoding='utf-8') as f:
+                match = OPENCV_VERSION.search(f.read())
+            version = match.group(1) if match else None
+        except OSError:
+            pass
+        return Dependency(DEP_OPENCV, True, origin, version)
+
+    return _cached(DEP_OPENCV, origin, detect)
+
+
+def check_dependencies():
+    """检测所有依赖，返回{名称: Dependency}（阻塞，首次检测需要执行FFmpeg）"""
+    return {
+        DEP_FFMPEG: check_binary(DEP_FFMPEG, FFMPEG),
+        DEP_FFPROBE: check_binary(DEP_FFPROBE, FFPROBE),
+        DEP_OPENCV: check_opencv(),
+    }
+
+
+def check_dependencies_async(callback):
+    """在后台线程中检测依赖并读取FFmpeg能力，完成后以结果字典调用callback（在后台线程中调用）"""
+    def run():
+        results = check_dependencies()
+        if results[DEP_FFMPEG].available:
+            # 预先读取能力，之后界面和转换时直接使用内存中的结果
+            ffmpeg_capabilities()
+        callback(results)
+
+    thread = threading.Thread(target=run, name='check-deps')
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def missing_messages(results):
+    """缺少的依赖对应的提示列表"""
+    return [MISSING_HINTS[name] for name, dependency in results.items()
+            if not dependency.available]
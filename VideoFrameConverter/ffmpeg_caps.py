@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+FFmpeg能力探测
+解析本机FFmpeg的版本、编码器（含多线程方式）、滤镜和命令行选项，只执行一次，
+结果按可执行文件路径+大小+修改时间缓存在内存和磁盘上；
+界面和转换引擎据此只启用本机FFmpeg支持的格式、滤镜和参数，不必每次转换时试错
+"""
+
+import os
+import re
+import shutil
+import subprocess
+import threading
+
+import app_cache
+from media_probe import popen_kwargs
+
+
+# 缓存格式版本，结构变化时递增以废弃旧缓存
+CACHE_VERSION = 1
+
+# 编码器多线程方式
+THREADS_FRAME = 'frame'
+THREADS_SLICE = 'slice'
+
+# -encoders输出的编码器行：6位标志、名称、说明（名称以字母数字开头，跳过" V..... = Video"等图例行）
+ENCODER_LINE = re.compile(r'^\s([VAS][.F][.S][.X][.B][.D])\s+(\w[\w.-]*)\s')
+# -filters输出的滤镜行：3位标志、名称、输入->输出
+FILTER_LINE = re.compile(r'^\s([.T][.S][.C])\s+(\S+)\s+\S+->\S+')
+# -h long输出的选项行
+OPTION_LINE = re.compile(r'^-(\w+)')
+VERSION_LINE = re.compile(r'version\s+n?(\S+)')
+VERSION_NUMBERS = re.compile(r'^(\d+)\.(\d+)')
+
+_memory_cache = {}
+_lock = threading.Lock()
+
+
+class FFmpegCapabilities:
+    """本机FFmpeg支持的功能
+
+    encoders为{编码器名: 多线程方式（THREADS_FRAME/THREADS_SLICE/None）}，只含视频编码器；
+    filters、options为滤镜名和命令行选项名（不含-）的集合；
+    version_tuple为(主版本, 次版本)，从开发版等无法识别的版本号中读不到时为None
+    """
+
+    def __init__(self, path, version=None, encoders=None, filters=None, options=None):
+        self.path = path
+        self.version = version
+        self.encoders = dict(encoders or {})
+        self.filters = set(filters or [])
+        self.options = set(options or [])
+
+    @property
+    def version_tuple(self):
+        match = VERSION_NUMBERS.match(self.version or "")
+        return (int(match.group(1)), int(match.group(2))) if match else None
+
+    def has_encoder(self, name):
+        return name in self.encoders
+
+    def has_filter(self, name):
+        return name in self.filters
+
+    def has_option(self, name):
+        return name in self.options
+
+    def encoder_threads(self, name):
+        """编码器的多线程方式，不支持多线程或不存在时返回None"""
+        return self.encoders.get(name)
+
+    def to_dict(self):
+        return {
+            'path': self.path,
+            'version': self.version,
+            'encoders': self.encoders,
+            'filters': sorted(self.filters),
+            'options': sorted(self.options),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('path'), data.get('version'), data.get('encoders'),
+                   data.get('filters'), data.get('options'))
+
+    def describe(self):
+        return (f"FFmpeg {self.version or '未知版本'}：{len(self.encoders)} 个视频编码器，"
+                f"{len(self.filters)} 个滤镜")
+
+
+def _run(path, *args):
+    """执行FFmpeg并返回标准输出文本，失败时返回None"""
+    try:
+        result = subprocess.run([path, '-hide_banner'] + list(args), capture_output=True,
+                                timeout=30, **popen_kwargs())
+    except (OSError, subprocess.TimeoutExpired) as e:
+        print(f"FFmpeg能力探测失败：{e}")
+        return None
+    return result.stdout if result.returncode == 0 else None
+
+
+def parse_encoders(text):
+    """解析ffmpeg -encoders，返回{视频编码器名: 多线程方式}"""
+    encoders = {}
+    for line in text.splitlines():
+        match = ENCODER_LINE.match(line)
+        if not match or match.group(1)[0] != 'V':
+            continue
+        flags = match.group(1)
+        threads = None
+        if flags[1] == 'F':
+            threads = THREADS_FRAME
+        elif flags[2] == 'S':
+            threads = THREADS_SLICE
+        encoders[match.group(2)] = threads
+    return encoders
+
+
+def parse_filters(text):
+    """解析ffmpeg -filters，返回滤镜名集合"""
+    return {match.group(2) for match in map(FILTER_LINE.match, text.splitlines()) if match}
+
+
+def parse_options(text):
+    """解析ffmpeg -h long，返回选项名集合"""
+    return {match.group(1) for match in map(OPTION_LINE.match, text.splitlines()) if match}
+
+
+def detect(path):
+    """执行FFmpeg探测能力（不使用缓存），任一项失败时返回None"""
+    version_text = _run(path, '-version')
+    encoders_text = _run(path, '-encoders')
+    filters_text = _run(path, '-filters')
+    options_text = _run(path, '-h', 'long')
+    if None in (version_text, encoders_text, filters_text, options_text):
+        return None
+    match = VERSION_LINE.search(version_text.splitlines()[0]) if version_text else None
+    return FFmpegCapabilities(path, match.group(1) if match else None,
+                              parse_encoders(encoders_text), parse_filters(filters_text),
+                              parse_options(options_text))
+
+
+def _cache_path(key):
+    return os.path.join(app_cache.cache_dir('deps'), f"caps_{key}.json")
+
+
+def capabilities(binary):
+    """返回binary（命令名或路径）对应FFmpeg的能力，优先使用缓存；找不到或无法执行时返回None
+
+    首次调用需要执行数次FFmpeg（约几十毫秒），之后同一可执行文件直接读取缓存
+    """
+    path = shutil.which(binary)
+    if path is None:
+        return None
+    try:
+        key = app_cache.file_key(path, CACHE_VERSION)
+    except OSError:
+        return None
+
+    with _lock:
+        cached = _memory_cache.get(binary)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    data = app_cache.load_json(_cache_path(key))
+    if data is not None:
+        caps = FFmpegCapabilities.from_dict(data)
+    else:
+        caps = detect(path)
+        if caps is None:
+            return None
+        app_cache.save_json(_cache_path(key), caps.to_dict())
+    with _lock:
+        _memory_cache[binary] = (key, caps)
+    return caps
+
+
+def cached_capabilities(binary):
+    """已在本进程中读取过的能力（不执行FFmpeg、不读磁盘），尚未读取时返回None"""
+    with _lock:
+        cached = _memory_cache.get(binary)
+    return cached[1] if cached else None
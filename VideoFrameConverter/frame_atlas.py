@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图集（精灵表）输出
+帧由FrameReader直接读入内存，按行依次排入固定大小上限的图集图片，写满一张即编码保存，
+同时生成记录每帧所在图集和矩形位置的JSON索引，不经过逐帧写文件再读回的步骤
+"""
+
+import os
+import threading
+import time
+
+import cv2
+import numpy
+
+import media_probe
+from frame_engine import (ConversionError, ConversionResult, ProgressInfo,
+                          complete_journal, ensure_output_folder, format_frame_name,
+                          get_output_frames, write_journal, write_output_json)
+from frame_encoder import encode_params
+from frame_metrics import (STAGE_CONVERT, STAGE_DECODE, STAGE_ENCODE, STAGE_FINALIZE,
+                           STAGE_PROBE, JobMetrics)
+from frame_reader import FrameReader, display_size
+
+
+# 图集索引文件名（不含前缀）
+ATLAS_INDEX_NAME = 'atlas.json'
+
+# 裁边时与背景色（左上角像素）的最大差值，视为相同颜色
+TRIM_TOLERANCE = 8
+
+# 进度回调的最短间隔（秒）
+PROGRESS_INTERVAL = 0.25
+
+
+def scaled_size(width, height, long_edge):
+    """按长边缩放到long_edge像素（不放大）后的尺寸，与build_scale_filter一致取偶数"""
+    if not long_edge or max(width, height) <= long_edge:
+        return width, height
+    if width >= height:
+        return long_edge, max(2, int(round(height * long_edge / width / 2)) * 2)
+    return max(2, int(round(width * long_edge / height / 2)) * 2), long_edge
+
+
+def trim_box(frame, tolerance=TRIM_TOLERANCE):
+    """去掉与左上角像素颜色相同的边缘，返回内容区域(x, y, 宽, 高)；整帧都是背景色时保留1像素"""
+    background = frame[0, 0, :3].astype(numpy.int16)
+    content = (numpy.abs(frame[:, :, :3].astype(numpy.int16) - background)
+               .max(axis=2) > tolerance)
+    rows = numpy.flatnonzero(content.any(axis=1))
+    cols = numpy.flatnonzero(content.any(axis=0))
+    if rows.size == 0:
+        return 0, 0, 1, 1
+    return (int(cols[0]), int(rows[0]),
+            int(cols[-1] - cols[0] + 1), int(rows[-1] - rows[0] + 1))
+
+
+def atlas_image_name(settings, index):
+    return f"{settings.prefix}atlas_{index}.{settings.format_ext}"
+
+
+class ShelfPacker:
+    """按行排列矩形：从左到右放置，放不下时换行，超出高度时换下一张图集
+
+    columns大于0时每行最多放columns个；padding为矩形之间及与图集边缘的间距
+    """
+
+    def __init__(self, max_size, padding=0, columns=0):
+        self.max_size = max_size
+        self.padding = padding
+        self.columns = columns
+        self.reset()
+
+    def reset(self):
+        self.x = self.padding
+        self.y = self.padding
+        self.row_height = 0
+        self.row_count = 0
+        self.used_width = 0
+        self.used_height = 0
+
+    def fits(self, width, height):
+        """矩形能否放入一张空图集"""
+        return (width + 2 * self.padding <= self.max_size and
+                height + 2 * self.padding <= self.max_size)
+
+    def place(self, width, height):
+        """放置矩形，返回左上角(x, y)；当前图集已满时返回None（调用方保存图集后reset再放）"""
+        full_row = self.columns and self.row_count >= self.columns
+        if full_row or self.x + width + self.padding > self.max_size:
+            self.x = self.padding
+            self.y += self.row_height + self.padding
+            self.row_height = 0
+            self.row_count = 0
+        if self.y + height + self.padding > self.max_size:
+            return None
+        position = (self.x, self.y)
+        self.x += width + self.padding
+        self.row_height = max(self.row_height, height)
+        self.row_count += 1
+        self.used_width = max(self.used_width, self.x)
+        self.used_height = max(self.used_height, self.y + height + self.padding)
+        return position
+
+
+class AtlasConversionJob:
+    """把视频帧直接排入图集图片的转换任务，接口与ConversionJob相同
+
+    每帧在索引中的文件名与逐帧输出相同，记录所在图集、矩形位置；
+    裁边时还记录裁掉的偏移和原始尺寸（spriteSourceSize/sourceSize）
+    """
+
+    def __init__(self, settings, on_progress=None):
+        self.settings = settings
+        self.metrics = JobMetrics(settings)
+        self.metrics.own_bytes = True
+        self.on_progress = self.metrics.wrap(on_progress)
+        self.progress = None
+        self.reader = None
+        self.cancelled = False
+        self._last_update = 0.0
+        self._lock = threading.Lock()
+
+    def run(self):
+        """执行转换，返回ConversionResult"""
+        settings = self.settings
+        settings.validate()
+        ensure_output_folder(settings.output_folder)
+
+        with self.metrics.stage(STAGE_PROBE):
+            info = media_probe.probe(settings.video_file)
+            if info is None or not info.width or not info.height:
+                raise ConversionError(f"无法读取视频尺寸：{settings.video_file}")
+            size = scaled_size(*display_size(info), settings.size)
+            total_frames = get_output_frames(settings)
+        packer = ShelfPacker(settings.atlas_max_size, settings.atlas_padding,
+                             settings.atlas_columns)
+        if not packer.fits(*size):
+            raise ConversionError(f"图集最大尺寸{settings.atlas_max_size}放不下一帧"
+                                  f"（{size[0]}x{size[1]}）")
+
+        self.progress = ProgressInfo(total_frames)
+        reader = FrameReader(settings.video_file, fps=settings.fps, size=size,
+                             pix_fmt='bgra')
+        with self._lock:
+            if self.cancelled:
+                return ConversionResult(None, 0, cancelled=True)
+            write_journal(settings)
+            self.reader = reader
+            reader.on_eof = lambda: self.metrics.observe(self.progress, force=True)
+            reader.start()
+            self.metrics.track(reader.process)
+
+        sheet = numpy.zeros((settings.atlas_max_size, settings.atlas_max_size, 4),
+                            dtype=numpy.uint8)
+        frames = []
+        images = []
+        error_output = ""
+        try:
+            with self.metrics.stage(STAGE_CONVERT):
+                self._pack_frames(reader, packer, sheet, size, frames, images)
+        except ConversionError as e:
+            error_output = str(e)
+        except BaseException:
+            self.cancel()
+            reader.close()
+            raise
+
+        return_code = 1 if error_output else 0
+        result = ConversionResult(return_code, len(frames), self.cancelled, error_output)
+        if result.ok:
+            with self.metrics.stage(STAGE_FINALIZE):
+                try:
+                    self._write_index(frames, images, size)
+                except ConversionError as e:
+                    # 没有索引时图集无法使用，写入失败时转换失败
+                    result = ConversionResult(1, result.frame_count, error_output=str(e))
+                result = complete_journal(settings, result)
+
+        self.progress.finished = True
+        if self.on_progress:
+            self.on_progress(self.progress)
+        return self.metrics.finish(result, self.progress)
+
+    def _pack_frames(self, reader, packer, sheet, size, frames, images):
+        """读取所有帧排入图集，写满的图集随即保存，帧索引和图集信息追加到frames和images"""
+        settings = self.settings
+        metrics = self.metrics
+        reading = iter(enumerate(reader))
+        while True:
+            started = time.perf_counter()
+            try:
+                index, frame = next(reading)
+            except StopIteration:
+                break
+            finally:
+                metrics.add_time(STAGE_DECODE, time.perf_counter() - started)
+            box = trim_box(frame) if settings.atlas_trim else (0, 0, size[0], size[1])
+            position = packer.place(box[2], box[3])
+            if position is None:
+                images.append(self._write_sheet(sheet, packer, len(images)))
+                sheet[:] = 0
+                packer.reset()
+                position = packer.place(box[2], box[3])
+
+            x, y = position
+            trim_x, trim_y, width, height = box
+            sheet[y:y + height, x:x + width] = \
+                frame[trim_y:trim_y + height, trim_x:trim_x + width]
+            frames.append({
+                'filename': format_frame_name(settings.prefix, settings.start_number + index,
+                                              settings.digits, settings.format_ext),
+                'sheet': len(images),
+                'frame': {'x': x, 'y': y, 'w': width, 'h': height},
+                'trimmed': (width, height) != size,
+                'spriteSourceSize': {'x': trim_x, 'y': trim_y, 'w': width, 'h': height},
+                'sourceSize': {'w': size[0], 'h': size[1]},
+                'time': round(index / settings.fps, 6),
+            })
+            self._update_progress(index + 1)
+        if frames and not self.cancelled:
+            images.append(self._write_sheet(sheet, packer, len(images)))
+
+    def _write_sheet(self, sheet, packer, index):
+        """编码并写入一张图集（裁到实际使用的区域），返回文件名"""
+        settings = self.settings
+        started = time.perf_counter()
+        image = sheet[:packer.used_height, :packer.used_width]
+        if settings.format_ext in ('jpg', 'jpeg', 'bmp'):
+            # 不支持透明通道的格式，间距填充为黑色
+            image = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+        ok, data = cv2.imencode('.' + settings.format_ext, image, encode_params(settings))
+        if not ok:
+            raise ConversionError(f"图集编码失败：{settings.format_ext}")
+
+        name = atlas_image_name(settings, index)
+        path = os.path.join(settings.output_folder, name)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data.tobytes())
+        os.replace(tmp_path, path)
+        self.metrics.add_time(STAGE_ENCODE, time.perf_counter() - started)
+        self.progress.total_size += data.nbytes
+        return {'image': name, 'w': packer.used_width, 'h': packer.used_height}
+
+    def _write_index(self, frames, images, size):
+        """写入图集索引，失败时抛出ConversionError"""
+        settings = self.settings
+        write_output_json(os.path.join(settings.output_folder,
+                                       settings.prefix + ATLAS_INDEX_NAME), {
+            'frames': frames,
+            'meta': {
+                'app': 'VideoFrameConverter',
+                'video': os.path.basename(settings.video_file),
+                'fps': settings.fps,
+                'frame_size': {'w': size[0], 'h': size[1]},
+                'padding': settings.atlas_padding,
+                'trim': settings.atlas_trim,
+                'images': images,
+            },
+        })
+
+    def _update_progress(self, frames):
+        progress = self.progress
+        progress.frames = frames
+        if progress.elapsed > 0:
+            progress.fps = frames / progress.elapsed
+        now = time.time()
+        if self.on_progress and now - self._last_update >= PROGRESS_INTERVAL:
+            self._last_update = now
+            self.on_progress(progress)
+
+    def cancel(self):
+        """取消转换：结束FFmpeg，已读入的帧不再写入图集"""
+        with self._lock:
+            self.cancelled = True
+            if self.reader:
+                self.reader.terminate()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量转换队列
+多个视频排队，由有限数量的并发FFmpeg任务依次处理，支持调整顺序和单独取消
+"""
+
+import os
+import threading
+import time
+
+import frame_engine
+import media_probe
+
+
+# 任务状态
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+STATUS_TEXT = {
+    PENDING: "等待中",
+    RUNNING: "转换中",
+    DONE: "已完成",
+    FAILED: "失败",
+    CANCELLED: "已取消",
+}
+
+
+def collect_video_files(paths):
+    """展开文件和文件夹，返回其中的视频文件列表（保持顺序，去重）"""
+    files = []
+    seen = set()
+    for path in paths:
+        if os.path.isdir(path):
+            candidates = []
+            for folder, _, names in os.walk(path):
+                for name in sorted(names):
+                    candidates.append(os.path.join(folder, name))
+        else:
+            candidates = [path]
+
+        for candidate in candidates:
+            if not candidate.lower().endswith(frame_engine.VIDEO_EXTENSIONS):
+                continue
+            key = os.path.normcase(os.path.abspath(candidate))
+            if key not in seen:
+                seen.add(key)
+                files.append(candidate)
+    return files
+
+
+class BatchJob:
+    """队列中的单个视频任务"""
+
+    def __init__(self, job_id, video_file):
+        self.job_id = job_id
+        self.video_file = video_file
+        self.output_folder = None
+        self.status = PENDING
+        self.frame_count = 0
+        self.total_frames = 0
+        self.progress_info = None  # 最新的ProgressInfo
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self.job = None
+        self.metrics = None  # 任务结束后的JobMetrics
+
+    @property
+    def name(self):
+        return os.path.basename(self.video_file)
+
+    @property
+    def progress(self):
+        if self.status == DONE:
+            return 100
+        if self.progress_info is not None:
+            return self.progress_info.percent
+        return frame_engine.progress_percent(self.frame_count, self.total_frames)
+
+    @property
+    def throughput(self):
+        """处理速度（帧/秒）"""
+        if not self.started_at:
+            return 0
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return self.frame_count / elapsed if elapsed > 0 else 0
+
+
+class BatchQueue:
+    """批量转换队列
+
+    template为公共转换参数，其output_folder作为输出根目录，fps为None时使用原视频帧率，
+    可在start()之前再设置。每个视频输出到以视频名命名的子文件夹，与其他任务重名或磁盘上已存在时自动追加序号。
+    on_update(job)在任务状态或进度变化时从工作线程调用。
+    """
+
+    def __init__(self, template, max_jobs=2, on_update=None):
+        self.template = template
+        self.max_jobs = max_jobs
+        self.on_update = on_update
+        self.jobs = []
+        self.started_at = None
+        self._next_id = 1
+        self._used_folders = set()
+        self._lock = threading.RLock()
+        self._idle = threading.Event()
+        self._idle.set()
+
+    def add(self, video_file):
+        """添加视频，返回BatchJob"""
+        with self._lock:
+            job = BatchJob(self._next_id, video_file)
+            self._next_id += 1
+            self.jobs.append(job)
+        # 在后台预先探测，任务开始时直接使用缓存
+        media_probe.prefetch([video_file])
+        self._dispatch()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            for job in self.jobs:
+                if job.job_id == job_id:
+                    return job
+        return None
+
+    def move(self, job_id, offset):
+        """调整等待中任务的顺序，offset为负数时提前"""
+        with self._lock:
+            job = self.get(job_id)
+            if not job or job.status != PENDING:
+                return False
+            index = self.jobs.index(job)
+            new_index = max(0, min(len(self.jobs) - 1, index + offset))
+            self.jobs.insert(new_index, self.jobs.pop(index))
+            return True
+
+    def cancel(self, job_id):
+        """取消单个任务"""
+        with self._lock:
+            job = self.get(job_id)
+            if not job or job.status not in (PENDING, RUNNING):
+                return False
+            if job.status == RUNNING and job.job:
+                job.job.cancel()
+            job.status = CANCELLED
+        self._notify(job)
+        self._dispatch()
+        return True
+
+    def cancel_all(self):
+        """取消所有未完成的任务"""
+        with self._lock:
+            job_ids = [job.job_id for job in self.jobs]
+        for job_id in job_ids:
+            self.cancel(job_id)
+
+    def start(self):
+        """开始调度"""
+        with self._lock:
+            if self.started_at is None:
+                self.started_at = time.time()
+        self._dispatch()
+
+    def wait(self):
+        """阻塞直到队列中没有等待或运行的任务"""
+        self._idle.wait()
+
+    @property
+    def running_count(self):
+        with self._lock:
+            return sum(1 for job in self.jobs if job.status == RUNNING)
+
+    @property
+    def throughput(self):
+        """整体处理速度（帧/秒）"""
+        with self._lock:
+            if not self.started_at:
+                return 0
+            frames = sum(job.frame_count for job in self.jobs)
+        elapsed = time.time() - self.started_at
+        return frames / elapsed if elapsed > 0 else 0
+
+    def summary(self):
+        """各状态任务数"""
+        with self._lock:
+            counts = {status: 0 for status in STATUS_TEXT}
+            for job in self.jobs:
+                counts[job.status] += 1
+            return counts
+
+    def derive_output_folder(self, video_file):
+        """为视频生成不与其他任务冲突、磁盘上也不存在的输出子文件夹
+
+        续转时沿用以视频名命名的已有文件夹，由续转核对其中的转换记录
+        """
+        stem = os.path.splitext(os.path.basename(video_file))[0]
+        root = self.template.output_folder
+        folder = os.path.join(root, stem)
+        suffix = 2
+        while (os.path.normcase(folder) in self._used_folders or
+               (not self.template.resume and os.path.exists(folder))):
+            folder = os.path.join(root, f"{stem}_{suffix}")
+            suffix += 1
+        self._used_folders.add(os.path.normcase(folder))
+        return folder
+
+    def _dispatch(self):
+        """在并发数允许的范围内启动等待中的任务"""
+        with self._lock:
+            if self.started_at is None:
+                return
+            for job in self.jobs:
+                if self.running_count >= self.max_jobs:
+                    break
+                if job.status != PENDING:
+                    continue
+                job.status = RUNNING
+                job.started_at = time.time()
+                if job.output_folder is None:
+                    job.output_folder = self.derive_output_folder(job.video_file)
+                settings = self.template.copy(video_file=job.video_file,
+                                              output_folder=job.output_folder)
+                job.job = frame_engine.create_job(
+                    settings, on_progress=lambda progress, job=job:
+                    self._on_progress(job, progress))
+                thread = threading.Thread(target=self._run_job, args=(job,))
+                thread.daemon = True
+                thread.start()
+
+            active = any(job.status in (PENDING, RUNNING) for job in self.jobs)
+            if active:
+                self._idle.clear()
+            else:
+                self._idle.set()
+
+    def _run_job(self, job):
+        """执行单个任务（在工作线程中运行）"""
+        self._notify(job)
+        try:
+            # 公共参数未指定帧率时使用各视频的原始帧率
+            settings = job.job.settings
+            if settings.fps is None:
+                settings.fps = frame_engine.get_video_fps(job.video_file) or 30
+            result = job.job.run()
+            with self._lock:
+                job.frame_count = result.frame_count
+                job.metrics = result.metrics
+                if result.cancelled or job.status == CANCELLED:
+                    job.status = CANCELLED
+                elif result.ok:
+                    job.status = DONE
+                else:
+                    job.status = FAILED
+                    job.error = result.error_output or "FFmpeg转换过程中出现错误"
+        except Exception as e:
+            with self._lock:
+                job.status = FAILED
+                job.error = str(e)
+
+        job.finished_at = time.time()
+        self._notify(job)
+        self._dispatch()
+
+    def _on_progress(self, job, progress):
+        job.progress_info = progress
+        job.frame_count = progress.frames
+        job.total_frames = progress.total_frames
+        self._notify(job)
+
+    def _notify(self, job):
+        if self.on_update:
+            self.on_update(job)
@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+转换性能基准测试
+用FFmpeg的lavfi测试源在本地生成不同分辨率、编码、GOP长度和时长的视频（缓存复用），
+按输出格式、帧率、并行数和引擎组合逐项测量转换速度、耗时、峰值内存和写入字节数，
+以及预览的跳转和播放延迟；每一项在独立子进程中运行，结果写成JSON，可与基准结果对比
+
+    python frame_bench.py run -o result.json
+    python frame_bench.py compare baseline.json result.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import app_cache
+import frame_engine
+import media_probe
+from media_probe import popen_kwargs
+
+try:
+    import resource
+except ImportError:
+    # Windows下没有resource模块，不统计峰值内存
+    resource = None
+
+
+# 结果文件格式版本
+RESULT_VERSION = 1
+
+# 测试视频：名称 -> 生成参数
+SOURCES = {
+    'h264_480p_gop12': {'size': '854x480', 'rate': 25, 'duration': 10,
+                        'codec': 'libx264', 'gop': 12},
+    'h264_1080p_gop250': {'size': '1920x1080', 'rate': 25, 'duration': 6,
+                          'codec': 'libx264', 'gop': 250},
+    'mpeg4_720p_gop30': {'size': '1280x720', 'rate': 30, 'duration': 8,
+                         'codec': 'mpeg4', 'gop': 30},
+    'hevc_1080p_gop60': {'size': '1920x1080', 'rate': 30, 'duration': 6,
+                         'codec': 'libx265', 'gop': 60},
+    'h264_2160p_gop50': {'size': '3840x2160', 'rate': 25, 'duration': 3,
+                         'codec': 'libx264', 'gop': 50},
+    'h264_360p_long': {'size': '640x360', 'rate': 30, 'duration': 60,
+                       'codec': 'libx264', 'gop': 300},
+}
+
+# 各测试集使用的视频
+SUITES = {
+    'quick': ['h264_480p_gop12', 'h264_1080p_gop250', 'mpeg4_720p_gop30'],
+    'full': list(SOURCES),
+}
+
+# 转换组合：(输出格式, 帧率（None为原帧率）, 并行数, 引擎)
+CONVERSION_CASES = {
+    'quick': [
+        ('png', None, 1, frame_engine.ENGINE_FFMPEG),
+        ('jpg', None, 1, frame_engine.ENGINE_FFMPEG),
+        ('bmp', None, 1, frame_engine.ENGINE_FFMPEG),
+        ('png', 5, 1, frame_engine.ENGINE_FFMPEG),
+        ('png', None, 2, frame_engine.ENGINE_FFMPEG),
+    ],
+    'full': [
+        ('png', None, 1, frame_engine.ENGINE_FFMPEG),
+        ('jpg', None, 1, frame_engine.ENGINE_FFMPEG),
+        ('bmp', None, 1, frame_engine.ENGINE_FFMPEG),
+        ('qoi', None, 1, frame_engine.ENGINE_FFMPEG),
+        ('webp', None, 1, frame_engine.ENGINE_FFMPEG),
+        ('png', 5, 1, frame_engine.ENGINE_FFMPEG),
+        ('png', None, 2, frame_engine.ENGINE_FFMPEG),
+        ('png', None, 4, frame_engine.ENGINE_FFMPEG),
+        ('png', None, 2, frame_engine.ENGINE_POOL),
+        ('jpg', None, 4, frame_engine.ENGINE_POOL),
+    ],
+}
+
+# 预览测试：随机跳转次数、连续播放读取的帧数
+SEEK_COUNT = 20
+PLAYBACK_FRAMES = 120
+
+# 指标及其方向：True为越大越好
+METRICS = {
+    'fps': True,
+    'wall': False,
+    'peak_rss_mb': False,
+    'bytes': False,
+    'seek_median_ms': False,
+    'seek_p95_ms': False,
+    'first_frame_ms': False,
+    'playback_fps': True,
+}
+
+# 默认回归阈值（相对变化）
+DEFAULT_THRESHOLD = 0.10
+
+
+def source_path(name):
+    """测试视频的缓存路径，生成参数变化时文件名随之变化"""
+    params = SOURCES[name]
+    tag = "_".join(str(params[key]) for key in sorted(params))
+    return os.path.join(app_cache.cache_dir('bench'), f"{name}_{tag}.mp4")
+
+
+def generate_source(name):
+    """用lavfi测试源生成测试视频（已存在时直接返回路径）"""
+    path = source_path(name)
+    if os.path.isfile(path):
+        return path
+    params = SOURCES[name]
+    cmd = [frame_engine.FFMPEG, '-hide_banner', '-loglevel', 'error', '-f', 'lavfi',
+           '-i', f"testsrc2=size={params['size']}:rate={params['rate']}"
+                 f":duration={params['duration']}",
+           '-c:v', params['codec'], '-g', str(params['gop']), '-pix_fmt', 'yuv420p']
+    if params['codec'] in ('libx264', 'libx265'):
+        cmd += ['-preset', 'veryfast']
+    else:
+        cmd += ['-q:v', '5']
+    tmp_path = path + '.tmp.mp4'
+    result = subprocess.run(cmd + ['-y', tmp_path], capture_output=True, **popen_kwargs())
+    if result.returncode != 0:
+        raise frame_engine.ConversionError(
+            f"生成测试视频失败（{name}）：{result.stderr.strip()}")
+    os.replace(tmp_path, path)
+    return path
+
+
+def ffmpeg_version():
+    try:
+        result = subprocess.run([frame_engine.FFMPEG, '-version'], capture_output=True,
+                                timeout=10, **popen_kwargs())
+        return result.stdout.splitlines()[0] if result.stdout else None
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+
+
+def peak_rss_mb(children=False):
+    """本进程或已结束的子进程中最大的常驻内存（MB），无法统计时返回None"""
+    if resource is None:
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    rss = resource.getrusage(who).ru_maxrss
+    # Linux单位为KB，macOS为字节
+    return round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def folder_bytes(folder):
+    total = 0
+    for root, _, names in os.walk(folder):
+        for name in names:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def case_id(kind, source, *parts):
+    return "/".join([kind, source] + [str(part) for part in parts])
+
+
+def plan_cases(suite):
+    """生成测试集的全部测试项"""
+    cases = []
+    for source in SUITES[suite]:
+        for format_ext, fps, workers, engine in CONVERSION_CASES[suite]:
+            cases.append({
+                'id': case_id('convert', source, format_ext,
+                              f"fps{fps or 'src'}", f"w{workers}", engine),
+                'kind': 'convert', 'source': source, 'format_ext': format_ext,
+                'fps': fps, 'workers': workers, 'engine': engine,
+            })
+        cases.append({'id': case_id('preview', source), 'kind': 'preview',
+                      'source': source})
+    return cases
+
+
+def measure_conversion(case, video):
+    """执行一次转换并测量（在子进程中运行）"""
+    fps = case['fps'] or frame_engine.get_video_fps(video)
+    output_folder = tempfile.mkdtemp(prefix='vfc_bench_')
+    try:
+        settings = frame_engine.ConversionSettings(
+            video_file=video, output_folder=output_folder, fps=fps,
+            format_ext=case['format_ext'], workers=case['workers'], engine=case['engine'])
+        started = time.perf_counter()
+        result = frame_engine.create_job(settings).run()
+        wall = time.perf_counter() - started
+        if not result.ok:
+            raise frame_engine.ConversionError(result.error_output or "转换失败")
+        return {
+            'frames': result.frame_count,
+            'wall': round(wall, 4),
+            'fps': round(result.frame_count / wall, 2) if wall > 0 else 0,
+            'bytes': folder_bytes(output_folder),
+            'peak_rss_mb': peak_rss_mb(children=True),
+            'python_rss_mb': peak_rss_mb(),
+        }
+    finally:
+        shutil.rmtree(output_folder, ignore_errors=True)
+
+
+def measure_preview(video):
+    """测量拖动跳转到随机帧的延迟和顺序播放的读取速度（在子进程中运行）"""
+    import random
+    import threading
+
+    from preview_buffer import SequentialDecoder
+    from preview_cache import LRUFrameCache, ScrubDecoder
+
+    fps = frame_engine.get_video_fps(video) or 25
+    total = frame_engine.get_total_frames(video)
+    done = threading.Event()
+    scrub = ScrubDecoder(video, fps, LRUFrameCache(), lambda number, image: done.set())
+    # 等待关键帧索引建立，跳转延迟不受探测影响
+    deadline = time.time() + 30
+    while not scrub.index.ready and time.time() < deadline:
+        time.sleep(0.01)
+
+    # 固定种子，每次测试跳转到相同的帧
+    targets = random.Random(total).sample(range(total), min(SEEK_COUNT, total))
+    latencies = []
+    for target in targets:
+        done.clear()
+        started = time.perf_counter()
+        scrub.request(target)
+        if done.wait(30):
+            latencies.append((time.perf_counter() - started) * 1000)
+    scrub.stop()
+    # 解码线程仍在使用VideoCapture时退出进程会导致崩溃，等待其结束
+    scrub._thread.join(10)
+
+    started = time.perf_counter()
+    decoder = SequentialDecoder(video)
+    first_frame = None
+    frames = 0
+    while frames < min(PLAYBACK_FRAMES, total):
+        item = decoder.read(timeout=5)
+        if item is None:
+            break
+        if first_frame is None:
+            first_frame = time.perf_counter() - started
+        frames += 1
+    wall = time.perf_counter() - started
+    decoder.stop()
+    decoder._thread.join(10)
+
+    latencies.sort()
+    return {
+        'frames': frames,
+        'seek_median_ms': round(statistics.median(latencies), 2) if latencies else None,
+        'seek_p95_ms': (round(latencies[int(len(latencies) * 0.95) - 1], 2)
+                        if latencies else None),
+        'first_frame_ms': round(first_frame * 1000, 2) if first_frame is not None else None,
+        'playback_fps': round(frames / wall, 2) if wall > 0 else 0,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def run_case_in_child(case, video):
+    """在新的Python进程中运行一个测试项，避免前一项的内存和缓存影响结果"""
+    cmd = [sys.executable, os.path.abspath(__file__), '_case', json.dumps(case), video]
+    result = subprocess.run(cmd, capture_output=True, **popen_kwargs())
+    if result.returncode != 0:
+        return {'error': (result.stderr.strip().splitlines() or ["未知错误"])[-1]}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def median_result(runs):
+    """多次运行取各数值指标的中位数"""
+    errors = [run['error'] for run in runs if 'error' in run]
+    if errors:
+        return {'error': errors[0]}
+    merged = dict(runs[0])
+    for key, value in runs[0].items():
+        values = [run[key] for run in runs if isinstance(run.get(key), (int, float))]
+        if len(values) == len(runs) and not isinstance(value, bool):
+            # 帧数、字节数等整数指标取实际出现过的值
+            if all(isinstance(v, int) for v in values):
+                merged[key] = statistics.median_low(values)
+            else:
+                merged[key] = statistics.median(values)
+    merged['runs'] = len(runs)
+    return merged
+
+
+def run_suite(args):
+    cases = plan_cases(args.suite)
+    if args.filter:
+        cases = [case for case in cases if args.filter in case['id']]
+    videos = {}
+    results = {}
+    for index, case in enumerate(cases, 1):
+        source = case['source']
+        if source not in videos:
+            print(f"生成测试视频 {source} ...", file=sys.stderr)
+            videos[source] = generate_source(source)
+            # 预先探测，探测结果缓存后不计入每一项的耗时
+            media_probe.count_source_frames(videos[source])
+            media_probe.probe(videos[source], keyframes=True)
+        runs = [run_case_in_child(case, videos[source]) for _ in range(args.repeat)]
+        results[case['id']] = median_result(runs)
+        summary = results[case['id']].get('error') or describe_result(results[case['id']])
+        print(f"[{index}/{len(cases)}] {case['id']}: {summary}", file=sys.stderr)
+
+    report = {
+        'version': RESULT_VERSION,
+        'suite': args.suite,
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'machine': {
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'cpu_count': os.cpu_count(),
+            'ffmpeg': ffmpeg_version(),
+        },
+        'sources': {name: SOURCES[name] for name in SUITES[args.suite]},
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 1 if any('error' in result for result in results.values()) else 0
+
+
+def describe_result(result):
+    parts = []
+    for key in METRICS:
+        if result.get(key) is not None:
+            parts.append(f"{key}={result[key]}")
+    return ", ".join(parts)
+
+
+def compare_results(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """对比两次结果，返回(回归列表, 改进列表, 缺失的测试项)
+
+    每项为(测试项, 指标, 基准值, 当前值, 相对变化)；基准中出错的测试项不参与对比
+    """
+    regressions = []
+    improvements = []
+    missing = []
+    for case, base in baseline.get('results', {}).items():
+        if 'error' in base:
+            continue
+        result = current.get('results', {}).get(case)
+        if result is None or 'error' in result:
+            missing.append(case)
+            continue
+        for metric, higher_is_better in METRICS.items():
+            old, new = base.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            row = (case, metric, old, new, change)
+            if worse > threshold:
+                regressions.append(row)
+            elif worse < -threshold:
+                improvements.append(row)
+    return regressions, improvements, missing
+
+
+def run_compare(args):
+    baseline = app_cache.load_json(args.baseline)
+    current = app_cache.load_json(args.current)
+    if baseline is None or current is None:
+        print("错误：无法读取结果文件", file=sys.stderr)
+        return 2
+    if baseline.get('machine') != current.get('machine'):
+        print("注意：两次结果来自不同的机器或FFmpeg版本，对比仅供参考", file=sys.stderr)
+
+    regressions, improvements, missing = compare_results(baseline, current, args.threshold)
+    for title, rows in (("回归", regressions), ("改进", improvements)):
+        for case, metric, old, new, change in rows:
+            print(f"{title}  {case}  {metric}: {old} -> {new} ({change:+.1%})")
+    for case in missing:
+        print(f"缺失  {case}")
+    print(f"共 {len(regressions)} 项回归，{len(improvements)} 项改进，{len(missing)} 项缺失"
+          f"（阈值 {args.threshold:.0%}）")
+    return 1 if regressions or missing else 0
+
+
+def run_child(args):
+    """子进程入口：运行一个测试项，最后一行输出JSON结果"""
+    case = json.loads(args.case)
+    if case['kind'] == 'preview':
+        result = measure_preview(args.video)
+    else:
+        result = measure_conversion(case, args.video)
+    print(json.dumps(result))
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="视频转序列帧性能基准测试")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help="运行基准测试")
+    run.add_argument('--suite', default='quick', choices=list(SUITES),
+                     help="测试集：quick为少量常用组合，full为全部分辨率、编码和组合")
+    run.add_argument('--filter', help="只运行ID中包含该文字的测试项")
+    run.add_argument('--repeat', type=int, default=1, help="每项重复次数，结果取中位数")
+    run.add_argument('-o', '--output', help="结果JSON文件，默认输出到标准输出")
+
+    compare = commands.add_parser('compare', help="与基准结果对比，发现回归时退出码为1")
+    compare.add_argument('baseline', help="基准结果JSON")
+    compare.add_argument('current', help="本次结果JSON")
+    compare.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                         help="回归阈值（相对变化，默认0.1即10%%）")
+
+    child = commands.add_parser('_case')
+    child.add_argument('case')
+    child.add_argument('video')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == 'run':
+        return run_suite(args)
+    if args.command == 'compare':
+        return run_compare(args)
+    return run_child(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
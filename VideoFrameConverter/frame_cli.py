@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视频转序列帧命令行工具
+无需图形界面，直接驱动FFmpeg，可用于服务器和批处理调度
+
+示例：
+    python frame_cli.py input.mp4 -o out --fps 24 --prefix shot_ --start 1 --digits 4 --format png
+    python frame_cli.py clips/ a.mp4 b.mov -o out --jobs 4    # 批量：每个视频输出到out下的同名子文件夹
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+import frame_batch
+import frame_engine
+
+
+def build_parser():
+    """构建命令行参数解析器"""
+    parser = argparse.ArgumentParser(description="视频转序列帧（FFmpeg）")
+    parser.add_argument('videos', nargs='+', metavar='video',
+                        help="输入视频文件或文件夹")
+    parser.add_argument('-o', '--output', required=True, help="输出文件夹")
+    parser.add_argument('--fps', type=float, default=None,
+                        help="输出帧率，默认使用原视频帧率")
+    parser.add_argument('--mode', default=frame_engine.MODE_FPS,
+                        choices=frame_engine.MODES,
+                        help="取帧方式：fps按帧率，keyframes仅关键帧，scene每个镜头一帧，"
+                             "stride每N帧一帧，list指定帧号或时间点")
+    parser.add_argument('--scene-threshold', type=float,
+                        default=frame_engine.DEFAULT_SCENE_THRESHOLD,
+                        help="场景切换阈值（0~1），仅--mode scene使用")
+    parser.add_argument('--stride', type=int, default=frame_engine.DEFAULT_STRIDE,
+                        help="每N帧取一帧的间隔，仅--mode stride使用")
+    parser.add_argument('--frames', dest='frame_list', action='append', default=[],
+                        metavar='LIST',
+                        help="要提取的帧（如 0,120,2.5s,1:30），整数为源帧号（从0开始），"
+                             "可重复指定，仅--mode list使用")
+    parser.add_argument('--frames-file', dest='frame_list_file',
+                        help="帧列表文件（每行一个或逗号分隔，#为注释），仅--mode list使用")
+    parser.add_argument('--dedupe', action='store_true',
+                        help="丢弃与上一保留帧几乎相同的帧，并在输出文件夹写入manifest.json")
+    parser.add_argument('--dedupe-threshold', type=float,
+                        default=frame_engine.DEFAULT_DEDUPE_THRESHOLD,
+                        help="去重阈值：8x8块内平均像素差（0~255）")
+    parser.add_argument('--range', dest='ranges', action='append', default=[],
+                        type=parse_range_arg, metavar='START-END',
+                        help="只提取指定区间（如 1:30-1:40 或 90-100），可重复指定多个")
+    parser.add_argument('--per-range-numbering', action='store_true',
+                        help="每个区间从起始序号重新编号（文件名加r01_等区间前缀）")
+    parser.add_argument('--prefix', default="", help="文件名前缀")
+    parser.add_argument('--start', type=int, default=1, help="起始序号")
+    parser.add_argument('--digits', type=int, default=3, help="序号位数")
+    parser.add_argument('--format', dest='format_ext', default='png',
+                        choices=frame_engine.OUTPUT_FORMATS, help="输出格式")
+    parser.add_argument('--pack', default=None, choices=frame_engine.PACK_FORMATS,
+                        help="打包输出：所有帧写入输出文件夹中的单个归档（frames.tar/zip/vfcpack），"
+                             "文件名与逐帧输出相同")
+    parser.add_argument('--atlas', action='store_true',
+                        help="图集输出：帧直接排入图集图片（atlas_0.png…），并写入atlas.json索引")
+    parser.add_argument('--atlas-columns', type=int, default=0,
+                        help="图集每行最多帧数，默认按最大边长排满")
+    parser.add_argument('--atlas-max-size', type=int,
+                        default=frame_engine.DEFAULT_ATLAS_MAX_SIZE, help="图集最大边长（像素）")
+    parser.add_argument('--atlas-padding', type=int,
+                        default=frame_engine.DEFAULT_ATLAS_PADDING, help="图集中帧之间的间距（像素）")
+    parser.add_argument('--atlas-trim', action='store_true',
+                        help="去掉每帧与背景色（左上角像素）相同的边缘，索引中记录偏移")
+    parser.add_argument('--size', type=int, default=0,
+                        help="缩放后的长边像素（不放大），默认原尺寸")
+    parser.add_argument('--quality', type=int, default=None,
+                        help="JPG/WebP质量（1~100），默认使用编码器的设置；WebP指定质量时为有损")
+    parser.add_argument('--compression-level', type=int, default=None,
+                        help="PNG（0~9）或WebP（0~6）压缩级别，越低越快、文件越大")
+    parser.add_argument('--png-pred', default=None, choices=frame_engine.PNG_PREDICTIONS,
+                        help="PNG行预测方式，none最快")
+    parser.add_argument('--target', dest='targets', action='append', default=[],
+                        type=parse_target_arg, metavar='SPEC',
+                        help="附加输出，与主输出共用一次解码，可重复指定，如 "
+                             "folder=512,format=jpg,size=512,quality=85（folder可相对-o）")
+    parser.add_argument('-j', '--workers', type=int, default=1,
+                        help="并行进程数（ffmpeg引擎为分段数，pool引擎为编码进程数），0表示使用全部CPU核心")
+    parser.add_argument('--engine', default=frame_engine.ENGINE_FFMPEG,
+                        choices=frame_engine.ENGINES,
+                        help="转换引擎：ffmpeg直接输出图片，pool由FFmpeg解码、多进程并行编码")
+    parser.add_argument('--resume', action='store_true',
+                        help="续转：跳过输出文件夹中已存在的帧，参数与上次不一致时拒绝")
+    parser.add_argument('--jobs', type=int, default=2,
+                        help="批量模式下同时转换的视频数")
+    parser.add_argument('--metrics', dest='metrics_stream', metavar='FILE',
+                        help="逐行输出各阶段耗时、帧率和FFmpeg资源占用（logfmt格式），"
+                             "追加写入FILE，-为标准输出；每个输出文件夹另有.vfc_metrics.json报告")
+    parser.add_argument('-q', '--quiet', action='store_true', help="不输出进度")
+    return parser
+
+
+def parse_range_arg(text):
+    """argparse用的区间解析"""
+    try:
+        return frame_engine.parse_range(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"区间格式错误：{text}（应为 开始-结束，如 1:30-1:40）")
+
+
+def parse_target_arg(text):
+    """argparse用的附加输出解析"""
+    try:
+        return frame_engine.parse_target(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"附加输出格式错误：{text}（应为 folder=文件夹,format=jpg,size=512,quality=85,prefix=前缀）")
+
+
+# 进度输出的最短间隔（秒）
+PROGRESS_INTERVAL = 0.5
+
+_last_print = 0.0
+
+
+def throttled():
+    """距上次输出不足PROGRESS_INTERVAL时返回True"""
+    global _last_print
+    now = time.time()
+    if now - _last_print < PROGRESS_INTERVAL:
+        return True
+    _last_print = now
+    return False
+
+
+def print_progress(progress):
+    """在同一行输出进度"""
+    if throttled() and not progress.finished:
+        return
+    sys.stderr.write("\r" + progress.describe().ljust(60))
+    sys.stderr.flush()
+
+
+def print_batch_progress(queue):
+    """在同一行输出批量队列的整体进度"""
+    if throttled():
+        return
+    counts = queue.summary()
+    finished = counts[frame_batch.DONE] + counts[frame_batch.FAILED] + \
+        counts[frame_batch.CANCELLED]
+    sys.stderr.write(f"\r批量转换中... {finished}/{len(queue.jobs)} 个视频, "
+                     f"运行中 {counts[frame_batch.RUNNING]}, "
+                     f"{queue.throughput:.1f} 帧/秒")
+    sys.stderr.flush()
+
+
+def run_batch(args, videos):
+    """批量转换多个视频"""
+    template = build_settings(args, None, args.output, args.fps)
+    queue = frame_batch.BatchQueue(template, max_jobs=max(1, args.jobs))
+    if not args.quiet:
+        queue.on_update = lambda job: print_batch_progress(queue)
+    for video in videos:
+        queue.add(video)
+
+    try:
+        queue.start()
+        queue.wait()
+    except KeyboardInterrupt:
+        queue.cancel_all()
+        print("\n转换已取消", file=sys.stderr)
+        return 130
+
+    if not args.quiet:
+        sys.stderr.write("\n")
+    failed = 0
+    for job in queue.jobs:
+        status = frame_batch.STATUS_TEXT[job.status]
+        line = f"{status}  {job.video_file} -> {job.output_folder} ({job.frame_count} 帧)"
+        if job.error:
+            line += f"：{job.error}"
+            failed += 1
+        print(line, file=sys.stderr)
+        if job.metrics and not args.quiet:
+            print(f"    {job.metrics.summary()}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def build_settings(args, video_file, output_folder, fps):
+    """根据命令行参数构建转换参数"""
+    return frame_engine.ConversionSettings(
+        video_file=video_file,
+        output_folder=output_folder,
+        fps=fps,
+        prefix=args.prefix,
+        start_number=args.start,
+        digits=args.digits,
+        format_ext=args.format_ext,
+        size=args.size,
+        quality=args.quality,
+        compression_level=args.compression_level,
+        png_pred=args.png_pred,
+        pack=args.pack,
+        atlas=args.atlas,
+        atlas_columns=args.atlas_columns,
+        atlas_max_size=args.atlas_max_size,
+        atlas_padding=args.atlas_padding,
+        atlas_trim=args.atlas_trim,
+        targets=args.targets,
+        workers=args.workers or os.cpu_count() or 1,
+        resume=args.resume,
+        engine=args.engine,
+        mode=args.mode,
+        scene_threshold=args.scene_threshold,
+        stride=args.stride,
+        frame_list=args.frame_list,
+        frame_list_file=args.frame_list_file,
+        dedupe=args.dedupe,
+        dedupe_threshold=args.dedupe_threshold,
+        ranges=args.ranges,
+        range_numbering=(frame_engine.NUMBERING_PER_RANGE if args.per_range_numbering
+                         else frame_engine.NUMBERING_CONTINUOUS),
+        metrics_stream=args.metrics_stream,
+    )
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    videos = frame_batch.collect_video_files(args.videos)
+    if len(args.videos) == 1 and os.path.isfile(args.videos[0]):
+        videos = args.videos
+    if not videos:
+        print("错误：未找到视频文件", file=sys.stderr)
+        return 2
+    if len(videos) > 1 or os.path.isdir(args.videos[0]):
+        return run_batch(args, videos)
+
+    video = videos[0]
+    fps = args.fps
+    if fps is None:
+        fps = frame_engine.get_video_fps(video) or 30
+
+    settings = build_settings(args, video, args.output, fps)
+    job = frame_engine.create_job(
+        settings, on_progress=None if args.quiet else print_progress)
+
+    try:
+        result = job.run()
+    except frame_engine.ConversionError as e:
+        print(f"错误：{e}", file=sys.stderr)
+        return 2
+    except KeyboardInterrupt:
+        job.cancel()
+        print("\n转换已取消", file=sys.stderr)
+        return 130
+
+    if not args.quiet:
+        sys.stderr.write("\n")
+    if result.ok:
+        print(f"转换完成，共生成 {result.frame_count} 帧", file=sys.stderr)
+        if result.metrics and not args.quiet:
+            print(result.metrics.summary(), file=sys.stderr)
+        return 0
+    print("转换失败：FFmpeg转换过程中出现错误", file=sys.stderr)
+    if result.error_output:
+        print(result.error_output, file=sys.stderr)
+    return result.return_code or 1
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+进程池并行编码
+FFmpeg只负责解码并输出BGR原始像素，帧直接读入共享内存环形缓冲区的空闲槽位，
+由进程池中的多个进程编码为图片并写入；空闲槽位用完时读取端阻塞等待，内存占用有上限
+"""
+
+import concurrent.futures
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy
+
+from frame_engine import (ConversionError, ConversionResult, ProgressInfo,
+                          complete_journal, ensure_output_folder, format_frame_name,
+                          get_output_frames, write_journal)
+from frame_metrics import (STAGE_CONVERT, STAGE_DECODE, STAGE_ENCODE_WAIT, STAGE_FINALIZE,
+                           STAGE_PROBE, JobMetrics)
+from frame_reader import FrameReader
+
+
+# 共享内存环形缓冲区的默认大小上限
+RING_MAX_BYTES = 256 * 1024 * 1024
+
+# 每个编码进程对应的槽位数（读取端可领先编码端的帧数）
+SLOTS_PER_WORKER = 4
+
+# 进度回调的最短间隔（秒）
+PROGRESS_INTERVAL = 0.25
+
+# 未指定时的OpenCV编码参数
+DEFAULT_PNG_COMPRESSION = 1
+DEFAULT_JPEG_QUALITY = 95
+
+# PNG预测方式对应的OpenCV行滤波器
+PNG_FILTERS = {
+    'none': cv2.IMWRITE_PNG_FILTER_NONE,
+    'sub': cv2.IMWRITE_PNG_FILTER_SUB,
+    'up': cv2.IMWRITE_PNG_FILTER_UP,
+    'avg': cv2.IMWRITE_PNG_FILTER_AVG,
+    'paeth': cv2.IMWRITE_PNG_FILTER_PAETH,
+    'mixed': cv2.IMWRITE_PNG_ALL_FILTERS,
+}
+
+_worker_ring = None  # 编码进程中附加的共享内存
+
+
+def _init_worker(ring_name):
+    """编码进程初始化：附加共享内存环形缓冲区"""
+    global _worker_ring
+    # Ctrl+C由主进程处理（取消任务），编码进程不单独退出
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _worker_ring = shared_memory.SharedMemory(name=ring_name)
+
+
+def encode_params(settings):
+    """按输出格式、质量和压缩级别生成OpenCV编码参数"""
+    ext = settings.format_ext
+    if ext == 'png':
+        level = settings.compression_level
+        params = [cv2.IMWRITE_PNG_COMPRESSION,
+                  DEFAULT_PNG_COMPRESSION if level is None else level]
+        if settings.png_pred is not None:
+            params += [cv2.IMWRITE_PNG_FILTER, PNG_FILTERS[settings.png_pred]]
+        return params
+    if ext in ('jpg', 'jpeg'):
+        quality = settings.quality
+        return [cv2.IMWRITE_JPEG_QUALITY, DEFAULT_JPEG_QUALITY if quality is None else quality]
+    if ext == 'webp':
+        # 质量大于100时OpenCV使用无损编码
+        return [cv2.IMWRITE_WEBP_QUALITY, 101 if settings.quality is None else settings.quality]
+    if ext == 'tiff':
+        return [cv2.IMWRITE_TIFF_COMPRESSION, cv2.IMWRITE_TIFF_COMPRESSION_NONE]
+    return []
+
+
+def encode_frame(slot, shape, path, format_ext, params):
+    """编码第slot个槽位中的帧并写入path（在编码进程中运行），返回写入的字节数"""
+    frame_bytes = int(numpy.prod(shape))
+    frame = numpy.ndarray(shape, dtype=numpy.uint8, buffer=_worker_ring.buf,
+                          offset=slot * frame_bytes)
+    ok, data = cv2.imencode('.' + format_ext, frame, params)
+    del frame
+    if not ok:
+        raise ConversionError(f"图片编码失败：{path}")
+
+    # 先写临时文件再改名，中断时不会留下名字正确但不完整的帧
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data.tobytes())
+    os.replace(tmp_path, path)
+    return data.nbytes
+
+
+class PoolConversionJob:
+    """FFmpeg解码、进程池编码的转换任务，接口与ConversionJob相同
+
+    文件名在读入帧时按帧序号确定，编码完成的先后顺序不影响命名；
+    槽位在对应帧写入完成后才归还，读取端最多领先槽位数个帧
+    """
+
+    def __init__(self, settings, on_progress=None, ring_bytes=RING_MAX_BYTES):
+        self.settings = settings
+        self.metrics = JobMetrics(settings)
+        self.metrics.own_bytes = True
+        self.on_progress = self.metrics.wrap(on_progress)
+        self.ring_bytes = ring_bytes
+        self.progress = None
+        self.reader = None
+        self.executor = None
+        self.error = None
+        self.cancelled = False
+        self._free_slots = queue.Queue()
+        self._last_update = 0.0
+        self._lock = threading.Lock()
+
+    def run(self):
+        """执行转换，返回ConversionResult"""
+        settings = self.settings
+        settings.validate()
+        ensure_output_folder(settings.output_folder)
+
+        with self.metrics.stage(STAGE_PROBE):
+            self.progress = ProgressInfo(get_output_frames(settings))
+            reader = FrameReader(settings.video_file, fps=settings.fps, pix_fmt='bgr24')
+        frame_bytes = reader.frame_bytes
+        slots = max(2, min(settings.workers * SLOTS_PER_WORKER,
+                           self.ring_bytes // frame_bytes))
+        ring = shared_memory.SharedMemory(create=True, size=slots * frame_bytes)
+        for slot in range(slots):
+            self._free_slots.put(slot)
+
+        # 转换阶段包括等待进程池写完剩余的帧
+        converting = time.perf_counter()
+        try:
+            with self._lock:
+                if self.cancelled:
+                    return ConversionResult(None, 0, cancelled=True)
+                write_journal(settings)
+                self.reader = reader
+                # 使用spawn（Windows默认方式）：fork出的编码进程会继承FFmpeg管道，
+                # 取消时FFmpeg收不到管道关闭而无法退出
+                self.executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=settings.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker, initargs=(ring.name,))
+                reader.on_eof = lambda: self.metrics.observe(self.progress, force=True)
+                reader.start()
+                self.metrics.track(reader.process)
+            self._read_frames(reader, ring, frame_bytes)
+        except BaseException:
+            # 包括KeyboardInterrupt：先取消再清理，避免等待已排队的帧
+            self.cancel()
+            reader.close()
+            raise
+        finally:
+            if self.executor:
+                self.executor.shutdown(wait=True,
+                                       cancel_futures=self.cancelled or self.error is not None)
+            ring.close()
+            ring.unlink()
+
+        return_code = 0
+        error_output = ""
+        try:
+            reader.finish()
+        except ConversionError as e:
+            return_code = 1
+            error_output = str(e)
+        if self.error is not None:
+            return_code = 1
+            error_output = str(self.error)
+        self.metrics.add_time(STAGE_CONVERT, time.perf_counter() - converting)
+
+        self.progress.finished = True
+        if self.on_progress:
+            self.on_progress(self.progress)
+        result = ConversionResult(return_code, self.progress.frames, self.cancelled,
+                                  error_output)
+        if result.ok:
+            with self.metrics.stage(STAGE_FINALIZE):
+                result = complete_journal(settings, result)
+        return self.metrics.finish(result, self.progress)
+
+    def _read_frames(self, reader, ring, frame_bytes):
+        """读取帧到空闲槽位并提交编码，没有空闲槽位时阻塞"""
+        settings = self.settings
+        shape = reader.frame_shape
+        params = encode_params(settings)
+        number = settings.start_number
+        while not self.cancelled and self.error is None:
+            waited = time.perf_counter()
+            slot = self._free_slots.get()
+            started = time.perf_counter()
+            self.metrics.add_time(STAGE_ENCODE_WAIT, started - waited)
+            view = ring.buf[slot * frame_bytes:(slot + 1) * frame_bytes]
+            try:
+                ok = reader.readinto(view)
+            except (OSError, ValueError):
+                ok = False
+            finally:
+                view.release()
+            self.metrics.add_time(STAGE_DECODE, time.perf_counter() - started)
+            if not ok:
+                self._free_slots.put(slot)
+                return
+
+            path = os.path.join(settings.output_folder, format_frame_name(
+                settings.prefix, number, settings.digits, settings.format_ext))
+            try:
+                future = self.executor.submit(encode_frame, slot, shape, path,
+                                              settings.format_ext, params)
+            except (RuntimeError, concurrent.futures.process.BrokenProcessPool) as e:
+                self.error = self.error or e
+                return
+            future.add_done_callback(lambda f, slot=slot: self._on_encoded(f, slot))
+            number += 1
+
+    def _on_encoded(self, future, slot):
+        """一帧编码完成：归还槽位并更新进度（在进程池的管理线程中调用）"""
+        self._free_slots.put(slot)
+        if future.cancelled():
+            return
+        error = future.exception()
+        with self._lock:
+            if error is not None:
+                if self.error is None:
+                    self.error = error
+                    if self.reader:
+                        self.reader.terminate()
+                return
+            progress = self.progress
+            progress.frames += 1
+            progress.total_size += future.result()
+            if progress.elapsed > 0:
+                progress.fps = progress.frames / progress.elapsed
+            now = time.time()
+            if now - self._last_update < PROGRESS_INTERVAL:
+                return
+            self._last_update = now
+        if self.on_progress:
+            self.on_progress(progress)
+
+    def cancel(self):
+        """取消转换：结束FFmpeg，丢弃尚未开始编码的帧"""
+        with self._lock:
+            self.cancelled = True
+            if self.reader:
+                self.reader.terminate()
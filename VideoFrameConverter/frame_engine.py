@@ -0,0 +1,1640 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视频转序列帧转换引擎
+不依赖Tk/OpenCV/PIL的无界面转换核心，图形界面和命令行共用
+"""
+
+import bisect
+import collections
+import io
+import os
+import re
+import subprocess
+import threading
+import time
+
+import app_cache
+import ffmpeg_caps
+import media_probe
+from frame_metrics import STAGE_CONVERT, STAGE_FINALIZE, STAGE_PROBE, JobMetrics
+from media_probe import popen_kwargs
+
+
+FFMPEG = 'ffmpeg'
+
+# 支持的输出格式
+OUTPUT_FORMATS = ['png', 'jpg', 'jpeg', 'webp', 'qoi', 'tiff', 'bmp']
+
+# 打包输出：不压缩的tar/zip，或带偏移表的vfcpack（见frame_pack）
+PACK_TAR = 'tar'
+PACK_ZIP = 'zip'
+PACK_VFC = 'vfcpack'
+PACK_FORMATS = [PACK_TAR, PACK_ZIP, PACK_VFC]
+
+# 打包输出的归档文件名（不含扩展名）
+PACK_NAME = 'frames'
+
+# 各输出格式使用的FFmpeg编码器
+FORMAT_ENCODERS = {
+    'png': 'png',
+    'jpg': 'mjpeg',
+    'jpeg': 'mjpeg',
+    'webp': 'libwebp',
+    'qoi': 'qoi',
+    'tiff': 'tiff',
+    'bmp': 'bmp',
+}
+
+# 可打包的图片格式及image2pipe使用的编码器
+PACK_CODECS = {
+    'png': 'png',
+    'jpg': 'mjpeg',
+    'jpeg': 'mjpeg',
+    'bmp': 'bmp',
+    'webp': 'libwebp',
+}
+
+# 图集输出的默认最大边长、间距
+DEFAULT_ATLAS_MAX_SIZE = 4096
+DEFAULT_ATLAS_PADDING = 2
+
+# 各输出格式的速度/体积说明（界面提示）
+FORMAT_HINTS = {
+    'png': "无损；压缩级别0~9，越低越快、文件越大，中间序列可用1",
+    'jpg': "有损；编码快、文件小，质量1~100",
+    'jpeg': "有损；编码快、文件小，质量1~100",
+    'webp': "默认无损，文件最小但编码最慢；压缩级别0~6，填写质量时为有损",
+    'qoi': "无损；编码比PNG快数倍，文件略大",
+    'tiff': "无压缩；编码最快，文件最大",
+    'bmp': "无压缩；编码最快，文件最大",
+}
+
+# 可设置压缩级别的格式及其范围
+COMPRESSION_LEVELS = {
+    'png': (0, 9),
+    'webp': (0, 6),
+}
+
+# 可设置质量的格式（WebP设置质量时为有损编码）
+QUALITY_FORMATS = ('jpg', 'jpeg', 'webp')
+
+# PNG行预测方式，none最快
+PNG_PREDICTIONS = ['none', 'sub', 'up', 'avg', 'paeth', 'mixed']
+
+# 视频文件扩展名
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv', '.webm')
+
+# 转换引擎：ffmpeg为FFmpeg直接解码并编码图片，pool为FFmpeg只解码、进程池并行编码
+ENGINE_FFMPEG = 'ffmpeg'
+ENGINE_POOL = 'pool'
+ENGINES = [ENGINE_FFMPEG, ENGINE_POOL]
+
+# 取帧方式：按帧率、仅关键帧（跳过非关键帧解码）、场景切换（每个镜头一帧）、
+# 每N帧取一帧、指定帧号/时间点
+MODE_FPS = 'fps'
+MODE_KEYFRAMES = 'keyframes'
+MODE_SCENE = 'scene'
+MODE_STRIDE = 'stride'
+MODE_LIST = 'list'
+MODES = [MODE_FPS, MODE_KEYFRAMES, MODE_SCENE, MODE_STRIDE, MODE_LIST]
+MODE_TEXT = {
+    MODE_FPS: "按帧率",
+    MODE_KEYFRAMES: "仅关键帧",
+    MODE_SCENE: "场景切换",
+    MODE_STRIDE: "每N帧",
+    MODE_LIST: "指定帧",
+}
+
+# 每N帧取一帧的默认间隔
+DEFAULT_STRIDE = 10
+
+# 场景切换检测的默认阈值（0~1，越大检测到的切换越少）
+DEFAULT_SCENE_THRESHOLD = 0.3
+
+# 多个提取区间的编号方式：连续编号，或每个区间从起始序号重新编号（文件名加区间前缀）
+NUMBERING_CONTINUOUS = 'continuous'
+NUMBERING_PER_RANGE = 'per_range'
+NUMBERINGS = [NUMBERING_CONTINUOUS, NUMBERING_PER_RANGE]
+
+# 去重：丢弃与上一保留帧差异小于阈值的帧，阈值为8x8块内的平均像素差（0~255）
+DEFAULT_DEDUPE_THRESHOLD = 12
+
+# 帧清单文件名（去重、每N帧、指定帧时保存在输出文件夹中）
+MANIFEST_NAME = 'manifest.json'
+
+# 指定帧方式的滤镜脚本（帧列表可能超过命令行长度限制）
+SELECT_SCRIPT_NAME = '.vfc_select.txt'
+
+# 并行分段时每段的最短时长（秒），避免FFmpeg启动开销超过收益
+MIN_SEGMENT_SECONDS = 2.0
+
+# 转换记录文件名（保存在输出文件夹中，续转时用于核对参数）
+JOURNAL_NAME = '.vfc_journal.json'
+JOURNAL_VERSION = 1
+
+# 续转时每段已写入序列末尾需要校验的帧数（中断时可能写了一半）
+VERIFY_TAIL = 3
+
+# 各格式完整文件的结尾标记
+FRAME_TRAILERS = {
+    'png': b'IEND\xaeB`\x82',
+    'jpg': b'\xff\xd9',
+    'jpeg': b'\xff\xd9',
+    'qoi': b'\x00' * 7 + b'\x01',
+}
+
+
+class ConversionError(Exception):
+    """转换参数或执行错误"""
+
+
+class OutputTarget:
+    """一路附加输出：与主输出共用一次解码，分别缩放、编码和命名
+
+    output_folder可以是相对主输出文件夹的子文件夹；size为缩放后的长边像素（不放大），0为原尺寸；
+    quality为JPG/WebP质量（1~100），compression_level为PNG/WebP压缩级别，png_pred为PNG行预测方式，
+    均为None时使用编码器默认；prefix为None时使用主输出的前缀
+    """
+
+    def __init__(self, output_folder, format_ext="png", size=0, quality=None, prefix=None,
+                 compression_level=None, png_pred=None):
+        self.output_folder = output_folder
+        self.format_ext = format_ext
+        self.size = size
+        self.quality = quality
+        self.prefix = prefix
+        self.compression_level = compression_level
+        self.png_pred = png_pred
+
+    def describe(self):
+        """界面列表中显示的文字"""
+        size = f"{self.size}px" if self.size else "原尺寸"
+        quality = f" 质量{self.quality}" if self.quality is not None else ""
+        if self.compression_level is not None:
+            quality += f" 压缩{self.compression_level}"
+        prefix = f" 前缀{self.prefix}" if self.prefix is not None else ""
+        return f"{self.format_ext.upper()} {size}{quality}{prefix} -> {self.output_folder}"
+
+    def copy(self, **changes):
+        target = OutputTarget.__new__(OutputTarget)
+        target.__dict__.update(self.__dict__)
+        target.__dict__.update(changes)
+        return target
+
+
+def parse_target(text):
+    """解析附加输出描述"folder=子文件夹,format=jpg,size=512,quality=85,prefix=s_"，格式错误时抛出ValueError
+
+    还可指定compression（PNG/WebP压缩级别）和pred（PNG行预测方式）
+    """
+    fields = {}
+    for item in text.split(','):
+        key, sep, value = item.partition('=')
+        if not sep or key.strip() not in ('folder', 'format', 'size', 'quality', 'prefix',
+                                           'compression', 'pred'):
+            raise ValueError(text)
+        fields[key.strip()] = value.strip()
+    if not fields.get('folder'):
+        raise ValueError(text)
+    return OutputTarget(
+        fields['folder'],
+        format_ext=fields.get('format', 'png').lower(),
+        size=int(fields.get('size') or 0),
+        quality=int(fields['quality']) if fields.get('quality') else None,
+        prefix=fields.get('prefix'),
+        compression_level=int(fields['compression']) if fields.get('compression') else None,
+        png_pred=fields.get('pred') or None,
+    )
+
+
+class ConversionSettings:
+    """一次转换任务的参数"""
+
+    def __init__(self, video_file, output_folder, fps=30, prefix="",
+                 start_number=1, digits=3, format_ext="png", workers=1,
+                 resume=False, engine=ENGINE_FFMPEG, mode=MODE_FPS,
+                 scene_threshold=DEFAULT_SCENE_THRESHOLD, dedupe=False,
+                 dedupe_threshold=DEFAULT_DEDUPE_THRESHOLD, ranges=None,
+                 range_numbering=NUMBERING_CONTINUOUS, stride=DEFAULT_STRIDE,
+                 frame_list=None, frame_list_file=None, size=0, quality=None,
+                 targets=None, compression_level=None, png_pred=None, pack=None,
+                 atlas=False, atlas_columns=0, atlas_max_size=DEFAULT_ATLAS_MAX_SIZE,
+                 atlas_padding=DEFAULT_ATLAS_PADDING, atlas_trim=False, metrics_stream=None):
+        self.video_file = video_file
+        self.output_folder = output_folder
+        self.fps = fps
+        self.prefix = prefix
+        self.start_number = start_number
+        self.digits = digits
+        self.format_ext = format_ext
+        self.workers = workers  # 并行分段数，1为单进程
+        self.resume = resume  # 续转：跳过输出文件夹中已写入的帧
+        self.engine = engine
+        self.mode = mode
+        self.scene_threshold = scene_threshold  # 仅场景切换方式使用
+        self.dedupe = dedupe  # 丢弃近似重复帧并写入清单
+        self.dedupe_threshold = dedupe_threshold
+        self.ranges = list(ranges or [])  # 提取区间[(开始秒, 结束秒), ...]，为空时转换整个视频
+        self.range_numbering = range_numbering
+        self.stride = stride  # 仅每N帧方式使用
+        self.frame_list = list(frame_list or [])  # 指定帧：帧号（整数）或时间点文本
+        self.frame_list_file = frame_list_file  # 指定帧：帧列表文件，与frame_list合并
+        self.size = size  # 主输出缩放后的长边像素，0为原尺寸
+        self.quality = quality  # 主输出JPG/WebP质量（1~100），None为编码器默认
+        self.compression_level = compression_level  # PNG/WebP压缩级别，None为编码器默认
+        self.png_pred = png_pred  # PNG行预测方式，None为编码器默认
+        self.pack = pack  # 打包输出格式，None为每帧一个文件
+        self.atlas = atlas  # 图集输出：帧直接排入图集图片并生成JSON索引
+        self.atlas_columns = atlas_columns  # 每行最多帧数，0为按最大边长排满
+        self.atlas_max_size = atlas_max_size
+        self.atlas_padding = atlas_padding
+        self.atlas_trim = atlas_trim  # 去掉每帧与背景色相同的边缘
+        self.targets = list(targets or [])  # 附加输出OutputTarget，与主输出共用一次解码
+        self.metrics_stream = metrics_stream  # 逐行输出指标的文件路径，'-'为标准输出，None为不输出
+
+    def validate(self):
+        """验证参数，不合法时抛出ConversionError"""
+        if not self.video_file:
+            raise ConversionError("未指定视频文件")
+        if not os.path.isfile(self.video_file):
+            raise ConversionError(f"视频文件不存在：{self.video_file}")
+        if not self.output_folder:
+            raise ConversionError("未指定输出文件夹")
+        if self.fps <= 0:
+            raise ConversionError("帧率必须大于0")
+        if self.start_number < 0:
+            raise ConversionError("起始序号不能为负数")
+        if self.digits <= 0:
+            raise ConversionError("序号位数必须大于0")
+        self.validate_outputs()
+        caps = ffmpeg_capabilities()
+        if caps is not None:
+            self.validate_capabilities(caps)
+        if self.workers < 1:
+            raise ConversionError("并行进程数必须大于0")
+        if self.engine not in ENGINES:
+            raise ConversionError(f"不支持的转换引擎：{self.engine}")
+        if self.engine == ENGINE_POOL and self.resume:
+            raise ConversionError("进程池编码暂不支持续转")
+        if self.engine == ENGINE_POOL:
+            if self.targets or self.size:
+                raise ConversionError("进程池编码暂不支持多路输出和缩放")
+            if self.format_ext == 'qoi':
+                raise ConversionError("进程池编码不支持QOI格式")
+        if self.targets and self.resume:
+            raise ConversionError("多路输出暂不支持续转")
+        if self.pack is not None:
+            if self.pack not in PACK_FORMATS:
+                raise ConversionError(f"不支持的打包格式：{self.pack}")
+            if self.format_ext not in PACK_CODECS:
+                raise ConversionError(
+                    f"打包输出仅支持{'/'.join(PACK_CODECS)}格式")
+            if self.resume or self.targets or self.ranges or self.engine == ENGINE_POOL:
+                raise ConversionError("打包输出不支持续转、多路输出、区间提取和进程池编码")
+        if self.atlas:
+            if (self.mode != MODE_FPS or self.dedupe or self.resume or self.targets or
+                    self.ranges or self.pack or self.engine == ENGINE_POOL):
+                raise ConversionError("图集输出仅支持按帧率取帧，不能与去重、续转、多路输出、"
+                                      "区间提取、打包输出和进程池编码同时使用")
+            if self.format_ext == 'qoi':
+                raise ConversionError("图集输出不支持QOI格式")
+            if self.atlas_columns < 0 or self.atlas_padding < 0 or self.atlas_max_size <= 0:
+                raise ConversionError("图集的列数、间距不能为负数，最大边长必须大于0")
+        if self.mode not in MODES:
+            raise ConversionError(f"不支持的取帧方式：{self.mode}")
+        if self.mode != MODE_FPS:
+            if self.resume:
+                raise ConversionError("续转仅支持按帧率取帧")
+            if self.engine == ENGINE_POOL:
+                raise ConversionError("进程池编码仅支持按帧率取帧")
+        if self.mode == MODE_SCENE and not 0 < self.scene_threshold < 1:
+            raise ConversionError("场景切换阈值必须在0到1之间")
+        if self.mode == MODE_STRIDE:
+            if int(self.stride) != self.stride or self.stride < 1:
+                raise ConversionError("取帧间隔必须是正整数")
+            if self.ranges:
+                # 每个区间的帧序号n从0重新计数，清单中的源帧号会出错
+                raise ConversionError("每N帧方式不能与区间提取同时使用")
+        if self.mode == MODE_LIST:
+            if not self.frame_list and not self.frame_list_file:
+                raise ConversionError("未指定要提取的帧")
+            if self.frame_list_file and not os.path.isfile(self.frame_list_file):
+                raise ConversionError(f"帧列表文件不存在：{self.frame_list_file}")
+            if self.ranges:
+                raise ConversionError("指定帧方式不能与区间提取同时使用")
+        if self.dedupe:
+            if self.mode in (MODE_STRIDE, MODE_LIST):
+                # 去重清单只记录去重后的帧序号，无法给出选帧后的源帧号
+                raise ConversionError("每N帧和指定帧方式不能与去重同时使用")
+            if self.resume:
+                raise ConversionError("去重转换不支持续转")
+            if self.engine == ENGINE_POOL:
+                raise ConversionError("进程池编码不支持去重")
+            if not 0 < self.dedupe_threshold <= 255:
+                raise ConversionError("去重阈值必须在0到255之间")
+        if self.ranges:
+            if self.resume:
+                raise ConversionError("续转暂不支持区间提取")
+            if self.dedupe:
+                raise ConversionError("去重暂不支持区间提取")
+            if self.engine == ENGINE_POOL:
+                raise ConversionError("进程池编码暂不支持区间提取")
+            if self.range_numbering not in NUMBERINGS:
+                raise ConversionError(f"不支持的编号方式：{self.range_numbering}")
+            for start, end in self.ranges:
+                if start < 0 or end <= start:
+                    raise ConversionError(
+                        f"提取区间无效：{format_duration(start)} - {format_duration(end)}")
+
+    def required_filters(self):
+        """转换用到的FFmpeg滤镜"""
+        filters = {'fps'} if self.mode == MODE_FPS else set()
+        if self.mode in (MODE_SCENE, MODE_STRIDE, MODE_LIST):
+            filters.add('select')
+        if self.mode in (MODE_STRIDE, MODE_LIST) or self.dedupe:
+            filters.add('showinfo')
+        if self.dedupe:
+            filters.add('mpdecimate')
+        if self.size or any(target.size for target in self.targets):
+            filters.add('scale')
+        if self.targets:
+            filters.add('split')
+        return filters
+
+    def validate_capabilities(self, caps):
+        """按本机FFmpeg的能力检查编码器和滤镜，不支持时抛出ConversionError"""
+        if self.engine == ENGINE_FFMPEG and not self.atlas:
+            # 进程池和图集输出由OpenCV编码，FFmpeg只负责解码
+            for output in self.output_settings():
+                encoder = FORMAT_ENCODERS[output.format_ext]
+                if not caps.has_encoder(encoder):
+                    raise ConversionError(f"当前FFmpeg不支持{output.format_ext.upper()}格式"
+                                          f"（缺少{encoder}编码器）")
+        missing = sorted(name for name in self.required_filters()
+                         if not caps.has_filter(name))
+        if missing:
+            raise ConversionError(f"当前FFmpeg缺少{'、'.join(missing)}滤镜，无法使用所选的取帧方式")
+
+    def validate_outputs(self):
+        """验证每一路输出的格式、尺寸和质量，并检查输出文件是否互相覆盖"""
+        used = set()
+        for output in self.output_settings():
+            if not output.output_folder:
+                raise ConversionError("未指定输出文件夹")
+            if output.format_ext not in OUTPUT_FORMATS:
+                raise ConversionError(f"不支持的输出格式：{output.format_ext}")
+            if output.size < 0:
+                raise ConversionError("输出尺寸不能为负数")
+            if output.quality is not None and not 1 <= output.quality <= 100:
+                raise ConversionError("输出质量必须在1到100之间")
+            if output.compression_level is not None:
+                low, high = COMPRESSION_LEVELS.get(output.format_ext, (None, None))
+                if low is None:
+                    raise ConversionError(f"{output.format_ext}格式不支持设置压缩级别")
+                if not low <= output.compression_level <= high:
+                    raise ConversionError(
+                        f"{output.format_ext}压缩级别必须在{low}到{high}之间")
+            if output.png_pred is not None and output.png_pred not in PNG_PREDICTIONS:
+                raise ConversionError(f"不支持的PNG预测方式：{output.png_pred}")
+            key = (os.path.normcase(os.path.abspath(output.output_folder)),
+                   output.prefix, output.format_ext)
+            if key in used:
+                raise ConversionError(f"多路输出的文件名互相冲突：{output.output_folder}")
+            used.add(key)
+
+    def output_settings(self):
+        """每一路输出对应的参数，第一路为主输出本身；附加输出的相对文件夹以主输出文件夹为基准"""
+        outputs = [self]
+        for target in self.targets:
+            outputs.append(self.copy(
+                output_folder=os.path.join(self.output_folder, target.output_folder),
+                format_ext=target.format_ext,
+                size=target.size,
+                quality=target.quality,
+                compression_level=target.compression_level,
+                png_pred=target.png_pred,
+                prefix=self.prefix if target.prefix is None else target.prefix,
+                targets=[]))
+        return outputs
+
+    def signature(self):
+        """影响输出内容和命名的参数，写入转换记录，续转时逐项核对"""
+        stat = os.stat(self.video_file)
+        return {
+            'mode': self.mode,
+            'dedupe': self.dedupe,
+            'ranges': [list(r) for r in self.ranges],
+            'range_numbering': self.range_numbering,
+            'stride': self.stride,
+            'video_name': os.path.basename(self.video_file),
+            'video_size': stat.st_size,
+            'video_mtime_ns': stat.st_mtime_ns,
+            'fps': self.fps,
+            'prefix': self.prefix,
+            'start_number': self.start_number,
+            'digits': self.digits,
+            'format_ext': self.format_ext,
+            'size': self.size,
+            'quality': self.quality,
+            'compression_level': self.compression_level,
+            'png_pred': self.png_pred,
+            'pack': self.pack,
+            'atlas': self.atlas,
+        }
+
+    def copy(self, **changes):
+        """复制参数，可同时修改部分字段"""
+        settings = ConversionSettings.__new__(ConversionSettings)
+        settings.__dict__.update(self.__dict__)
+        settings.__dict__.update(changes)
+        return settings
+
+
+class ConversionResult:
+    """转换结果"""
+
+    def __init__(self, return_code, frame_count, cancelled=False, error_output=""):
+        self.return_code = return_code
+        self.frame_count = frame_count
+        self.cancelled = cancelled
+        self.error_output = error_output  # FFmpeg最后几行错误日志
+        self.metrics = None  # 任务结束时附加的JobMetrics
+
+    @property
+    def ok(self):
+        return self.return_code == 0 and not self.cancelled
+
+
+def format_number(value):
+    """把数字格式化为FFmpeg参数（30.0 -> '30'）"""
+    return f"{value:g}" if isinstance(value, float) else str(value)
+
+
+def format_frame_name(prefix, number, digits, format_ext):
+    """生成单个序列帧的文件名"""
+    return f"{prefix}{str(number).zfill(digits)}.{format_ext}"
+
+
+def build_output_pattern(settings):
+    """构建FFmpeg输出文件名模式，起始序号通过-start_number传入"""
+    pattern = f"{settings.prefix}%0{settings.digits}d.{settings.format_ext}"
+    return os.path.join(settings.output_folder, pattern)
+
+
+def build_ffmpeg_command(settings, start_time=None, frame_limit=None,
+                         start_number=None, duration=None, threads=None):
+    """构建FFmpeg转换命令
+
+    start_time为输入端快速定位的秒数，frame_limit限制输出帧数，duration限制处理时长（秒），
+    start_number覆盖起始序号（分段和区间提取时使用），
+    threads限制解码、滤镜和编码的线程数（多个FFmpeg同时运行时避免线程数远超CPU核心数）
+    """
+    caps = ffmpeg_capabilities()
+    cmd = [FFMPEG, '-hide_banner']
+    if threads and caps and caps.has_option('filter_threads'):
+        cmd += ['-filter_threads', str(threads)]
+    if threads:
+        cmd += ['-threads', str(threads)]
+    if start_time:
+        cmd += ['-ss', f"{start_time:.6f}"]
+    if settings.mode == MODE_KEYFRAMES:
+        # 解码器直接丢弃非关键帧，不做解码
+        cmd += ['-skip_frame', 'nokey']
+    cmd += ['-i', settings.video_file] + build_selection_args(settings)
+    if start_number is None:
+        start_number = settings.start_number
+
+    outputs = settings.output_settings()
+    for index, output in enumerate(outputs):
+        cmd += output_sync_args(settings)
+        if len(outputs) > 1:
+            cmd += ['-map', f"[{output_label(index)}]"]
+        cmd += build_encoder_args(output)
+        if threads and caps and caps.encoder_threads(FORMAT_ENCODERS[output.format_ext]):
+            cmd += ['-threads', str(threads)]
+        if frame_limit is not None:
+            cmd += ['-frames:v', str(frame_limit)]
+        if duration is not None:
+            cmd += ['-t', f"{duration:.6f}"]
+        if output.pack:
+            # 编码后的图片连续写入标准输出，由frame_pack切分并写入归档
+            cmd += ['-f', 'image2pipe', '-c:v', PACK_CODECS[output.format_ext], 'pipe:1']
+            continue
+        cmd += [
+            # 固定使用图片序列封装，否则webp等扩展名会选中动画格式的封装器，只写出一个文件
+            '-f', 'image2',
+            '-start_number', str(start_number),
+            '-y',  # 覆盖输出文件
+            build_output_pattern(output)
+        ]
+    return cmd
+
+
+def pack_path(settings):
+    """打包输出的归档文件路径"""
+    return os.path.join(settings.output_folder, f"{PACK_NAME}.{settings.pack}")
+
+
+def output_label(index):
+    """多路输出时第index路在滤镜图中的输出标签"""
+    return f"vfc_out{index}"
+
+
+def build_encoder_args(settings):
+    """输出编码参数：质量、压缩级别、PNG预测方式和像素格式"""
+    args = []
+    ext = settings.format_ext
+    if ext in ('jpg', 'jpeg') and settings.quality is not None:
+        # JPG质量1~100换算为FFmpeg的qscale（31~2）
+        qscale = int(round(31 - (settings.quality - 1) * 29 / 99))
+        args += ['-q:v', str(qscale)]
+    elif ext == 'webp':
+        # 默认的libwebp_anim会把所有帧合并为一个动画文件
+        args += ['-c:v', FORMAT_ENCODERS[ext]]
+        if settings.quality is None:
+            # 无损WebP需要RGB输入，YUV420会丢失色度
+            args += ['-lossless', '1', '-pix_fmt', 'bgra']
+        else:
+            args += ['-quality', str(settings.quality)]
+    elif ext == 'tiff':
+        # 不压缩，并使用通用查看器都支持的RGB（而不是YCbCr）
+        args += ['-compression_algo', 'raw', '-pix_fmt', 'rgb24']
+    if ext == 'png' and settings.png_pred is not None:
+        args += ['-pred', settings.png_pred]
+    if settings.compression_level is not None:
+        args += ['-compression_level', str(settings.compression_level)]
+    return args
+
+
+def build_scale_filter(size):
+    """按长边缩放到size像素，保持宽高比，不放大"""
+    return (f"scale='if(gte(iw,ih),min({size},iw),-2)'"
+            f":'if(gte(iw,ih),-2,min({size},ih))'")
+
+
+def build_selection_args(settings):
+    """按取帧方式和去重设置生成滤镜参数（同步参数见output_sync_args，需逐路输出指定）"""
+    multiple = len(settings.targets) > 0
+    if settings.mode == MODE_LIST:
+        # 滤镜图由write_select_script写入文件
+        args = ['-filter_complex_script' if multiple else '-filter_script:v',
+                select_script_path(settings)]
+    else:
+        graph = build_filter_graph(settings)
+        args = ['-filter_complex' if multiple else '-vf', graph] if graph else []
+    return args
+
+
+def output_sync_args(settings):
+    """每路输出的帧率同步参数：选帧或去重时为可变帧率，不为填补时间间隔而重复帧
+
+    -fps_mode/-vsync是输出选项，只作用于其后的一路输出，多路输出时每路都要指定
+    """
+    if settings.mode != MODE_FPS or settings.dedupe:
+        return sync_args('vfr')
+    return []
+
+
+def sync_args(method):
+    """输出帧率方式参数：FFmpeg 5.1起用-fps_mode代替已弃用的-vsync"""
+    caps = ffmpeg_capabilities()
+    if caps is not None and caps.has_option('fps_mode'):
+        return ['-fps_mode', method]
+    return ['-vsync', method]
+
+
+def build_filter_chain(settings, frame_numbers=None):
+    """按取帧方式和去重设置生成滤镜列表，frame_numbers为指定帧方式解析后的源帧号
+
+    每N帧和指定帧方式在滤镜图中用select选帧，未选中的帧不会被编码和写入
+    """
+    filters = []
+    if settings.mode == MODE_SCENE:
+        # 保留第一帧和画面变化超过阈值的帧
+        threshold = format_number(float(settings.scene_threshold))
+        filters.append(f"select='eq(n,0)+gt(scene,{threshold})'")
+    elif settings.mode == MODE_STRIDE:
+        filters.append(f"select='not(mod(n,{int(settings.stride)}))'")
+    elif settings.mode == MODE_LIST:
+        filters.append(f"select='{build_frame_expression(frame_numbers or [])}'")
+    elif settings.mode == MODE_FPS:
+        # 使用fps滤镜按时间戳取帧，分段与整段转换得到的帧完全一致
+        filters.append(f"fps={format_number(settings.fps)}")
+
+    if settings.dedupe:
+        filters += build_dedupe_filters(settings.dedupe_threshold)
+    elif settings.mode in (MODE_STRIDE, MODE_LIST):
+        # 记录选中帧的时间戳用于生成清单
+        filters.append(f"showinfo@{DedupeManifest.KEPT}=checksum=0")
+    return filters
+
+
+def build_filter_graph(settings, frame_numbers=None):
+    """生成完整的滤镜：单路输出时为滤镜链；多路输出时选帧后split为每一路，各自缩放
+
+    选帧、去重等滤镜只执行一次，每一路输出的标签见output_label
+    """
+    filters = build_filter_chain(settings, frame_numbers)
+    outputs = settings.output_settings()
+    if len(outputs) == 1:
+        if settings.size:
+            filters.append(build_scale_filter(settings.size))
+        return ",".join(filters)
+
+    branches = "".join(f"[vfc_split{index}]" for index in range(len(outputs)))
+    graph = ["[0:v]" + ",".join(filters + [f"split={len(outputs)}"]) + branches]
+    for index, output in enumerate(outputs):
+        scale = build_scale_filter(output.size) if output.size else "null"
+        graph.append(f"[vfc_split{index}]{scale}[{output_label(index)}]")
+    return ";".join(graph)
+
+
+def build_frame_expression(frame_numbers):
+    """把排序后的帧号列表转换为select表达式，连续的帧号合并为between"""
+    terms = []
+    index = 0
+    while index < len(frame_numbers):
+        first = last = frame_numbers[index]
+        while index + 1 < len(frame_numbers) and frame_numbers[index + 1] == last + 1:
+            index += 1
+            last = frame_numbers[index]
+        terms.append(f"eq(n,{first})" if first == last else f"between(n,{first},{last})")
+        index += 1
+    return "+".join(terms) or "0"
+
+
+def select_script_path(settings):
+    return os.path.join(settings.output_folder, SELECT_SCRIPT_NAME)
+
+
+def write_select_script(settings, frame_numbers):
+    """写入指定帧方式的滤镜脚本"""
+    try:
+        with open(select_script_path(settings), 'w', encoding='utf-8') as f:
+            f.write(build_filter_graph(settings, frame_numbers))
+    except OSError as e:
+        raise ConversionError(f"写入滤镜脚本失败：{e}")
+
+
+def parse_frame_list(entries):
+    """解析帧列表，返回(帧号集合, 时间点列表)
+
+    整数为源视频帧号（从0开始）；带小数点、冒号或以s结尾的为时间点（秒）；
+    文本可用逗号、空白或换行分隔，#之后为注释
+    """
+    numbers = set()
+    times = []
+    for entry in entries:
+        if isinstance(entry, int):
+            numbers.add(entry)
+            continue
+        for line in str(entry).splitlines():
+            for token in line.split('#')[0].replace(',', ' ').split():
+                try:
+                    if token.isdigit():
+                        numbers.add(int(token))
+                    else:
+                        times.append(parse_time(token[:-1] if token.endswith('s') else token))
+                except ValueError:
+                    raise ConversionError(f"帧列表格式错误：{token}")
+    return numbers, times
+
+
+def resolve_frame_numbers(settings):
+    """合并指定帧方式的帧列表和帧列表文件，时间点换算为不早于该时间的第一帧，返回排序后的源帧号"""
+    entries = list(settings.frame_list)
+    if settings.frame_list_file:
+        try:
+            with open(settings.frame_list_file, 'r', encoding='utf-8') as f:
+                entries.append(f.read())
+        except OSError as e:
+            raise ConversionError(f"读取帧列表文件失败：{e}")
+    numbers, times = parse_frame_list(entries)
+
+    if times:
+        # 按数据包时间戳定位，可变帧率视频同样准确
+        frame_times = media_probe.probe_packet_times(settings.video_file)
+        for target in times:
+            index = bisect.bisect_left(frame_times, target - 1e-6)
+            if index < len(frame_times):
+                numbers.add(index)
+    return sorted(numbers)
+
+
+def build_dedupe_filters(threshold):
+    """去重滤镜：mpdecimate与上一保留帧比较，前后的showinfo记录全部帧和保留帧用于生成清单"""
+    hi = int(64 * threshold)
+    lo = int(hi * 5 / 12)  # 与mpdecimate默认值的比例相同
+    return [
+        f"showinfo@{DedupeManifest.ALL}=checksum=0",
+        f"mpdecimate=hi={hi}:lo={lo}:frac=0.33",
+        f"showinfo@{DedupeManifest.KEPT}=checksum=0",
+    ]
+
+
+def ensure_output_folder(output_folder):
+    """确保输出文件夹存在"""
+    if not os.path.exists(output_folder):
+        try:
+            os.makedirs(output_folder)
+        except OSError as e:
+            raise ConversionError(f"创建输出文件夹失败：{e}")
+
+
+def ensure_output_folders(settings):
+    """确保主输出和所有附加输出的文件夹存在"""
+    for output in settings.output_settings():
+        ensure_output_folder(output.output_folder)
+
+
+def ffmpeg_capabilities():
+    """本机FFmpeg的能力（编码器、滤镜、选项，跨启动缓存），FFmpeg不可用时返回None"""
+    return ffmpeg_caps.capabilities(FFMPEG)
+
+
+def supported_formats(caps):
+    """caps对应的FFmpeg能编码的输出格式，caps为None（能力未知）时返回全部格式"""
+    if caps is None:
+        return list(OUTPUT_FORMATS)
+    return [ext for ext in OUTPUT_FORMATS if caps.has_encoder(FORMAT_ENCODERS[ext])]
+
+
+def get_video_fps(filepath):
+    """获取视频帧率"""
+    info = media_probe.probe(filepath)
+    return round(info.fps, 2) if info and info.fps else None
+
+
+def get_total_frames(filepath):
+    """获取视频总帧数（容器记录 -> 统计数据包 -> 时长估算），失败时返回0"""
+    return media_probe.count_source_frames(filepath)[0]
+
+
+def get_output_frames(settings):
+    """估计输出帧数，用于进度和剩余时间；场景切换方式无法预估，返回0"""
+    if settings.mode == MODE_STRIDE:
+        total = media_probe.count_source_frames(settings.video_file)[0]
+        return -(-total // int(settings.stride))
+    if settings.mode == MODE_KEYFRAMES:
+        info = media_probe.probe(settings.video_file, keyframes=True)
+        return len(info.keyframes) if info and info.keyframes else 0
+    if settings.mode == MODE_SCENE:
+        return 0
+    return media_probe.expected_output_frames(settings.video_file, settings.fps)[0]
+
+
+def get_video_duration(filepath):
+    """获取视频时长（秒），失败时返回0"""
+    info = media_probe.probe(filepath)
+    return info.duration if info else 0
+
+
+def journal_path(output_folder):
+    return os.path.join(output_folder, JOURNAL_NAME)
+
+
+def read_journal(output_folder):
+    """读取输出文件夹中的转换记录，不存在或无法解析时返回None"""
+    journal = app_cache.load_json(journal_path(output_folder))
+    return journal if isinstance(journal, dict) else None
+
+
+def write_output_json(path, data):
+    """写入输出文件夹中的记录文件（转换记录、清单、图集索引），失败时抛出ConversionError
+
+    这些文件是输出的一部分，不能像缓存那样写入失败时忽略
+    """
+    try:
+        app_cache.write_json(path, data)
+    except OSError as e:
+        raise ConversionError(f"无法写入{os.path.basename(path)}：{e}") from e
+
+
+def write_journal(settings, completed=False, frame_count=0):
+    """写入转换记录（原子替换，中断时不会留下损坏的记录），失败时抛出ConversionError"""
+    write_output_json(journal_path(settings.output_folder), {
+        'version': JOURNAL_VERSION,
+        'settings': settings.signature(),
+        'completed': completed,
+        'frame_count': frame_count,
+        'updated_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+    })
+
+
+def complete_journal(settings, result):
+    """转换成功时把转换记录标记为完成，返回结果；记录写入失败时返回失败的结果
+
+    续转依赖完整的记录，记录没有写入时不能报告成功
+    """
+    if not result.ok:
+        return result
+    try:
+        write_journal(settings, completed=True, frame_count=result.frame_count)
+    except ConversionError as e:
+        return ConversionResult(1, result.frame_count, error_output=str(e))
+    return result
+
+
+def scan_existing_frames(settings):
+    """扫描输出文件夹中符合命名规则的序列帧，返回已存在帧的下标集合（下标0对应起始序号）"""
+    pattern = re.compile(re.escape(settings.prefix) + r'(\d+)\.' +
+                         re.escape(settings.format_ext) + '$')
+    existing = set()
+    try:
+        names = os.listdir(settings.output_folder)
+    except OSError:
+        return existing
+    for name in names:
+        match = pattern.match(name)
+        if not match:
+            continue
+        number = int(match.group(1))
+        # 序号位数必须与命名规则完全一致
+        if match.group(1) != str(number).zfill(settings.digits):
+            continue
+        if number >= settings.start_number:
+            existing.add(number - settings.start_number)
+    return existing
+
+
+def verify_frame_file(path, format_ext):
+    """检查帧文件是否完整写入"""
+    try:
+        size = os.path.getsize(path)
+        if size == 0:
+            return False
+        trailer = FRAME_TRAILERS.get(format_ext)
+        if not trailer:
+            return True
+        with open(path, 'rb') as f:
+            f.seek(max(0, size - len(trailer)))
+            return f.read() == trailer
+    except OSError:
+        return False
+
+
+def verify_run_tails(settings, existing):
+    """校验每段连续已写入序列末尾的几帧，去掉不完整的帧"""
+    run_ends = [index for index in existing if index + 1 not in existing]
+    for index in run_ends:
+        for _ in range(VERIFY_TAIL):
+            if index not in existing:
+                break
+            name = format_frame_name(settings.prefix, settings.start_number + index,
+                                     settings.digits, settings.format_ext)
+            if verify_frame_file(os.path.join(settings.output_folder, name),
+                                 settings.format_ext):
+                break
+            existing.discard(index)
+            index -= 1
+    return existing
+
+
+def find_missing_ranges(existing, total_frames):
+    """根据已存在的帧下标找出需要补写的分段[(首帧下标, 帧数), ...]
+
+    最后一段帧数为None，一直处理到视频结尾；total_frames未知（0）时只补写第一个缺口之后的部分
+    """
+    if total_frames <= 0:
+        first = 0
+        while first in existing:
+            first += 1
+        return [(first, None)]
+
+    ranges = []
+    index = 0
+    while index < total_frames:
+        if index in existing:
+            index += 1
+            continue
+        start = index
+        while index < total_frames and index not in existing:
+            index += 1
+        ranges.append((start, index - start))
+
+    if ranges and ranges[-1][0] + ranges[-1][1] >= total_frames:
+        ranges[-1] = (ranges[-1][0], None)
+    else:
+        # 估计的帧数可能略少于实际输出，补上结尾
+        ranges.append((total_frames, None))
+    return ranges
+
+
+def plan_segments(total_frames, workers, fps):
+    """把输出帧序列切分为连续分段
+
+    返回[(首帧下标, 帧数), ...]，最后一段帧数为None表示一直处理到结尾，
+    与单进程转换的结尾行为保持一致
+    """
+    min_frames = max(1, int(MIN_SEGMENT_SECONDS * fps))
+    workers = max(1, min(workers, total_frames // min_frames))
+    base, extra = divmod(total_frames, workers)
+    segments = []
+    first = 0
+    for i in range(workers):
+        count = base + (1 if i < extra else 0)
+        segments.append((first, count if i < workers - 1 else None))
+        first += count
+    return segments
+
+
+def segment_task(settings, first, count):
+    """把输出帧分段（首帧下标, 帧数）转换为build_ffmpeg_command的参数"""
+    return {
+        'settings': settings,
+        'start_time': first / settings.fps,
+        'frame_limit': count,
+        'start_number': settings.start_number + first,
+    }
+
+
+def range_prefix(prefix, index):
+    """每个区间单独编号时的文件名前缀"""
+    return f"{prefix}r{index + 1:02d}_"
+
+
+def plan_range_tasks(settings):
+    """把提取区间转换为build_ffmpeg_command的参数列表
+
+    按帧率取帧时区间换算为输出帧分段，文件与整段转换的对应帧完全一致；
+    其他取帧方式按时长截取，连续编号时start_number为None，由前一个区间实际输出的帧数决定
+    """
+    tasks = []
+    number = settings.start_number
+    for index, (start, end) in enumerate(settings.ranges):
+        range_settings = settings
+        if settings.range_numbering == NUMBERING_PER_RANGE:
+            targets = [target if target.prefix is None else
+                       target.copy(prefix=range_prefix(target.prefix, index))
+                       for target in settings.targets]
+            range_settings = settings.copy(prefix=range_prefix(settings.prefix, index),
+                                           targets=targets)
+            number = settings.start_number
+
+        if settings.mode == MODE_FPS:
+            first = int(round(start * settings.fps))
+            count = int(round(end * settings.fps)) - first
+            if count <= 0:
+                continue
+            task = segment_task(range_settings, first, count)
+            task['start_number'] = number
+            number += count
+        else:
+            task = {
+                'settings': range_settings,
+                'start_time': start,
+                'duration': end - start,
+                'start_number': (number if settings.range_numbering == NUMBERING_PER_RANGE
+                                 else None),
+            }
+        tasks.append(task)
+    return tasks
+
+
+def progress_percent(frame_count, total_frames):
+    """根据已处理帧数计算进度百分比"""
+    if total_frames > 0:
+        return min(frame_count / total_frames * 100, 100)
+    return 0
+
+
+def format_duration(seconds):
+    """把秒数格式化为mm:ss或h:mm:ss"""
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    if hours:
+        return f"{hours}:{rest // 60:02d}:{rest % 60:02d}"
+    return f"{rest // 60:02d}:{rest % 60:02d}"
+
+
+def parse_time(text):
+    """解析时间文本（秒数，或mm:ss、h:mm:ss，秒可带小数），格式错误时抛出ValueError"""
+    seconds = 0.0
+    for part in text.strip().split(':'):
+        seconds = seconds * 60 + float(part)
+    if seconds < 0:
+        raise ValueError(text)
+    return seconds
+
+
+def parse_range(text):
+    """解析提取区间文本"开始-结束"，返回(开始秒, 结束秒)"""
+    start, sep, end = text.partition('-')
+    if not sep:
+        raise ValueError(text)
+    return parse_time(start), parse_time(end)
+
+
+class ProgressInfo:
+    """转换进度，来自FFmpeg -progress输出的键值对
+
+    frames为已输出帧数，fps为输出帧率，speed为相对实时的处理倍速，
+    total_size为已写入字节数，out_time为已处理的媒体时长（秒）；
+    无法预估输出帧数时（场景切换方式）按已处理时长占总时长duration计算进度
+    """
+
+    def __init__(self, total_frames=0, duration=0):
+        self.total_frames = total_frames
+        self.duration = duration
+        self.frames = 0
+        self.fps = 0.0
+        self.speed = 0.0
+        self.total_size = 0
+        self.out_time = 0.0
+        self.finished = False
+        self.started_at = time.time()
+
+    @property
+    def elapsed(self):
+        return time.time() - self.started_at
+
+    @property
+    def percent(self):
+        if self.total_frames <= 0 and self.duration > 0:
+            return progress_percent(self.out_time, self.duration)
+        return progress_percent(self.frames, self.total_frames)
+
+    @property
+    def eta(self):
+        """预计剩余秒数，无法估计时返回None"""
+        if self.total_frames > 0:
+            done, total = self.frames, self.total_frames
+        else:
+            done, total = self.out_time, self.duration
+        if total <= 0 or done <= 0:
+            return None
+        rate = done / self.elapsed if self.elapsed > 0 else 0
+        if rate <= 0:
+            return None
+        return max(0, total - done) / rate
+
+    def update(self, values):
+        """用一组-progress键值更新进度"""
+        self.frames = _parse_int(values.get('frame'), self.frames)
+        self.fps = _parse_float(values.get('fps'), self.fps)
+        self.total_size = _parse_int(values.get('total_size'), self.total_size)
+        out_time_us = _parse_int(values.get('out_time_us'), None)
+        if out_time_us is not None:
+            self.out_time = max(0.0, out_time_us / 1000000)
+        self.speed = _parse_float(values.get('speed', '').rstrip('x'), self.speed)
+        self.finished = values.get('progress') == 'end'
+
+    @classmethod
+    def merge(cls, parts, total_frames=0, started_at=None, duration=0):
+        """合并多个并行进程的进度"""
+        merged = cls(total_frames, duration)
+        if started_at is not None:
+            merged.started_at = started_at
+        merged.frames = sum(part.frames for part in parts)
+        merged.fps = sum(part.fps for part in parts)
+        merged.speed = sum(part.speed for part in parts)
+        merged.total_size = sum(part.total_size for part in parts)
+        merged.out_time = sum(part.out_time for part in parts)
+        merged.finished = all(part.finished for part in parts)
+        return merged
+
+    def to_dict(self):
+        """转换为字典，便于写日志"""
+        return {
+            'frames': self.frames,
+            'total_frames': self.total_frames,
+            'percent': round(self.percent, 2),
+            'fps': self.fps,
+            'speed': self.speed,
+            'total_size': self.total_size,
+            'out_time': round(self.out_time, 3),
+            'elapsed': round(self.elapsed, 3),
+            'eta': None if self.eta is None else round(self.eta, 1),
+        }
+
+    def describe(self):
+        """生成状态栏文字"""
+        text = f"转换中... {self.percent:.1f}% (已处理 {self.frames} 帧"
+        if self.fps:
+            text += f", {self.fps:.1f} 帧/秒"
+        if self.speed:
+            text += f", {self.speed:.2f}x"
+        eta = self.eta
+        if eta is not None:
+            text += f", 剩余 {format_duration(eta)}"
+        return text + ")"
+
+
+def _parse_int(value, default):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _parse_float(value, default):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class DedupeManifest:
+    """根据去重滤镜前后showinfo的日志生成清单：每个原始输出帧的序号、时间戳和对应的保留文件"""
+
+    ALL = 'vfc_all'
+    KEPT = 'vfc_kept'
+    LINE_PATTERN = re.compile(r'^\[(vfc_all|vfc_kept) @ [^\]]*\] n:\s*(\d+).*?pts_time:(\S+)')
+
+    def __init__(self):
+        self.all_times = []
+        self.kept_times = []
+
+    def feed(self, line):
+        """处理一行FFmpeg日志，属于showinfo输出时返回True"""
+        match = self.LINE_PATTERN.match(line)
+        if not match:
+            return False
+        try:
+            pts_time = float(match.group(3))
+        except ValueError:
+            return True
+        if match.group(1) == self.ALL:
+            self.all_times.append(pts_time)
+        else:
+            self.kept_times.append(pts_time)
+        return True
+
+    def build(self, settings):
+        """生成清单字典，每帧对应不晚于它的最近一个保留帧"""
+        frames = []
+        kept = -1
+        for index, pts_time in enumerate(self.all_times):
+            while (kept + 1 < len(self.kept_times) and
+                   self.kept_times[kept + 1] <= pts_time + 1e-6):
+                kept += 1
+            name = None
+            if kept >= 0:
+                name = format_frame_name(settings.prefix, settings.start_number + kept,
+                                         settings.digits, settings.format_ext)
+            frames.append({'index': index, 'time': round(pts_time, 6), 'file': name,
+                           'kept': kept >= 0 and self.kept_times[kept] == pts_time})
+        return {
+            'video': os.path.basename(settings.video_file),
+            'mode': settings.mode,
+            'fps': settings.fps,
+            'dedupe_threshold': settings.dedupe_threshold,
+            'total_frames': len(self.all_times),
+            'kept_frames': len(self.kept_times),
+            'frames': frames,
+        }
+
+    def write(self, settings):
+        """写入输出文件夹，失败时抛出ConversionError"""
+        write_output_json(os.path.join(settings.output_folder, MANIFEST_NAME),
+                          self.build(settings))
+
+
+class SelectionManifest(DedupeManifest):
+    """每N帧和指定帧方式的清单：每个输出文件对应的源视频帧号和时间戳"""
+
+    def __init__(self, source_frames=None):
+        super().__init__()
+        self.source_frames = source_frames  # 指定帧方式的源帧号，每N帧方式由间隔计算
+
+    def build(self, settings):
+        frames = []
+        for index, pts_time in enumerate(self.kept_times):
+            if self.source_frames is not None:
+                source_frame = self.source_frames[index] if index < len(self.source_frames) else None
+            else:
+                source_frame = index * int(settings.stride)
+            frames.append({
+                'source_frame': source_frame,
+                'time': round(pts_time, 6),
+                'file': format_frame_name(settings.prefix, settings.start_number + index,
+                                          settings.digits, settings.format_ext),
+            })
+        return {
+            'video': os.path.basename(settings.video_file),
+            'mode': settings.mode,
+            'stride': settings.stride if settings.mode == MODE_STRIDE else None,
+            'requested_frames': (len(self.source_frames)
+                                 if self.source_frames is not None else None),
+            'kept_frames': len(self.kept_times),
+            'frames': frames,
+        }
+
+
+class FFmpegProcess:
+    """通过-progress通道报告进度的FFmpeg子进程
+
+    stdout专用于进度键值对，每收到一组完整的键值（以progress=结尾）更新一次ProgressInfo
+    并回调on_update；stderr在后台线程中读取，先交给on_log处理（返回True表示已消费），
+    其余只保留最后几行用于报错。
+    指定on_output时stdout为二进制输出数据，交给on_output(stream)读取，进度改为写入stderr
+    """
+
+    LOG_TAIL_LINES = 20
+
+    # stderr中的进度键值行（日志行以[或大写字母开头）
+    PROGRESS_LINE = re.compile(r'^[a-z_0-9]+=')
+
+    def __init__(self, cmd, progress, on_update=None, on_log=None, loglevel='error',
+                 on_output=None):
+        self.progress = progress
+        self.on_update = on_update
+        self.on_log = on_log
+        self.on_output = on_output
+        self.log_tail = collections.deque(maxlen=self.LOG_TAIL_LINES)
+        self._values = {}
+        progress_pipe = 'pipe:2' if on_output else 'pipe:1'
+        cmd = cmd[:1] + ['-progress', progress_pipe, '-nostats', '-loglevel', loglevel] + cmd[1:]
+        kwargs = popen_kwargs()
+        if on_output:
+            # 标准输出为二进制图片数据，stderr单独按文本解码
+            kwargs.pop('encoding', None)
+            kwargs.pop('errors', None)
+        self.process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            stdin=subprocess.DEVNULL,
+            **kwargs
+        )
+        self._stderr_thread = threading.Thread(target=self._drain_stderr)
+        self._stderr_thread.daemon = True
+        self._stderr_thread.start()
+
+    def _drain_stderr(self):
+        stderr = self.process.stderr
+        if self.on_output:
+            stderr = io.TextIOWrapper(stderr, encoding='utf-8', errors='replace')
+        for line in stderr:
+            line = line.strip()
+            if not line:
+                continue
+            if self.on_output and self.PROGRESS_LINE.match(line):
+                self._feed_progress(line)
+            elif not (self.on_log and self.on_log(line)):
+                self.log_tail.append(line)
+
+    def _feed_progress(self, line):
+        """处理一行进度键值，一组键值完整时更新进度"""
+        key, sep, value = line.strip().partition('=')
+        if not sep:
+            return
+        self._values[key] = value.strip()
+        if key == 'progress':
+            self.progress.update(self._values)
+            self._values = {}
+            if self.on_update:
+                self.on_update(self.progress)
+
+    def monitor(self):
+        """读取进度（或输出数据）直到FFmpeg结束（阻塞）"""
+        if self.on_output:
+            try:
+                self.on_output(self.process.stdout)
+            except BaseException:
+                # 写入失败或取消时结束FFmpeg，避免其阻塞在写管道上
+                self.terminate()
+                raise
+            return
+        for line in self.process.stdout:
+            self._feed_progress(line)
+
+    def wait(self):
+        """等待结束，返回退出码"""
+        return_code = self.process.wait()
+        # 需要完整日志或进度写入stderr时等待stderr读完
+        self._stderr_thread.join(timeout=None if self.on_log or self.on_output else 1)
+        return return_code
+
+    @property
+    def error_output(self):
+        return "\n".join(self.log_tail)
+
+    def terminate(self):
+        if self.process.poll() is None:
+            try:
+                self.process.terminate()
+            except OSError:
+                pass
+
+
+class ConversionJob:
+    """单个视频的FFmpeg转换任务，run()阻塞执行，cancel()可从其他线程调用
+
+    on_progress(ProgressInfo)在后台线程中调用，调用频率由FFmpeg决定，界面应自行合并刷新
+    """
+
+    def __init__(self, settings, on_progress=None):
+        self.settings = settings
+        self.metrics = JobMetrics(settings)
+        self.on_progress = self.metrics.wrap(on_progress)
+        self.progress = None
+        self.ffmpeg = None
+        self.cancelled = False
+        self._lock = threading.Lock()
+
+    def run(self):
+        """执行转换，返回ConversionResult"""
+        self.settings.validate()
+        ensure_output_folders(self.settings)
+
+        # 估计输出帧数用于进度计算
+        frame_numbers = None
+        with self.metrics.stage(STAGE_PROBE):
+            if self.settings.mode == MODE_LIST:
+                frame_numbers = resolve_frame_numbers(self.settings)
+                write_select_script(self.settings, frame_numbers)
+                total_frames = len(frame_numbers)
+            else:
+                total_frames = get_output_frames(self.settings)
+            if self.settings.dedupe:
+                # 去重后的输出帧数无法预估，按已处理时长计算进度
+                total_frames = 0
+            duration = 0 if total_frames else get_video_duration(self.settings.video_file)
+        self.progress = ProgressInfo(total_frames, duration)
+
+        manifest = None
+        if self.settings.dedupe:
+            manifest = DedupeManifest()
+        elif self.settings.mode in (MODE_STRIDE, MODE_LIST):
+            manifest = SelectionManifest(frame_numbers)
+
+        pack = None
+        if self.settings.pack:
+            # 打包输出依赖的模块仅在使用时导入
+            from frame_pack import PackOutput
+            pack = PackOutput(self.settings, pack_path(self.settings))
+
+        with self._lock:
+            if self.cancelled:
+                if pack:
+                    pack.finish(False)
+                return ConversionResult(None, 0, cancelled=True)
+            write_journal(self.settings)
+            self.ffmpeg = FFmpegProcess(
+                build_ffmpeg_command(self.settings), self.progress, self.on_progress,
+                on_log=manifest.feed if manifest else None,
+                loglevel='info' if manifest else 'error',
+                on_output=pack.consume if pack else None)
+            self.metrics.track(self.ffmpeg.process)
+
+        pack_error = None
+        try:
+            with self.metrics.stage(STAGE_CONVERT):
+                self.ffmpeg.monitor()
+                # 进程回收前读取最终的资源统计
+                self.metrics.observe(self.progress, force=True)
+                return_code = self.ffmpeg.wait()
+        except (ConversionError, OSError) as e:
+            if pack is None:
+                # 结束并回收FFmpeg后再抛出，避免遗留子进程
+                self.ffmpeg.terminate()
+                self.ffmpeg.wait()
+                raise
+            pack_error = str(e)
+            return_code = self.ffmpeg.wait()
+        except BaseException:
+            # 包括KeyboardInterrupt：结束FFmpeg，删除未写完的归档
+            self.ffmpeg.terminate()
+            self.ffmpeg.wait()
+            if pack:
+                pack.finish(False)
+            raise
+        with self.metrics.stage(STAGE_FINALIZE):
+            result = self._finalize(return_code, pack, pack_error, manifest, frame_numbers)
+        return self.metrics.finish(result, self.progress)
+
+    def _finalize(self, return_code, pack, pack_error, manifest, frame_numbers):
+        """关闭归档、删除选帧脚本、写入清单和转换记录，返回ConversionResult"""
+        if pack:
+            if pack_error and not self.cancelled:
+                return_code = return_code or 1
+            pack.finish(return_code == 0 and not self.cancelled)
+            # 以实际写入归档的帧数为准
+            self.progress.frames = pack.frame_count
+        if frame_numbers is not None:
+            try:
+                os.remove(select_script_path(self.settings))
+            except OSError:
+                pass
+        result = ConversionResult(return_code, self.progress.frames, self.cancelled,
+                                  pack_error or self.ffmpeg.error_output)
+        if result.ok and manifest:
+            try:
+                for output in self.settings.output_settings():
+                    manifest.write(output)
+            except ConversionError as e:
+                # 清单是输出的一部分，写入失败时转换失败
+                result = ConversionResult(1, result.frame_count, error_output=str(e))
+        return complete_journal(self.settings, result)
+
+    def cancel(self):
+        """取消转换"""
+        with self._lock:
+            self.cancelled = True
+            if self.ffmpeg:
+                self.ffmpeg.terminate()
+
+
+class SegmentedConversionJob:
+    """分段转换，每段一个FFmpeg进程，最多同时运行workers个
+
+    每段在输入端快速定位到分段起点，并使用对应的起始序号，输出文件名与单进程转换完全一致；
+    各段进度合并为一个ProgressInfo回调。并行转换时把整个序列均分为workers段，
+    续转时只转换输出文件夹中缺失的分段，区间提取时每个区间一段
+    """
+
+    def __init__(self, settings, on_progress=None):
+        self.settings = settings
+        self.metrics = JobMetrics(settings)
+        self.on_progress = self.metrics.wrap(on_progress)
+        self.progress = None
+        self.workers = []
+        self.fallback = None
+        self.skipped_frames = 0  # 续转时已存在、无需重新转换的帧数
+        self.cancelled = False
+        self._pending = []
+        self._return_codes = []
+        self._errors = []  # 无法启动的分段的错误信息
+        self._next_number = settings.start_number
+        self._threads = None
+        self._lock = threading.Lock()
+
+    def run(self):
+        """执行转换，返回ConversionResult"""
+        self.settings.validate()
+        ensure_output_folders(self.settings)
+
+        with self.metrics.stage(STAGE_PROBE):
+            tasks, total_frames, duration, workers = self._plan()
+        if tasks == []:
+            # 续转时全部帧都已完成
+            return ConversionResult(0, self.skipped_frames)
+        if tasks is None:
+            # 无法估计帧数时退回单进程转换，由其记录统计
+            with self._lock:
+                self.fallback = ConversionJob(self.settings, self.metrics.callback)
+                self.metrics = self.fallback.metrics
+                if self.cancelled:
+                    self.fallback.cancel()
+            result = self.fallback.run()
+            self.progress = self.fallback.progress
+            return result
+
+        self.progress = ProgressInfo(max(0, total_frames - self.skipped_frames), duration)
+        workers = min(workers, len(tasks))
+        if workers > 1:
+            # 每个FFmpeg默认按CPU核心数开线程，同时运行多个时平分核心
+            self._threads = max(1, (os.cpu_count() or 1) // workers)
+        with self._lock:
+            if self.cancelled:
+                return ConversionResult(None, self.skipped_frames, cancelled=True)
+            write_journal(self.settings, frame_count=self.skipped_frames)
+            self._pending = list(tasks)
+
+        with self.metrics.stage(STAGE_CONVERT):
+            runners = []
+            for _ in range(workers):
+                runner = threading.Thread(target=self._run_segments)
+                runner.daemon = True
+                runner.start()
+                runners.append(runner)
+            for runner in runners:
+                runner.join()
+
+        return_code = next((code for code in self._return_codes if code != 0), 0)
+        errors = "\n".join(self._errors + [worker.error_output for worker in self.workers
+                                           if worker.error_output])
+        result = ConversionResult(return_code, self.skipped_frames + self.progress.frames,
+                                  self.cancelled, errors)
+        if result.ok:
+            with self.metrics.stage(STAGE_FINALIZE):
+                result = complete_journal(self.settings, result)
+        return self.metrics.finish(result, self.progress)
+
+    def _plan(self):
+        """规划分段，返回(任务列表, 输出帧数, 时长, 同时运行数)
+
+        续转时全部帧都已完成返回空列表，无法估计帧数（需退回单进程转换）时返回None
+        """
+        duration = 0
+        workers = self.settings.workers
+        total_frames = 0 if self.settings.ranges else get_output_frames(self.settings)
+        if self.settings.ranges:
+            tasks = plan_range_tasks(self.settings)
+            total_frames = sum(task.get('frame_limit') or 0 for task in tasks)
+            if not total_frames:
+                duration = sum(end - start for start, end in self.settings.ranges)
+            if any(task['start_number'] is None for task in tasks):
+                # 连续编号依赖前一个区间的实际输出帧数，只能依次转换
+                workers = 1
+        elif self.settings.resume:
+            segments = self._plan_resume(total_frames)
+            if not segments:
+                return [], total_frames, duration, workers
+            tasks = [segment_task(self.settings, *segment) for segment in segments]
+        elif total_frames > 0:
+            segments = plan_segments(total_frames, workers, self.settings.fps)
+            tasks = [segment_task(self.settings, *segment) for segment in segments]
+        else:
+            tasks = None
+        return tasks, total_frames, duration, workers
+
+    def _plan_resume(self, total_frames):
+        """核对转换记录并扫描已写入的帧，返回需要补写的分段；全部完成时返回空列表"""
+        journal = read_journal(self.settings.output_folder)
+        existing = scan_existing_frames(self.settings)
+        if journal is None:
+            if existing:
+                raise ConversionError("输出文件夹中的序列帧没有转换记录，无法确认参数，不能续转")
+        elif journal.get('settings') != self.settings.signature():
+            raise ConversionError("输出文件夹中的序列帧是用不同的视频或参数生成的，不能续转\n"
+                                  "请更换输出文件夹，或取消续转重新转换")
+        elif journal.get('completed'):
+            self.skipped_frames = journal.get('frame_count') or len(existing)
+            return []
+
+        existing = verify_run_tails(self.settings, existing)
+        segments = find_missing_ranges(existing, total_frames)
+        if total_frames > 0:
+            self.skipped_frames = len([index for index in existing if index < total_frames])
+        else:
+            # 帧数未知时第一个缺口之后的帧会全部重新转换
+            self.skipped_frames = segments[0][0]
+        return segments
+
+    def _run_segments(self):
+        """依次取出待转换分段执行（在后台线程中运行）"""
+        while True:
+            with self._lock:
+                if self.cancelled or not self._pending:
+                    return
+                task = dict(self._pending.pop(0))
+                if task['start_number'] is None:
+                    task['start_number'] = self._next_number
+                task['threads'] = self._threads
+                try:
+                    worker = FFmpegProcess(build_ffmpeg_command(**task), ProgressInfo(),
+                                           self._on_worker_progress)
+                except (ConversionError, OSError) as e:
+                    # 与分段失败相同处理：记录非零退出码，不再启动剩余分段
+                    self._return_codes.append(1)
+                    self._errors.append(f"无法启动FFmpeg：{e}")
+                    self._pending = []
+                    return
+                self.workers.append(worker)
+                self.metrics.track(worker.process)
+            worker.monitor()
+            # 进程回收前读取该分段最终的资源统计
+            self.metrics.observe(self.progress, force=True)
+            return_code = worker.wait()
+            with self._lock:
+                self._return_codes.append(return_code)
+                self._next_number = task['start_number'] + worker.progress.frames
+                if return_code != 0 and not self.cancelled:
+                    # 某段失败时不再启动剩余分段
+                    self._pending = []
+
+    def _on_worker_progress(self, _):
+        """合并各分段进度后回调"""
+        with self._lock:
+            self.progress = ProgressInfo.merge(
+                [worker.progress for worker in self.workers],
+                self.progress.total_frames, self.progress.started_at,
+                self.progress.duration)
+            # 还有分段未启动时不算完成
+            self.progress.finished = self.progress.finished and not self._pending
+            progress = self.progress
+        if self.on_progress:
+            self.on_progress(progress)
+
+    def cancel(self):
+        """取消所有分段"""
+        with self._lock:
+            self.cancelled = True
+            self._pending = []
+            if self.fallback:
+                self.fallback.cancel()
+            for worker in self.workers:
+                worker.terminate()
+
+
+def create_job(settings, on_progress=None):
+    """根据转换引擎、取帧方式、区间、并行和续转设置创建转换任务"""
+    if settings.atlas:
+        # 图集输出依赖NumPy/OpenCV，仅在使用时导入
+        from frame_atlas import AtlasConversionJob
+        return AtlasConversionJob(settings, on_progress)
+    if settings.ranges:
+        return SegmentedConversionJob(settings, on_progress)
+    if settings.mode != MODE_FPS or settings.dedupe or settings.pack:
+        # 关键帧、场景切换、选帧和去重后的输出帧无法按帧号分段，打包输出只能顺序写入
+        return ConversionJob(settings, on_progress)
+    if settings.engine == ENGINE_POOL:
+        # 进程池引擎依赖NumPy/OpenCV，仅在使用时导入
+        from frame_encoder import PoolConversionJob
+        return PoolConversionJob(settings, on_progress)
+    if settings.workers > 1 or settings.resume:
+        return SegmentedConversionJob(settings, on_progress)
+    return ConversionJob(settings, on_progress)
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+转换任务的分阶段计时和资源统计
+记录探测、FFmpeg启动（到报告第一帧）、转换和收尾各阶段的耗时，按时间采样输出帧率，
+以及FFmpeg子进程的CPU时间、峰值内存和读写字节数；任务结束时在输出文件夹写入JSON报告，
+也可以逐行输出logfmt格式（key=value）的指标，供监控程序收集
+"""
+
+import contextlib
+import os
+import sys
+import threading
+import time
+
+import app_cache
+
+
+# 报告文件名（写入输出文件夹）
+REPORT_NAME = '.vfc_metrics.json'
+REPORT_VERSION = 1
+
+# 采样间隔（秒），采样数超过MAX_SAMPLES时间隔加倍并隔一个丢弃一个
+SAMPLE_INTERVAL = 1.0
+MAX_SAMPLES = 600
+
+# 输出到标准输出的指标流名称
+STREAM_STDOUT = '-'
+
+# 阶段名称
+STAGE_PROBE = 'probe'        # 估计帧数、解析帧列表等转换前的探测
+STAGE_STARTUP = 'startup'    # 启动FFmpeg到报告第一帧
+STAGE_CONVERT = 'convert'    # 启动FFmpeg到转换结束
+STAGE_DECODE = 'decode'      # 进程内读取帧时等待FFmpeg解码的时间
+STAGE_ENCODE = 'encode'      # 进程内编码和写入图片的时间
+STAGE_ENCODE_WAIT = 'encode_wait'  # 进程池编码跟不上、读取端等待空闲槽位的时间
+STAGE_FINALIZE = 'finalize'  # 写归档、清单和转换记录
+
+# 阶段的显示名称，报告和摘要按此顺序排列
+STAGE_TEXT = {
+    STAGE_PROBE: "探测",
+    STAGE_STARTUP: "启动",
+    STAGE_CONVERT: "转换",
+    STAGE_DECODE: "解码",
+    STAGE_ENCODE: "编码",
+    STAGE_ENCODE_WAIT: "等待编码",
+    STAGE_FINALIZE: "收尾",
+}
+
+_CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+_stream_lock = threading.Lock()
+
+
+def _read_proc(pid, name):
+    with open(f"/proc/{pid}/{name}", 'rb') as f:
+        return f.read().decode('ascii', 'replace')
+
+
+def _linux_usage(pid):
+    usage = {}
+    try:
+        # 进程名可能含空格，从最后一个右括号之后按空格分隔，第0项为state（stat第3项）
+        fields = _read_proc(pid, 'stat').rsplit(')', 1)[1].split()
+        usage['cpu'] = (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+    except (OSError, IndexError, ValueError):
+        return None
+    # 进程已退出（僵尸进程）时内存和IO信息不可读，保留上一次的值
+    try:
+        for line in _read_proc(pid, 'status').splitlines():
+            if line.startswith('VmHWM:'):
+                usage['peak_rss_mb'] = int(line.split()[1]) / 1024
+    except (OSError, IndexError, ValueError):
+        pass
+    try:
+        for line in _read_proc(pid, 'io').splitlines():
+            key, _, value = line.partition(':')
+            if key == 'rchar':
+                usage['read_bytes'] = int(value)
+            elif key == 'wchar':
+                usage['write_bytes'] = int(value)
+    except (OSError, ValueError):
+        pass
+    return usage
+
+
+def _windows_usage(pid):
+    import ctypes
+    from ctypes import wintypes
+
+    class MemoryCounters(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [
+            (name, ctypes.c_size_t) for name in (
+                'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage',
+                'QuotaPagedPoolUsage', 'QuotaPeakNonPagedPoolUsage',
+                'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage')]
+
+    class IoCounters(ctypes.Structure):
+        _fields_ = [(name, ctypes.c_ulonglong) for name in (
+            'ReadOperationCount', 'WriteOperationCount', 'OtherOperationCount',
+            'ReadTransferCount', 'WriteTransferCount', 'OtherTransferCount')]
+
+    kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+    kernel32.OpenProcess.restype = wintypes.HANDLE
+    # PROCESS_QUERY_LIMITED_INFORMATION | PROCESS_VM_READ
+    handle = kernel32.OpenProcess(0x1000 | 0x0010, False, pid)
+    if not handle:
+        return None
+    try:
+        times = [ctypes.c_ulonglong() for _ in range(4)]
+        if not kernel32.GetProcessTimes(wintypes.HANDLE(handle),
+                                        *[ctypes.byref(t) for t in times]):
+            return None
+        # 内核态和用户态时间，单位100纳秒
+        usage = {'cpu': (times[2].value + times[3].value) / 1e7}
+        memory = MemoryCounters()
+        memory.cb = ctypes.sizeof(memory)
+        if kernel32.K32GetProcessMemoryInfo(wintypes.HANDLE(handle), ctypes.byref(memory),
+                                            memory.cb):
+            usage['peak_rss_mb'] = memory.PeakWorkingSetSize / (1024 * 1024)
+        io = IoCounters()
+        if kernel32.GetProcessIoCounters(wintypes.HANDLE(handle), ctypes.byref(io)):
+            usage['read_bytes'] = io.ReadTransferCount
+            usage['write_bytes'] = io.WriteTransferCount
+        return usage
+    finally:
+        kernel32.CloseHandle(wintypes.HANDLE(handle))
+
+
+def process_usage(pid):
+    """读取子进程的CPU时间（秒）、峰值内存（MB）和读写字节数（含管道），不支持的平台返回None
+
+    Linux读取/proc，Windows调用进程API；返回的字典只包含能读到的项
+    """
+    try:
+        if os.name == 'nt':
+            return _windows_usage(pid)
+        if os.path.isdir('/proc'):
+            return _linux_usage(pid)
+    except (OSError, AttributeError):
+        pass
+    return None
+
+
+def format_bytes(size):
+    """把字节数格式化为KB/MB/GB"""
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.2f} GB"
+
+
+def format_line(values):
+    """把键值格式化为一行logfmt，含空格、等号或引号的值加引号"""
+    parts = []
+    for key, value in values.items():
+        if value is None:
+            continue
+        if isinstance(value, float):
+            value = f"{value:.3f}".rstrip('0').rstrip('.')
+        value = str(value)
+        if not value or any(c in value for c in ' ="'):
+            value = '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+        parts.append(f"{key}={value}")
+    return " ".join(parts)
+
+
+class JobMetrics:
+    """一个转换任务的计时和资源统计
+
+    任务在各阶段用stage()计时，启动子进程后用track()登记，进度回调经wrap()包装后自动采样；
+    finish()在输出文件夹写入报告并返回自身，summary()生成一行摘要。
+    settings.metrics_stream为文件路径（追加写入）或'-'（标准输出）时逐行输出指标。
+    写入字节数默认取FFmpeg子进程的写入量；在本进程中编码写文件的任务把own_bytes设为True，
+    改用ProgressInfo.total_size
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.callback = None
+        self.stages = {}
+        self.samples = []
+        self.processes = {}  # pid -> 最近一次读到的资源统计
+        self.started_at = time.time()
+        self.launched_at = None
+        self.first_frame_at = None
+        self.finished_at = None
+        self.status = None
+        self.frames = 0
+        self.bytes_written = 0
+        self.interval = SAMPLE_INTERVAL
+        self.own_bytes = False
+        self._cpu_start = time.process_time()
+        self._app_cpu = None
+        self._last_sample = None
+        self._stream = None
+        self._lock = threading.Lock()
+
+    def wrap(self, callback):
+        """包装进度回调：每次回调时先采样，再调用原回调（可为None）"""
+        self.callback = callback
+
+        def on_progress(progress):
+            self.observe(progress)
+            if callback:
+                callback(progress)
+        return on_progress
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """计时一个阶段，同名阶段的时间累加"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            self.add_time(name, seconds)
+            self.emit(event='stage', stage=name, seconds=seconds)
+
+    def add_time(self, name, seconds):
+        """累加阶段耗时（用于逐帧计时，不输出指标行）"""
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def track(self, process):
+        """登记已启动的子进程（subprocess.Popen），第一个子进程的启动时间作为转换开始时间"""
+        with self._lock:
+            if self.launched_at is None:
+                self.launched_at = time.time()
+            self.processes[process.pid] = {}
+
+    def observe(self, progress, force=False):
+        """根据进度记录第一帧时间，并按采样间隔记录帧率和子进程资源"""
+        now = time.time()
+        with self._lock:
+            if (self.first_frame_at is None and progress.frames > 0 and
+                    self.launched_at is not None):
+                self.first_frame_at = now
+                self.stages[STAGE_STARTUP] = now - self.launched_at
+            due = (self._last_sample is None or
+                   now - self._last_sample[0] >= self.interval)
+            if not due and not force:
+                return
+            usage = self._refresh_usage()
+            sample = {
+                't': round(now - self.started_at, 3),
+                'frames': progress.frames,
+                'fps': 0.0,
+                'bytes': self._bytes_written(progress, usage),
+                'cpu': round(usage.get('cpu', 0.0), 3),
+                'rss_mb': round(usage.get('peak_rss_mb', 0.0), 1),
+            }
+            if not due:
+                # 距上次采样不足一个间隔：只更新上一个采样的累计值，不单独计算帧率
+                if self.samples:
+                    sample['t'] = self.samples[-1]['t']
+                    sample['fps'] = self.samples[-1]['fps']
+                    self.samples[-1] = sample
+                return
+            if self._last_sample is not None and now > self._last_sample[0]:
+                sample['fps'] = round((progress.frames - self._last_sample[1]) /
+                                      (now - self._last_sample[0]), 2)
+            self._last_sample = (now, progress.frames)
+            self.samples.append(sample)
+            if len(self.samples) > MAX_SAMPLES:
+                # 长任务降低采样密度，报告大小有上限
+                self.samples = self.samples[::2]
+                self.interval *= 2
+        self.emit(event='sample', **sample)
+
+    def _bytes_written(self, progress, usage):
+        if self.own_bytes:
+            return progress.total_size if progress else 0
+        return usage.get('write_bytes', 0)
+
+    def _refresh_usage(self):
+        """读取所有已登记子进程的资源统计并汇总：CPU和读写字节累加，峰值内存取最大"""
+        for pid, last in self.processes.items():
+            usage = process_usage(pid)
+            if usage:
+                for key, value in usage.items():
+                    # 各项只增不减，进程退出后读不到的项保留上一次的值
+                    last[key] = max(last.get(key, 0), value)
+        return self.process_totals()
+
+    def process_totals(self):
+        totals = {}
+        for usage in self.processes.values():
+            for key, value in usage.items():
+                if key == 'peak_rss_mb':
+                    totals[key] = max(totals.get(key, 0.0), value)
+                else:
+                    totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def finish(self, result, progress=None):
+        """任务结束：记录结果、写入报告，把自身附加到result.metrics，返回result"""
+        if progress is not None:
+            self.observe(progress, force=True)
+        with self._lock:
+            self.finished_at = time.time()
+            self._app_cpu = time.process_time() - self._cpu_start
+            if result.cancelled:
+                self.status = 'cancelled'
+            else:
+                self.status = 'ok' if result.ok else 'failed'
+            self.frames = result.frame_count
+            totals = self.process_totals()
+            self.bytes_written = self._bytes_written(progress, totals)
+        result.metrics = self
+
+        folder = self.settings.output_folder
+        if os.path.isdir(folder):
+            app_cache.save_json(os.path.join(folder, REPORT_NAME), self.to_dict())
+        self.emit(event='summary', status=self.status, frames=self.frames,
+                  elapsed=self.elapsed, fps=self.fps, bytes=self.bytes_written,
+                  cpu=totals.get('cpu'), peak_rss_mb=totals.get('peak_rss_mb'),
+                  **{f"stage_{name}": seconds for name, seconds in self.ordered_stages()})
+        self.close()
+        return result
+
+    def ordered_stages(self):
+        """按STAGE_TEXT的顺序返回[(阶段, 秒数), ...]"""
+        order = list(STAGE_TEXT)
+        return sorted(self.stages.items(),
+                      key=lambda item: order.index(item[0]) if item[0] in order else len(order))
+
+    @property
+    def elapsed(self):
+        return (self.finished_at or time.time()) - self.started_at
+
+    @property
+    def fps(self):
+        """整个任务（含探测和收尾）的平均输出帧率"""
+        return self.frames / self.elapsed if self.elapsed > 0 else 0.0
+
+    def to_dict(self):
+        settings = self.settings
+        totals = self.process_totals()
+        return {
+            'version': REPORT_VERSION,
+            'video': settings.video_file,
+            'output_folder': settings.output_folder,
+            'engine': settings.engine,
+            'mode': settings.mode,
+            'format': settings.format_ext,
+            'workers': settings.workers,
+            'status': self.status,
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started_at)),
+            'elapsed': round(self.elapsed, 3),
+            'frames': self.frames,
+            'fps': round(self.fps, 2),
+            'bytes_written': self.bytes_written,
+            'stages': {name: round(seconds, 3) for name, seconds in self.ordered_stages()},
+            'ffmpeg': {
+                'processes': len(self.processes),
+                'cpu': round(totals.get('cpu', 0.0), 3),
+                'peak_rss_mb': round(totals.get('peak_rss_mb', 0.0), 1),
+                'read_bytes': totals.get('read_bytes', 0),
+                'write_bytes': totals.get('write_bytes', 0),
+            },
+            'app_cpu': None if self._app_cpu is None else round(self._app_cpu, 3),
+            'samples': self.samples,
+        }
+
+    def summary(self):
+        """一行摘要，用于状态栏和命令行输出"""
+        text = f"用时 {self.elapsed:.1f}s"
+        stages = [f"{STAGE_TEXT.get(name, name)} {seconds:.1f}s"
+                  for name, seconds in self.ordered_stages()]
+        if stages:
+            text += "（" + ", ".join(stages) + "）"
+        text += f", {self.fps:.1f} 帧/秒"
+        if self.bytes_written:
+            text += f", 写入 {format_bytes(self.bytes_written)}"
+        totals = self.process_totals()
+        if 'cpu' in totals:
+            text += f", FFmpeg CPU {totals['cpu']:.1f}s"
+        if totals.get('peak_rss_mb'):
+            text += f", 峰值内存 {totals['peak_rss_mb']:.0f} MB"
+        return text
+
+    def emit(self, **values):
+        """输出一行指标（未指定指标流时忽略）"""
+        target = self.settings.metrics_stream
+        if not target:
+            return
+        line = format_line(dict({'ts': round(time.time(), 3),
+                                 'video': os.path.basename(self.settings.video_file or '')},
+                                **values))
+        with _stream_lock:
+            try:
+                if target == STREAM_STDOUT:
+                    sys.stdout.write(line + "\n")
+                    sys.stdout.flush()
+                    return
+                if self._stream is None:
+                    # 批量任务可共用一个文件，追加写入，每行一次写入
+                    self._stream = open(target, 'a', encoding='utf-8', buffering=1)
+                self._stream.write(line + "\n")
+            except OSError as e:
+                print(f"写入指标失败：{e}")
+                self.settings.metrics_stream = None
+
+    def close(self):
+        with _stream_lock:
+            if self._stream is not None:
+                self._stream.close()
+                self._stream = None
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+打包输出
+FFmpeg以image2pipe把编码好的图片连续写入管道，按图片格式的结构逐帧切分后写入单个归档文件
+（不压缩的tar/zip，或带偏移表的vfcpack），不在输出文件夹中产生大量小文件；
+FramePack用内存映射读取归档，按序号或文件名直接取出任意一帧，无需解压
+"""
+
+import io
+import mmap
+import os
+import struct
+import tarfile
+import time
+import zipfile
+
+from frame_engine import PACK_TAR, PACK_VFC, PACK_ZIP, ConversionError, format_frame_name
+
+
+# vfcpack文件头和尾部索引标记
+VFC_MAGIC = b'VFCPACK1'
+VFC_INDEX_MAGIC = b'VFCINDX1'
+
+# 尾部：偏移表位置、帧数、索引标记
+VFC_FOOTER = struct.Struct('<QQ8s')
+
+# 偏移表中每帧的(偏移, 字节数)
+VFC_ENTRY = struct.Struct('<QQ')
+
+# 从管道读取的块大小
+READ_CHUNK = 1024 * 1024
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+class ImageStreamSplitter:
+    """把image2pipe输出的连续图片数据切分为单帧
+
+    PNG按数据块长度、BMP和WebP按文件头中的长度、JPG按标记段和扫描数据结尾切分，
+    不依赖在数据中搜索结尾标记，图片内容中出现相同字节也不会切错
+    """
+
+    def __init__(self, stream, format_ext):
+        self.stream = stream
+        self.format_ext = format_ext
+        self._buffer = bytearray()
+        self._eof = False
+
+    def _fill(self, size):
+        """确保缓冲区至少有size字节，数据不足时返回False"""
+        # read1只返回管道中已有的数据，不等待读满整块
+        read = getattr(self.stream, 'read1', self.stream.read)
+        while len(self._buffer) < size and not self._eof:
+            chunk = read(max(READ_CHUNK, size - len(self._buffer)))
+            if not chunk:
+                self._eof = True
+            else:
+                self._buffer += chunk
+        return len(self._buffer) >= size
+
+    def _take(self, size):
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def __iter__(self):
+        measure = {
+            'png': self._png_size,
+            'jpg': self._jpeg_size,
+            'jpeg': self._jpeg_size,
+            'bmp': self._bmp_size,
+            'webp': self._webp_size,
+        }[self.format_ext]
+        while self._fill(1):
+            yield self._take(measure())
+
+    def _require(self, size):
+        if not self._fill(size):
+            raise ConversionError("图片数据不完整，FFmpeg输出提前结束")
+
+    def _png_size(self):
+        self._require(8)
+        if self._buffer[:8] != PNG_SIGNATURE:
+            raise ConversionError("无法识别的PNG数据")
+        pos = 8
+        while True:
+            self._require(pos + 8)
+            length, chunk_type = struct.unpack_from('>I4s', self._buffer, pos)
+            pos += 12 + length
+            if chunk_type == b'IEND':
+                self._require(pos)
+                return pos
+
+    def _bmp_size(self):
+        self._require(6)
+        if self._buffer[:2] != b'BM':
+            raise ConversionError("无法识别的BMP数据")
+        size = struct.unpack_from('<I', self._buffer, 2)[0]
+        self._require(size)
+        return size
+
+    def _webp_size(self):
+        self._require(8)
+        if self._buffer[:4] != b'RIFF':
+            raise ConversionError("无法识别的WebP数据")
+        size = struct.unpack_from('<I', self._buffer, 4)[0]
+        size = 8 + size + (size & 1)
+        self._require(size)
+        return size
+
+    def _jpeg_size(self):
+        self._require(2)
+        if self._buffer[:2] != b'\xff\xd8':
+            raise ConversionError("无法识别的JPG数据")
+        pos = 2
+        while True:
+            self._require(pos + 2)
+            if self._buffer[pos] != 0xff:
+                raise ConversionError("JPG数据结构错误")
+            marker = self._buffer[pos + 1]
+            if marker == 0xff:
+                # 填充字节
+                pos += 1
+                continue
+            if marker == 0xd9:
+                return pos + 2
+            if 0xd0 <= marker <= 0xd7 or marker == 0x01:
+                pos += 2
+                continue
+            self._require(pos + 4)
+            pos += 2 + struct.unpack_from('>H', self._buffer, pos + 2)[0]
+            if marker == 0xda:
+                pos = self._jpeg_scan_end(pos)
+
+    def _jpeg_scan_end(self, pos):
+        """跳过扫描数据，返回其后下一个标记的位置（FF 00和RST标记属于扫描数据）"""
+        while True:
+            self._require(pos + 2)
+            index = self._buffer.find(b'\xff', pos, len(self._buffer) - 1)
+            if index < 0:
+                pos = len(self._buffer) - 1
+                self._require(len(self._buffer) + 1)
+                continue
+            following = self._buffer[index + 1]
+            if following == 0x00 or 0xd0 <= following <= 0xd7:
+                pos = index + 2
+                continue
+            return index
+
+
+class TarPackWriter:
+    """不压缩的tar归档"""
+
+    def __init__(self, path):
+        self.archive = tarfile.open(path, 'w', format=tarfile.PAX_FORMAT)
+        self.mtime = time.time()
+
+    def add(self, name, data):
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = self.mtime
+        self.archive.addfile(info, io.BytesIO(data))
+
+    def close(self):
+        self.archive.close()
+
+
+class ZipPackWriter:
+    """只存储不压缩的zip归档"""
+
+    def __init__(self, path):
+        self.archive = zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED, allowZip64=True)
+        self.date_time = time.localtime()[:6]
+
+    def add(self, name, data):
+        info = zipfile.ZipInfo(name, self.date_time)
+        info.compress_type = zipfile.ZIP_STORED
+        self.archive.writestr(info, data)
+
+    def close(self):
+        self.archive.close()
+
+
+class VfcPackWriter:
+    """带偏移表的二进制归档
+
+    结构：VFC_MAGIC | 各帧数据 | 偏移表（每帧VFC_ENTRY） | 文件名（UTF-8，换行分隔） | VFC_FOOTER
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+        self.file.write(VFC_MAGIC)
+        self.entries = []
+        self.names = []
+
+    def add(self, name, data):
+        self.entries.append((self.file.tell(), len(data)))
+        self.names.append(name)
+        self.file.write(data)
+
+    def close(self):
+        table_offset = self.file.tell()
+        for entry in self.entries:
+            self.file.write(VFC_ENTRY.pack(*entry))
+        self.file.write("\n".join(self.names).encode('utf-8'))
+        self.file.write(VFC_FOOTER.pack(table_offset, len(self.entries), VFC_INDEX_MAGIC))
+        self.file.close()
+
+
+PACK_WRITERS = {
+    PACK_TAR: TarPackWriter,
+    PACK_ZIP: ZipPackWriter,
+    PACK_VFC: VfcPackWriter,
+}
+
+
+class FramePack:
+    """用内存映射读取打包输出，按写入顺序的序号或文件名取帧
+
+    pack[i]返回第i帧图片数据的memoryview（不复制），关闭后失效；
+    可作为上下文管理器使用
+
+        with FramePack('out/frames.vfcpack') as pack:
+            data = pack[10]
+            data = pack.read('0011.png')
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # 空文件无法映射
+            self._file.close()
+            raise ConversionError(f"归档文件为空：{path}")
+        self._view = memoryview(self._map)
+        try:
+            if self._map[:len(VFC_MAGIC)] == VFC_MAGIC:
+                self.entries = self._read_vfc_index()
+            elif zipfile.is_zipfile(path):
+                self.entries = self._read_zip_index()
+            elif tarfile.is_tarfile(path):
+                self.entries = self._read_tar_index()
+            else:
+                raise ConversionError(f"无法识别的归档格式：{path}")
+        except BaseException:
+            self.close()
+            raise
+        self._positions = {name: index for index, (name, _, _) in enumerate(self.entries)}
+
+    def _read_vfc_index(self):
+        table_offset, count, magic = VFC_FOOTER.unpack_from(
+            self._map, len(self._map) - VFC_FOOTER.size)
+        if magic != VFC_INDEX_MAGIC:
+            raise ConversionError(f"归档索引损坏或未写完：{self.path}")
+        names_offset = table_offset + count * VFC_ENTRY.size
+        names = bytes(self._map[names_offset:len(self._map) - VFC_FOOTER.size])
+        names = names.decode('utf-8').split("\n") if count else []
+        return [(names[index],) + VFC_ENTRY.unpack_from(
+                    self._map, table_offset + index * VFC_ENTRY.size)
+                for index in range(count)]
+
+    def _read_zip_index(self):
+        entries = []
+        with zipfile.ZipFile(self.path) as archive:
+            for info in archive.infolist():
+                if info.compress_type != zipfile.ZIP_STORED:
+                    raise ConversionError(f"zip中的帧被压缩，无法直接读取：{info.filename}")
+                # 本地文件头的文件名和扩展字段长度可能与中央目录不同
+                name_length, extra_length = struct.unpack_from(
+                    '<HH', self._map, info.header_offset + 26)
+                offset = info.header_offset + 30 + name_length + extra_length
+                entries.append((info.filename, offset, info.file_size))
+        return entries
+
+    def _read_tar_index(self):
+        with tarfile.open(self.path, 'r') as archive:
+            return [(member.name, member.offset_data, member.size)
+                    for member in archive.getmembers() if member.isfile()]
+
+    @property
+    def names(self):
+        return [name for name, _, _ in self.entries]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, index):
+        _, offset, size = self.entries[index]
+        return self._view[offset:offset + size]
+
+    def read(self, name):
+        """按文件名取帧"""
+        try:
+            return self[self._positions[name]]
+        except KeyError:
+            raise KeyError(name)
+
+    def close(self):
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # 调用方仍持有某一帧的memoryview
+                pass
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+class PackOutput:
+    """把FFmpeg管道输出的图片按命名规则写入归档
+
+    先写入临时文件，转换成功后才替换为最终文件名，失败或取消时不会留下不完整的归档
+    """
+
+    def __init__(self, settings, path):
+        self.settings = settings
+        self.path = path
+        self.tmp_path = path + '.tmp'
+        self.writer = PACK_WRITERS[settings.pack](self.tmp_path)
+        self.frame_count = 0
+
+    def consume(self, stream):
+        """读取管道直到结束，逐帧写入归档（在FFmpeg进度监视线程中调用）"""
+        settings = self.settings
+        number = settings.start_number
+        for data in ImageStreamSplitter(stream, settings.format_ext):
+            self.writer.add(format_frame_name(settings.prefix, number, settings.digits,
+                                              settings.format_ext), data)
+            number += 1
+            self.frame_count += 1
+
+    def finish(self, ok):
+        """关闭归档；成功时替换为最终文件，否则删除临时文件"""
+        self.writer.close()
+        if ok:
+            os.replace(self.tmp_path, self.path)
+            return
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+进程内读取视频帧
+FFmpeg以rawvideo格式把解码后的像素写入管道，直接readinto到预分配并复用的NumPy缓冲区，
+不经过写图片文件再读取解码的过程；取帧方式（fps滤镜、输入端定位）与转换引擎一致
+"""
+
+import collections
+import subprocess
+import threading
+
+import numpy
+
+import media_probe
+from frame_engine import FFMPEG, MODE_FPS, ConversionError, format_number
+from media_probe import popen_kwargs
+
+
+# 像素格式对应的每像素通道数
+PIXEL_FORMATS = {
+    'rgb24': 3,
+    'bgr24': 3,
+    'rgba': 4,
+    'bgra': 4,
+    'gray': 1,
+}
+
+
+def display_size(info):
+    """视频显示尺寸，FFmpeg会按旋转元数据自动旋转，旋转90度时宽高互换"""
+    stream = info.video_stream or {}
+    rotation = stream.get('tags', {}).get('rotate')
+    for side_data in stream.get('side_data_list', []):
+        rotation = side_data.get('rotation', rotation)
+    try:
+        rotated = abs(int(float(rotation))) % 180 == 90
+    except (TypeError, ValueError):
+        rotated = False
+    if rotated:
+        return info.height, info.width
+    return info.width, info.height
+
+
+def build_reader_command(video_file, fps=None, start_time=None, duration=None,
+                         size=None, pix_fmt='rgb24'):
+    """构建输出rawvideo到标准输出的FFmpeg命令
+
+    start_time在输入端快速定位，duration限制读取的时长（秒），size为(宽, 高)时缩放（None为原尺寸）
+    """
+    cmd = [FFMPEG, '-hide_banner', '-nostats', '-loglevel', 'error']
+    if start_time:
+        cmd += ['-ss', f"{start_time:.6f}"]
+    cmd += ['-i', video_file]
+    if duration:
+        cmd += ['-t', f"{duration:.6f}"]
+
+    filters = []
+    if fps:
+        filters.append(f"fps={format_number(fps)}")
+    if size:
+        filters.append(f"scale={size[0]}:{size[1]}")
+    if filters:
+        cmd += ['-vf', ",".join(filters)]
+    cmd += ['-an', '-sn', '-f', 'rawvideo', '-pix_fmt', pix_fmt, 'pipe:1']
+    return cmd
+
+
+class FrameReader:
+    """从FFmpeg管道逐帧（或按批）读取NumPy数组
+
+    每次迭代返回的数组是复用缓冲区的视图，下一次迭代时会被覆盖，需要保留时请copy()；
+    batch_size大于1时返回形状为(N, 高, 宽, 通道)的数组，最后一批可能不足N帧。
+    可作为上下文管理器使用，退出时结束FFmpeg进程；
+    on_eof为读到结尾、回收FFmpeg进程之前的回调（如读取进程的资源统计）
+
+        with FrameReader('input.mp4', fps=10) as reader:
+            for frame in reader:
+                ...
+    """
+
+    LOG_TAIL_LINES = 20
+
+    def __init__(self, video_file, fps=None, start_time=None, duration=None,
+                 size=None, pix_fmt='rgb24', batch_size=1):
+        if pix_fmt not in PIXEL_FORMATS:
+            raise ConversionError(f"不支持的像素格式：{pix_fmt}")
+        info = media_probe.probe(video_file)
+        source_size = display_size(info) if info and info.width and info.height else None
+        if size is None:
+            if source_size is None:
+                raise ConversionError(f"无法读取视频尺寸：{video_file}")
+            size = source_size
+
+        self.video_file = video_file
+        self.width, self.height = size
+        self.channels = PIXEL_FORMATS[pix_fmt]
+        self.batch_size = max(1, batch_size)
+        self.frames_read = 0
+        # 与原尺寸相同时不加scale滤镜
+        self.cmd = build_reader_command(video_file, fps, start_time, duration,
+                                        None if size == source_size else size, pix_fmt)
+        self.process = None
+        self.on_eof = None
+        self._eof = False
+        self.log_tail = collections.deque(maxlen=self.LOG_TAIL_LINES)
+
+        shape = (self.height, self.width, self.channels)
+        if self.channels == 1:
+            shape = shape[:2]
+        self._buffer = numpy.empty((self.batch_size,) + shape, dtype=numpy.uint8)
+        self._frame_bytes = self._buffer[0].nbytes
+
+    @property
+    def frame_shape(self):
+        return self._buffer.shape[1:]
+
+    def start(self):
+        """启动FFmpeg进程（迭代时自动调用）"""
+        if self.process is not None:
+            return
+        kwargs = popen_kwargs()
+        # 管道传输二进制像素数据，不能按文本解码
+        kwargs.pop('encoding', None)
+        kwargs.pop('errors', None)
+        self.process = subprocess.Popen(
+            self.cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            stdin=subprocess.DEVNULL,
+            bufsize=0,
+            **kwargs
+        )
+        thread = threading.Thread(target=self._drain_stderr)
+        thread.daemon = True
+        thread.start()
+
+    def _drain_stderr(self):
+        for line in self.process.stderr:
+            line = line.decode('utf-8', 'replace').strip()
+            if line:
+                self.log_tail.append(line)
+
+    @property
+    def frame_bytes(self):
+        return self._frame_bytes
+
+    def readinto(self, view):
+        """把下一帧读入调用方提供的缓冲区（长度为frame_bytes的字节视图），结尾时返回False"""
+        self.start()
+        filled = 0
+        while filled < self._frame_bytes:
+            count = self.process.stdout.readinto(view[filled:self._frame_bytes])
+            if not count:
+                self._eof = True
+                return False
+            filled += count
+        return True
+
+    def _read_frame(self, index):
+        """把一帧读入缓冲区第index个位置，数据不足一帧（结尾）时返回False"""
+        return self.readinto(memoryview(self._buffer[index].reshape(-1)))
+
+    def __iter__(self):
+        self.start()
+        try:
+            while True:
+                count = 0
+                while count < self.batch_size and self._read_frame(count):
+                    count += 1
+                self.frames_read += count
+                if count == 0:
+                    break
+                if self.batch_size == 1:
+                    yield self._buffer[0]
+                else:
+                    yield self._buffer[:count]
+                if count < self.batch_size:
+                    break
+        finally:
+            self.finish()
+
+    def finish(self):
+        """等待FFmpeg结束，异常退出时抛出ConversionError"""
+        if self.process is None:
+            return
+        if not self._eof:
+            # 提前结束迭代，FFmpeg可能阻塞在写管道上
+            self.close()
+            return
+        if self.on_eof:
+            self.on_eof()
+        process = self.process
+        self.process = None
+        return_code = process.wait()
+        process.stdout.close()
+        if return_code != 0:
+            raise ConversionError("FFmpeg读取帧失败：\n" + "\n".join(self.log_tail))
+
+    def terminate(self):
+        """结束FFmpeg进程但不关闭管道，正在读取的线程随后读到结尾（可从其他线程调用）"""
+        process = self.process
+        if process is not None and process.poll() is None:
+            try:
+                process.terminate()
+            except OSError:
+                pass
+
+    def close(self):
+        """结束读取"""
+        if self.process is not None:
+            self.process.stdout.close()
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+            self.process = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+def iter_frames(settings, start_time=None, duration=None, size=None,
+                pix_fmt='rgb24', batch_size=1):
+    """按转换参数（视频文件和帧率）读取帧，不写入文件
+
+    只支持按帧率取帧的整段转换参数；取帧方式、去重和提取区间无法用一个读取进程表示，
+    此时抛出ConversionError，需要读取某段时可用start_time/duration
+    """
+    if settings.mode != MODE_FPS or settings.dedupe or settings.ranges:
+        raise ConversionError("进程内读取帧仅支持按帧率取帧，不支持其他取帧方式、去重和区间提取")
+    return FrameReader(settings.video_file, fps=settings.fps, start_time=start_time,
+                       duration=duration, size=size, pix_fmt=pix_fmt,
+                       batch_size=batch_size)
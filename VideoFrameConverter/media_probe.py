@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+媒体信息探测
+每个文件只执行一次ffprobe（JSON输出），结果按路径+大小+修改时间缓存在内存和磁盘上，
+重新加载或再次转换同一文件时无需重复探测
+"""
+
+import concurrent.futures
+import json
+import os
+import subprocess
+import threading
+
+import app_cache
+
+
+FFPROBE = 'ffprobe'
+
+# 缓存格式版本，结构变化时递增以废弃旧缓存
+CACHE_VERSION = 2
+
+# 帧数估计方法
+COUNT_METADATA = 'metadata'
+COUNT_PACKETS = 'packets'
+COUNT_DURATION = 'duration'
+
+_memory_cache = {}
+_lock = threading.Lock()
+_prefetch_pool = None
+
+
+def popen_kwargs():
+    """子进程公共参数：UTF-8输出，Windows下隐藏命令行窗口"""
+    env = os.environ.copy()
+    env["PYTHONIOENCODING"] = "utf-8"
+    kwargs = {'env': env, 'encoding': 'utf-8', 'errors': 'replace'}
+    if os.name == 'nt':
+        kwargs['creationflags'] = subprocess.CREATE_NO_WINDOW
+    return kwargs
+
+
+def run_probe(cmd, timeout=10):
+    """执行ffprobe命令，返回去除空白的标准输出，失败时返回None"""
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True,
+                                timeout=timeout, **popen_kwargs())
+        if result.returncode == 0 and result.stdout.strip():
+            return result.stdout.strip()
+    except (OSError, subprocess.TimeoutExpired) as e:
+        print(f"ffprobe执行失败：{e}")
+    return None
+
+
+def parse_frame_rate(rate_str):
+    """解析ffprobe的帧率字符串（如30000/1001）"""
+    try:
+        if '/' in rate_str:
+            num, den = rate_str.split('/')
+            if float(den) == 0:
+                return None
+            return float(num) / float(den)
+        return float(rate_str)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(value, default=0.0):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _to_int(value, default=0):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class MediaInfo:
+    """一个媒体文件的探测结果
+
+    fps为视频流的r_frame_rate（无效时用avg_frame_rate），frame_count为容器记录的帧数（未记录时为0），
+    keyframes为相对流起点的关键帧时间（秒），packet_count为视频流数据包数，未探测时均为None
+    """
+
+    FIELDS = ('duration', 'fps', 'frame_count', 'width', 'height', 'codec',
+              'start_time', 'streams', 'format', 'keyframes', 'packet_count')
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.duration = 0.0
+        self.fps = None
+        self.frame_count = 0
+        self.width = 0
+        self.height = 0
+        self.codec = None
+        self.start_time = 0.0
+        self.streams = []
+        self.format = {}
+        self.keyframes = None
+        self.packet_count = None
+
+    @property
+    def video_stream(self):
+        for stream in self.streams:
+            if stream.get('codec_type') == 'video':
+                return stream
+        return None
+
+    @classmethod
+    def from_ffprobe(cls, filepath, data):
+        """由ffprobe -show_format -show_streams的JSON结果构建"""
+        info = cls(filepath)
+        info.streams = data.get('streams', [])
+        info.format = data.get('format', {})
+        info.duration = _to_float(info.format.get('duration'))
+
+        stream = info.video_stream
+        if stream:
+            info.fps = (parse_frame_rate(stream.get('r_frame_rate')) or
+                        parse_frame_rate(stream.get('avg_frame_rate')))
+            info.frame_count = _to_int(stream.get('nb_frames'))
+            info.width = _to_int(stream.get('width'))
+            info.height = _to_int(stream.get('height'))
+            info.codec = stream.get('codec_name')
+            info.start_time = _to_float(stream.get('start_time'))
+            if not info.duration:
+                info.duration = _to_float(stream.get('duration'))
+        return info
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, filepath, data):
+        info = cls(filepath)
+        for field in cls.FIELDS:
+            if field in data:
+                setattr(info, field, data[field])
+        return info
+
+
+def _cache_path(key):
+    return os.path.join(app_cache.cache_dir('probe'), f"{key}.json")
+
+
+def _load_cached(filepath, key):
+    with _lock:
+        info = _memory_cache.get(key)
+    if info is not None:
+        return info
+
+    data = app_cache.load_json(_cache_path(key))
+    if not data or data.get('version') != CACHE_VERSION:
+        return None
+    info = MediaInfo.from_dict(filepath, data.get('info', {}))
+    with _lock:
+        _memory_cache[key] = info
+    return info
+
+
+def _store(key, info):
+    with _lock:
+        _memory_cache[key] = info
+    app_cache.save_json(_cache_path(key), {'version': CACHE_VERSION, 'info': info.to_dict()})
+
+
+def probe_packet_times(filepath, keyframes_only=False, timeout=600):
+    """读取视频流的数据包时间戳（不解码），返回排序后相对流起点的显示时间列表（秒）
+
+    排序后的第n个时间即第n帧的显示时间，可变帧率视频同样准确
+    """
+    output = run_probe([
+        FFPROBE, '-v', 'quiet', '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags:stream=start_time',
+        '-of', 'csv', filepath
+    ], timeout=timeout)
+    if not output:
+        return []
+
+    start_time = 0.0
+    times = []
+    for line in output.splitlines():
+        fields = line.split(',')
+        try:
+            if fields[0] == 'stream':
+                start_time = float(fields[1])
+            elif fields[0] == 'packet' and (not keyframes_only or 'K' in fields[2]):
+                times.append(float(fields[1]))
+        except (IndexError, ValueError):
+            continue
+    return sorted(t - start_time for t in times)
+
+
+def probe_keyframes(filepath, timeout=600):
+    """读取视频流的数据包标记（不解码），返回相对流起点的关键帧时间列表（秒）"""
+    return probe_packet_times(filepath, keyframes_only=True, timeout=timeout)
+
+
+def probe_packet_count(filepath, timeout=600):
+    """统计视频流数据包数（只解复用不解码），失败时返回0"""
+    output = run_probe([
+        FFPROBE, '-v', 'quiet', '-select_streams', 'v:0', '-count_packets',
+        '-show_entries', 'stream=nb_read_packets', '-of', 'csv=p=0', filepath
+    ], timeout=timeout)
+    return _to_int(output.splitlines()[0]) if output else 0
+
+
+def count_source_frames(filepath, allow_packets=True):
+    """分级估计源视频帧数，返回(帧数, 估计方法)
+
+    依次使用：容器记录的帧数 -> 统计数据包（不解码，结果缓存） -> 时长×帧率；
+    allow_packets为False时跳过需要读取整个文件的数据包统计
+    """
+    info = probe(filepath)
+    if info is None:
+        return 0, None
+    if info.frame_count > 0:
+        return info.frame_count, COUNT_METADATA
+
+    if allow_packets:
+        if info.packet_count is None:
+            info.packet_count = probe_packet_count(filepath)
+            try:
+                _store(app_cache.file_key(filepath), info)
+            except OSError:
+                pass
+        if info.packet_count > 0:
+            return info.packet_count, COUNT_PACKETS
+
+    if info.duration > 0 and info.fps:
+        return int(round(info.duration * info.fps)), COUNT_DURATION
+    return 0, None
+
+
+def expected_output_frames(filepath, target_fps, allow_packets=True):
+    """估计以target_fps取帧时的输出帧数（而不是源视频帧数），返回(帧数, 估计方法)"""
+    info = probe(filepath)
+    if info is None or target_fps <= 0:
+        return 0, None
+
+    count, method = count_source_frames(filepath, allow_packets)
+    if count > 0 and info.fps:
+        return int(round(count * target_fps / info.fps)), method
+    if info.duration > 0:
+        return int(round(info.duration * target_fps)), COUNT_DURATION
+    return 0, None
+
+
+def probe(filepath, keyframes=False):
+    """探测媒体信息，优先使用缓存；keyframes为True时同时确保关键帧位置已探测
+
+    ffprobe不可用或文件无法解析时返回None
+    """
+    try:
+        key = app_cache.file_key(filepath)
+    except OSError:
+        return None
+
+    info = _load_cached(filepath, key)
+    if info is None:
+        output = run_probe([
+            FFPROBE, '-v', 'quiet', '-print_format', 'json',
+            '-show_format', '-show_streams', filepath
+        ], timeout=30)
+        if not output:
+            return None
+        try:
+            data = json.loads(output)
+        except ValueError:
+            return None
+        info = MediaInfo.from_ffprobe(filepath, data)
+        _store(key, info)
+
+    if keyframes and info.keyframes is None:
+        info.keyframes = probe_keyframes(filepath)
+        _store(key, info)
+    return info
+
+
+def prefetch(filepaths, max_workers=4):
+    """在后台线程池中预先探测多个文件，返回Future列表"""
+    global _prefetch_pool
+    with _lock:
+        if _prefetch_pool is None:
+            _prefetch_pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix='probe')
+    return [_prefetch_pool.submit(probe, filepath) for filepath in filepaths]
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+预览播放的顺序解码与预读缓冲
+后台线程按顺序解码帧放入有界环形缓冲区，只有跳转时才重新定位
+"""
+
+import collections
+import threading
+
+import cv2
+
+from preview_render import PreviewConverter
+
+
+class FrameRingBuffer:
+    """按帧数和内存大小双重限制的帧缓冲区（线程安全）"""
+
+    def __init__(self, max_frames=32, max_bytes=256 * 1024 * 1024):
+        self.max_frames = max(1, max_frames)
+        self.max_bytes = max_bytes
+        self.bytes_used = 0
+        self._frames = collections.deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def __len__(self):
+        with self._cond:
+            return len(self._frames)
+
+    def _is_full(self, nbytes):
+        if not self._frames:
+            return False
+        return (len(self._frames) >= self.max_frames or
+                self.bytes_used + nbytes > self.max_bytes)
+
+    def put(self, item, nbytes, generation, current_generation):
+        """放入一帧，缓冲区满时阻塞；跳转（generation变化）或关闭时丢弃并返回False"""
+        with self._cond:
+            while (self._is_full(nbytes) and not self._closed and
+                   generation == current_generation()):
+                self._cond.wait()
+            if self._closed or generation != current_generation():
+                return False
+            self._frames.append((item, nbytes))
+            self.bytes_used += nbytes
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """取出最早的一帧，超时或关闭时返回None"""
+        with self._cond:
+            if not self._frames and not self._closed:
+                self._cond.wait(timeout)
+            if not self._frames:
+                return None
+            item, nbytes = self._frames.popleft()
+            self.bytes_used -= nbytes
+            self._cond.notify_all()
+            return item
+
+    def clear(self):
+        """清空缓冲区并唤醒等待的生产者"""
+        with self._cond:
+            self._frames.clear()
+            self.bytes_used = 0
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._frames.clear()
+            self.bytes_used = 0
+            self._cond.notify_all()
+
+
+class SequentialDecoder:
+    """预览用的顺序解码线程
+
+    使用独立的VideoCapture顺序读取，解码结果在本线程中转换为preview_size内的RGB图像，
+    以(帧号, 图像)放入FrameRingBuffer；seek()只在用户跳转时调用，平时不再逐帧定位
+    """
+
+    def __init__(self, filepath, start_frame=0, max_frames=32,
+                 max_bytes=256 * 1024 * 1024, preview_size=(640, 360)):
+        self.filepath = filepath
+        self.preview_size = preview_size
+        self.buffer = FrameRingBuffer(max_frames, max_bytes)
+        self.finished = False
+        self._generation = 0
+        self._seek_to = start_frame
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._running = True
+        self._thread = threading.Thread(target=self._decode_loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def seek(self, frame_number):
+        """跳转到指定帧，清空已缓冲的帧"""
+        with self._lock:
+            self._generation += 1
+            self._seek_to = frame_number
+        self.buffer.clear()
+        self._wake.set()
+
+    def read(self, timeout=0.5):
+        """读取下一帧，返回(帧号, 图像)；暂时没有数据时返回None"""
+        return self.buffer.get(timeout)
+
+    def stop(self):
+        """停止解码线程"""
+        self._running = False
+        self.buffer.close()
+        self._wake.set()
+
+    def _decode_loop(self):
+        """解码循环（在后台线程中运行）"""
+        cap = cv2.VideoCapture(self.filepath)
+        converter = PreviewConverter()
+        try:
+            frame_number = 0
+            generation = -1
+            while self._running:
+                with self._lock:
+                    if self._seek_to is not None:
+                        # 仅在跳转时定位一次
+                        frame_number = self._seek_to
+                        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+                        self._seek_to = None
+                        self.finished = False
+                    generation = self._generation
+
+                if self.finished:
+                    # 已到结尾，等待下一次跳转
+                    self._wake.wait()
+                    self._wake.clear()
+                    continue
+
+                ret, frame = converter.read(cap)
+                if not ret:
+                    self.finished = True
+                    continue
+                frame = converter.convert(frame, self.preview_size)
+
+                if self.buffer.put((frame_number, frame), frame.nbytes,
+                                   generation, lambda: self._generation):
+                    frame_number += 1
+        finally:
+            cap.release()
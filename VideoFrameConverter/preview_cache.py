@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+拖动进度条时的快速预览
+后台建立关键帧索引，解码结果按帧号缓存（LRU，按内存大小淘汰），
+拖动时先显示最近的已缓存帧，再由后台线程解码出精确帧
+"""
+
+import bisect
+import collections
+import threading
+
+import cv2
+
+import media_probe
+from preview_render import PreviewConverter
+
+
+class KeyframeIndex:
+    """关键帧帧号索引，在后台线程中通过ffprobe读取数据包标记建立（结果随探测信息缓存）"""
+
+    def __init__(self, filepath, fps):
+        self.filepath = filepath
+        self.fps = fps
+        self.keyframes = []
+        self.ready = False
+        self._thread = threading.Thread(target=self._build)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _build(self):
+        """建立索引（在后台线程中运行）"""
+        info = media_probe.probe(self.filepath, keyframes=True)
+        times = info.keyframes if info else []
+        self.keyframes = sorted({int(round(t * self.fps)) for t in times if t >= 0})
+        self.ready = True
+
+    def keyframe_before(self, frame_number):
+        """返回不晚于frame_number的最近关键帧；索引未就绪时返回None"""
+        if not self.ready or not self.keyframes:
+            return None
+        i = bisect.bisect_right(self.keyframes, frame_number)
+        return self.keyframes[i - 1] if i > 0 else 0
+
+    def keyframe_after(self, frame_number):
+        """返回晚于frame_number的下一个关键帧，没有时返回None"""
+        if not self.ready:
+            return None
+        i = bisect.bisect_right(self.keyframes, frame_number)
+        return self.keyframes[i] if i < len(self.keyframes) else None
+
+
+class LRUFrameCache:
+    """按帧号缓存预览分辨率图像，总字节数超过上限时淘汰最久未使用的帧（线程安全）
+
+    另存一份有序的帧号列表，拖动时用二分查找最近的已缓存帧
+    """
+
+    def __init__(self, max_bytes=128 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes_used = 0
+        self._frames = collections.OrderedDict()
+        self._keys = []
+        self._lock = threading.Lock()
+
+    def __contains__(self, frame_number):
+        with self._lock:
+            return frame_number in self._frames
+
+    def get(self, frame_number):
+        with self._lock:
+            frame = self._frames.get(frame_number)
+            if frame is not None:
+                self._frames.move_to_end(frame_number)
+            return frame
+
+    def put(self, frame_number, frame):
+        with self._lock:
+            old = self._frames.pop(frame_number, None)
+            if old is not None:
+                self.bytes_used -= old.nbytes
+            else:
+                bisect.insort(self._keys, frame_number)
+            self._frames[frame_number] = frame
+            self.bytes_used += frame.nbytes
+            while self.bytes_used > self.max_bytes and len(self._frames) > 1:
+                evicted_number, evicted = self._frames.popitem(last=False)
+                self.bytes_used -= evicted.nbytes
+                del self._keys[bisect.bisect_left(self._keys, evicted_number)]
+
+    def nearest_before(self, frame_number, lower_bound=0):
+        """返回[lower_bound, frame_number]内帧号最大的已缓存帧(帧号, 图像)，没有时返回None"""
+        with self._lock:
+            i = bisect.bisect_right(self._keys, frame_number)
+            if i == 0 or self._keys[i - 1] < lower_bound:
+                return None
+            best = self._keys[i - 1]
+            self._frames.move_to_end(best)
+            return best, self._frames[best]
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self._keys.clear()
+            self.bytes_used = 0
+
+
+class ScrubDecoder:
+    """拖动进度条用的精确帧解码线程
+
+    只处理最新的请求：从最近的关键帧（或当前解码位置，若在同一GOP内）顺序解码到目标帧，
+    新请求到达时立即放弃旧请求。解码出的关键帧和目标帧转换为预览分辨率的RGB图像后存入缓存，
+    完成后调用on_frame(帧号, 图像)（在后台线程中调用）
+    """
+
+    def __init__(self, filepath, fps, cache, on_frame, preview_size=(640, 360)):
+        self.cache = cache
+        self.on_frame = on_frame
+        self.preview_size = preview_size
+        self.index = KeyframeIndex(filepath, fps)
+        self._filepath = filepath
+        self._target = None
+        self._cond = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._decode_loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def request(self, frame_number):
+        """请求解码指定帧，覆盖尚未完成的旧请求"""
+        with self._cond:
+            self._target = frame_number
+            self._cond.notify()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+
+    def _superseded(self, target):
+        return not self._running or self._target != target
+
+    def _decode_loop(self):
+        """解码循环（在后台线程中运行）"""
+        cap = cv2.VideoCapture(self._filepath)
+        converter = PreviewConverter()
+        position = None  # 下一次read()将得到的帧号
+        try:
+            while True:
+                with self._cond:
+                    while self._running and self._target is None:
+                        self._cond.wait()
+                    if not self._running:
+                        break
+                    target = self._target
+
+                keyframe = self.index.keyframe_before(target)
+                if keyframe is None:
+                    # 索引未就绪，由OpenCV自行定位
+                    start = target
+                elif position is not None and keyframe <= position <= target:
+                    # 同一GOP内向后拖动，继续顺序解码，无需定位
+                    start = position
+                else:
+                    start = keyframe
+
+                if start != position:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+                    position = start
+
+                while position < target and not self._superseded(target):
+                    if not cap.grab():
+                        break
+                    if position == keyframe and keyframe not in self.cache:
+                        ret, frame = converter.retrieve(cap)
+                        if ret:
+                            self.cache.put(position,
+                                           converter.convert(frame, self.preview_size))
+                    position += 1
+
+                if self._superseded(target):
+                    continue
+
+                ret, frame = converter.read(cap)
+                position = position + 1 if ret else None
+                with self._cond:
+                    if self._target == target:
+                        self._target = None
+                if ret:
+                    image = converter.convert(frame, self.preview_size)
+                    self.cache.put(target, image)
+                    self.on_frame(target, image)
+        finally:
+            cap.release()
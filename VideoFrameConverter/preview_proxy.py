@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+预览代理
+大分辨率或全帧内编码（ProRes等）的视频直接预览时解码慢、占内存，
+在后台用FFmpeg转出一份低分辨率、每帧都是关键帧的MJPEG代理文件，
+帧与原视频一一对应（不改帧率、不丢帧），播放器就绪后改读代理，提取仍使用原视频；
+代理按源文件路径+大小+修改时间缓存，再次打开同一视频时直接使用
+"""
+
+import os
+import threading
+
+import app_cache
+import media_probe
+from frame_engine import (FFMPEG, FFmpegProcess, ProgressInfo, build_scale_filter,
+                          ffmpeg_capabilities, sync_args)
+from frame_reader import display_size
+
+
+# 缓存格式版本，代理参数变化时递增以废弃旧代理
+CACHE_VERSION = 1
+
+# 代理画面的长边像素（预览画布约600像素宽）
+PROXY_LONG_EDGE = 640
+
+# MJPEG质量（qscale，2~31，越小质量越高）
+PROXY_QSCALE = 5
+
+PROXY_CODEC = 'mjpeg'
+PROXY_EXT = 'mkv'
+
+# 代理缓存总大小上限，超过时删除最久未使用的代理
+MAX_CACHE_BYTES = 4 * 1024 * 1024 * 1024
+
+
+def needs_proxy(info, long_edge=PROXY_LONG_EDGE):
+    """视频显示尺寸超过代理尺寸时才需要代理"""
+    if info is None or not info.width or not info.height:
+        return False
+    return max(display_size(info)) > long_edge
+
+
+def proxy_path(source, long_edge=PROXY_LONG_EDGE):
+    """源文件对应的代理文件路径（不检查是否存在）"""
+    key = app_cache.file_key(source, CACHE_VERSION, long_edge)
+    return os.path.join(app_cache.cache_dir('proxy'), f"{key}.{PROXY_EXT}")
+
+
+def cached_proxy(source, long_edge=PROXY_LONG_EDGE):
+    """已生成的代理文件路径，没有时返回None；命中时更新修改时间，供清理时判断最近使用"""
+    try:
+        path = proxy_path(source, long_edge)
+        os.utime(path)
+    except OSError:
+        return None
+    return path
+
+
+def build_proxy_command(source, output, long_edge=PROXY_LONG_EDGE):
+    """代理转码命令：只取第一路视频，缩放后逐帧编码为MJPEG，保持原时间戳"""
+    return [
+        FFMPEG, '-hide_banner', '-y',
+        '-i', source,
+        '-map', '0:v:0', '-an', '-sn', '-dn',
+        '-vf', build_scale_filter(long_edge) + ',setsar=1',
+        '-c:v', PROXY_CODEC, '-q:v', str(PROXY_QSCALE), '-pix_fmt', 'yuvj420p',
+    ] + sync_args('passthrough') + ['-f', 'matroska', output]
+
+
+def prune_cache(keep=None, max_bytes=MAX_CACHE_BYTES):
+    """代理缓存超过max_bytes时按修改时间从旧到新删除（keep除外）"""
+    folder = app_cache.cache_dir('proxy')
+    entries = []
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if keep and os.path.normcase(path) == os.path.normcase(keep):
+            continue
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+class ProxyBuilder:
+    """在后台线程中生成预览代理
+
+    on_progress(ProgressInfo)和on_done(代理路径或None)在后台线程中调用；
+    已有缓存时start()后直接以缓存路径回调on_done，cancel()结束FFmpeg并删除未完成的文件
+    """
+
+    def __init__(self, source, total_frames=0, on_done=None, on_progress=None,
+                 long_edge=PROXY_LONG_EDGE):
+        self.source = source
+        self.long_edge = long_edge
+        self.on_done = on_done
+        self.on_progress = on_progress
+        self.progress = ProgressInfo(total_frames)
+        self.path = None
+        self.error = None
+        self.cancelled = False
+        self._process = None
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='preview-proxy')
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        """生成代理（在后台线程中运行）"""
+        path = cached_proxy(self.source, self.long_edge)
+        if path is None and not self.cancelled:
+            path = self._transcode()
+        self.path = path
+        if self.on_done and not self.cancelled:
+            self.on_done(path)
+
+    def _transcode(self):
+        caps = ffmpeg_capabilities()
+        if caps is not None and not caps.has_encoder(PROXY_CODEC):
+            self.error = f"FFmpeg不支持{PROXY_CODEC}编码，无法生成预览代理"
+            return None
+        try:
+            path = proxy_path(self.source, self.long_edge)
+        except OSError as e:
+            self.error = str(e)
+            return None
+        tmp_path = path + '.tmp'
+        cmd = build_proxy_command(self.source, tmp_path, self.long_edge)
+        with self._lock:
+            if self.cancelled:
+                return None
+            try:
+                self._process = FFmpegProcess(cmd, self.progress, self.on_progress)
+            except OSError as e:
+                self.error = str(e)
+                return None
+        self._process.monitor()
+        return_code = self._process.wait()
+        if return_code != 0 or self.cancelled:
+            if not self.cancelled:
+                self.error = self._process.error_output or f"FFmpeg退出码{return_code}"
+            self._remove(tmp_path)
+            return None
+        try:
+            os.replace(tmp_path, path)
+        except OSError as e:
+            self.error = str(e)
+            self._remove(tmp_path)
+            return None
+        prune_cache(keep=path)
+        return path
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def cancel(self):
+        """取消生成（可从其他线程调用），之后不再回调"""
+        with self._lock:
+            self.cancelled = True
+            if self._process:
+                self._process.terminate()
+
+
+def start_proxy(source, total_frames=0, on_done=None, on_progress=None):
+    """需要代理时在后台开始生成并返回ProxyBuilder，源视频已足够小时返回None"""
+    if not needs_proxy(media_probe.probe(source)):
+        return None
+    return ProxyBuilder(source, total_frames, on_done, on_progress).start()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+预览画面渲染
+解码线程直接输出画布分辨率的RGB帧，界面线程只把像素写入复用的PhotoImage，
+画布尺寸变化时才重新分配缓冲区和图像对象；
+解码线程中原始分辨率的解码缓冲区和缩放缓冲区也逐帧复用（PreviewConverter）
+"""
+
+import cv2
+import numpy
+from PIL import Image, ImageTk
+
+
+def fit_size(width, height, max_width, max_height, upscale=False):
+    """保持宽高比缩放到不超过max_width x max_height"""
+    scale = min(max_width / width, max_height / height)
+    if not upscale:
+        scale = min(scale, 1.0)
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def prepare_preview(frame, max_size):
+    """把解码得到的BGR帧缩放到预览尺寸并转换为RGB（不复用缓冲区，单次转换时使用）"""
+    return PreviewConverter().convert(frame, max_size)
+
+
+class PreviewConverter:
+    """解码线程中把BGR帧转换为预览尺寸RGB图像，每个解码线程一个
+
+    read()/retrieve()把帧解码到复用的原始分辨率缓冲区，convert()先缩放到复用的缩放缓冲区，
+    再转换颜色（只处理缩小后的像素）；输出的RGB图像会被帧缓存或环形缓冲区持有，
+    因此每帧新分配，但只有预览尺寸大小
+    """
+
+    def __init__(self):
+        self._decoded = None
+        self._scaled = None
+
+    def read(self, cap):
+        """cap.read()，解码到复用的缓冲区"""
+        ret, frame = cap.read(self._decoded)
+        if ret:
+            self._decoded = frame
+        return ret, frame
+
+    def retrieve(self, cap):
+        """cap.retrieve()，解码到复用的缓冲区"""
+        ret, frame = cap.retrieve(self._decoded)
+        if ret:
+            self._decoded = frame
+        return ret, frame
+
+    def convert(self, frame, max_size):
+        """缩放到max_size内并转换为RGB，返回新的图像"""
+        h, w = frame.shape[:2]
+        size = fit_size(w, h, *max_size, upscale=True)
+        if size != (w, h):
+            shape = (size[1], size[0]) + frame.shape[2:]
+            if self._scaled is None or self._scaled.shape != shape:
+                self._scaled = numpy.empty(shape, dtype=frame.dtype)
+            frame = cv2.resize(frame, size, dst=self._scaled, interpolation=cv2.INTER_AREA
+                               if size[0] < w else cv2.INTER_LINEAR)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+
+class FrameRenderer:
+    """在画布中央显示RGB预览帧
+
+    复用同一个PhotoImage和画布图像项，每帧只做一次像素写入；
+    帧尺寸与显示尺寸不一致时（如刚调整窗口大小）缩放到预分配的缓冲区
+    """
+
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self._photo = None
+        self._image = None
+        self._item = None
+        self._size = None
+        self._canvas_size = None
+        self._scaled = None
+
+    def render(self, frame):
+        """显示一帧RGB图像（在界面线程中调用）"""
+        canvas_width = self.canvas.winfo_width()
+        canvas_height = self.canvas.winfo_height()
+        if frame is None or canvas_width <= 1 or canvas_height <= 1:
+            return
+
+        h, w = frame.shape[:2]
+        size = fit_size(w, h, canvas_width, canvas_height, upscale=True)
+        if size != self._size or (canvas_width, canvas_height) != self._canvas_size:
+            self._allocate(size, canvas_width, canvas_height)
+
+        if (w, h) != size:
+            frame = cv2.resize(frame, size, dst=self._scaled)
+
+        # 原地写入像素，不创建新的图像对象
+        self._image.frombytes(frame)
+        self._photo.paste(self._image)
+
+    def _allocate(self, size, canvas_width, canvas_height):
+        """按显示尺寸重新分配缓冲区、PhotoImage和画布图像项"""
+        self._size = size
+        self._canvas_size = (canvas_width, canvas_height)
+        self._scaled = numpy.empty((size[1], size[0], 3), dtype=numpy.uint8)
+        self._image = Image.new('RGB', size)
+        self._photo = ImageTk.PhotoImage(self._image)
+
+        x = canvas_width // 2
+        y = canvas_height // 2
+        if self._item is None:
+            self._item = self.canvas.create_image(x, y, image=self._photo, anchor='center')
+        else:
+            self.canvas.coords(self._item, x, y)
+            self.canvas.itemconfigure(self._item, image=self._photo)
+
+    def clear(self):
+        """清除画面"""
+        if self._item is not None:
+            self.canvas.delete(self._item)
+        self._item = None
+        self._photo = None
+        self._image = None
+        self._size = None
+        self._canvas_size = None
+        self._scaled = None
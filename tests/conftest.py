@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+"""测试时从VideoFrameConverter文件夹导入各模块（与打包后的运行方式相同）"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                'VideoFrameConverter'))
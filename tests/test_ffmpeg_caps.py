@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""ffmpeg -encoders、-filters、-h long输出的解析"""
+
+from ffmpeg_caps import (THREADS_FRAME, THREADS_SLICE, parse_encoders, parse_filters,
+                         parse_options)
+
+
+ENCODERS_TEXT = """Encoders:
+ V..... = Video
+ A..... = Audio
+ S..... = Subtitle
+ .F.... = Frame-level multithreading
+ ..S... = Slice-level multithreading
+ ...X.. = Codec is experimental
+ ....B. = Supports draw_horiz_band
+ .....D = Supports direct rendering method 1
+ ------
+ V....D a64multi             Multicolor charset for Commodore 64 (codec a64_multi)
+ VFS..D ffv1                 FFmpeg video codec #1
+ V.S... mjpeg                MJPEG (Motion JPEG)
+ V....D png                  PNG (Portable Network Graphics) image
+ VF...D libx264              libx264 H.264 / AVC / MPEG-4 AVC (codec h264)
+ V..... h264_v4l2m2m         V4L2 mem2mem H.264 encoder wrapper (codec h264)
+ A....D aac                  AAC (Advanced Audio Coding)
+ S..... srt                  SubRip subtitle
+"""
+
+FILTERS_TEXT = """Filters:
+  T.. = Timeline support
+  .S. = Slice threading
+  ..C = Command support
+  A = Audio input/output
+  V = Video input/output
+  N = Dynamic number and/or type of input/output
+  | = Source or sink filter
+ ... abuffer           |->A       Buffer audio frames, and make them accessible to the filterchain.
+ TSC scale            V->V       Scale the input video size and/or convert the image format.
+ ... select            V->N       Select video frames to pass in output.
+ TS. mpdecimate        V->V       Remove near-duplicate frames.
+ ... nullsink          V->|       Do absolutely nothing with the input video.
+"""
+
+OPTIONS_TEXT = """Hybrid options:
+-fps_mode           set framerate mode for matching video streams; overrides vsync
+-enc_time_base      set the desired time base hint for output stream (1:1000)
+    -vsync          set video sync method globally; deprecated, use -fps_mode
+-frames[:<stream_spec>] <number>  set the number of frames to output
+"""
+
+
+def test_parse_encoders_video_only():
+    encoders = parse_encoders(ENCODERS_TEXT)
+    assert encoders == {
+        'a64multi': None,
+        'ffv1': THREADS_FRAME,
+        'mjpeg': THREADS_SLICE,
+        'png': None,
+        'libx264': THREADS_FRAME,
+        'h264_v4l2m2m': None,
+    }
+
+
+def test_parse_encoders_skips_legend():
+    assert '=' not in parse_encoders(ENCODERS_TEXT)
+
+
+def test_parse_filters():
+    assert parse_filters(FILTERS_TEXT) == {'abuffer', 'scale', 'select', 'mpdecimate',
+                                           'nullsink'}
+
+
+def test_parse_options():
+    assert parse_options(OPTIONS_TEXT) == {'fps_mode', 'enc_time_base', 'frames'}
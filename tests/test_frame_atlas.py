@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""ShelfPacker的按行排列"""
+
+from frame_atlas import ShelfPacker
+
+
+def test_place_rows_and_wrap():
+    packer = ShelfPacker(100, padding=2)
+    assert packer.place(40, 30) == (2, 2)
+    assert packer.place(40, 20) == (44, 2)
+    # 第三个放不下当前行，换到下一行（按本行最高的矩形计算）
+    assert packer.place(40, 10) == (2, 34)
+    assert (packer.used_width, packer.used_height) == (86, 46)
+
+
+def test_place_returns_none_when_full():
+    packer = ShelfPacker(50, padding=1)
+    assert packer.place(48, 30) == (1, 1)
+    assert packer.place(48, 30) is None
+    packer.reset()
+    assert packer.place(48, 30) == (1, 1)
+
+
+def test_columns_limit():
+    packer = ShelfPacker(1000, columns=2)
+    positions = [packer.place(10, 10) for _ in range(5)]
+    assert positions == [(0, 0), (10, 0), (0, 10), (10, 10), (0, 20)]
+
+
+def test_fits_includes_padding():
+    packer = ShelfPacker(64, padding=4)
+    assert packer.fits(56, 56)
+    assert not packer.fits(57, 10)
+    assert not packer.fits(10, 57)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""frame_engine中不需要FFmpeg的纯函数"""
+
+import pytest
+
+from frame_engine import (MIN_SEGMENT_SECONDS, ConversionError, build_frame_expression,
+                          find_missing_ranges, parse_frame_list, parse_target, plan_segments)
+
+
+def test_parse_frame_list_numbers_and_times():
+    numbers, times = parse_frame_list(["0, 5 12\n7  # 注释 99", 3, "1.5 0:02 3s"])
+    assert numbers == {0, 3, 5, 7, 12}
+    assert times == [1.5, 2.0, 3.0]
+
+
+def test_parse_frame_list_rejects_bad_token():
+    with pytest.raises(ConversionError):
+        parse_frame_list(["1 abc"])
+
+
+def test_build_frame_expression_merges_runs():
+    assert build_frame_expression([1, 2, 3, 7, 9, 10]) == \
+        "between(n,1,3)+eq(n,7)+between(n,9,10)"
+    assert build_frame_expression([4]) == "eq(n,4)"
+    assert build_frame_expression([]) == "0"
+
+
+def test_find_missing_ranges():
+    # 中间缺口有确定帧数，结尾缺口一直处理到视频结尾
+    assert find_missing_ranges({0, 1, 4, 5}, 8) == [(2, 2), (6, None)]
+    # 全部存在时补上结尾，防止估计帧数偏少
+    assert find_missing_ranges({0, 1, 2}, 3) == [(3, None)]
+    assert find_missing_ranges(set(), 5) == [(0, None)]
+
+
+def test_find_missing_ranges_unknown_total():
+    assert find_missing_ranges({0, 1, 3}, 0) == [(2, None)]
+
+
+def test_plan_segments_covers_all_frames():
+    segments = plan_segments(1000, 4, 25)
+    assert segments == [(0, 250), (250, 250), (500, 250), (750, None)]
+
+
+def test_plan_segments_uneven_split():
+    segments = plan_segments(10 * 25 + 3, 5, 25)
+    counts = [count for _, count in segments[:-1]]
+    assert [first for first, _ in segments] == [0, 51, 102, 153, 203]
+    assert counts == [51, 51, 51, 50]
+    assert segments[-1][1] is None
+
+
+def test_plan_segments_limits_short_videos():
+    # 每段至少MIN_SEGMENT_SECONDS秒
+    min_frames = int(MIN_SEGMENT_SECONDS * 25)
+    assert len(plan_segments(min_frames * 2, 8, 25)) == 2
+    assert plan_segments(10, 4, 25) == [(0, None)]
+
+
+def test_parse_target():
+    target = parse_target("folder=thumbs, format=JPG, size=256, quality=80, prefix=t_")
+    assert target.output_folder == "thumbs"
+    assert target.format_ext == "jpg"
+    assert target.size == 256
+    assert target.quality == 80
+    assert target.prefix == "t_"
+    assert target.compression_level is None and target.png_pred is None
+
+
+def test_parse_target_defaults_and_png_options():
+    target = parse_target("folder=small,compression=9,pred=paeth")
+    assert (target.format_ext, target.size, target.quality, target.prefix) == \
+        ("png", 0, None, None)
+    assert target.compression_level == 9
+    assert target.png_pred == "paeth"
+
+
+@pytest.mark.parametrize("text", ["format=png", "folder=", "folder=a,color=red", "folder"])
+def test_parse_target_rejects_bad_text(text):
+    with pytest.raises(ValueError):
+        parse_target(text)
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""ImageStreamSplitter按图片结构切分连续的图片数据"""
+
+import io
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+from frame_engine import ConversionError
+from frame_pack import PNG_SIGNATURE, ImageStreamSplitter
+
+
+def make_frames(count=3):
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, (24 + i, 32, 3), dtype=np.uint8) for i in range(count)]
+
+
+def encode(frame, format_ext):
+    if format_ext == 'webp':
+        data = io.BytesIO()
+        Image.fromarray(frame).save(data, 'WEBP', quality=80)
+        return data.getvalue()
+    ok, data = cv2.imencode('.' + format_ext, frame)
+    assert ok
+    return data.tobytes()
+
+
+class TrickleStream(io.BytesIO):
+    """每次只返回少量数据，模拟管道中数据分多次到达"""
+
+    def read1(self, size=-1):
+        return self.read(min(size, 7) if size > 0 else 7)
+
+
+@pytest.mark.parametrize("format_ext", ['png', 'jpg', 'bmp', 'webp'])
+@pytest.mark.parametrize("stream_type", [io.BytesIO, TrickleStream])
+def test_split_concatenated_images(format_ext, stream_type):
+    images = [encode(frame, format_ext) for frame in make_frames()]
+    parts = list(ImageStreamSplitter(stream_type(b''.join(images)), format_ext))
+    assert parts == images
+
+
+def test_split_png_containing_signature_bytes():
+    # 图片内容中出现PNG文件头等字节时不应切错
+    frame = np.frombuffer((PNG_SIGNATURE + b'IEND\xaeB`\x82') * 12, dtype=np.uint8)
+    frame = np.resize(frame, (16, 16, 3))
+    images = [cv2.imencode('.png', frame, [cv2.IMWRITE_PNG_COMPRESSION, 0])[1].tobytes()] * 2
+    assert list(ImageStreamSplitter(io.BytesIO(b''.join(images)), 'png')) == images
+
+
+@pytest.mark.parametrize("format_ext", ['png', 'jpg', 'bmp', 'webp'])
+def test_truncated_stream_raises(format_ext):
+    images = [encode(frame, format_ext) for frame in make_frames(2)]
+    data = b''.join(images)[:-5]
+    with pytest.raises(ConversionError):
+        list(ImageStreamSplitter(io.BytesIO(data), format_ext))
+
+
+def test_empty_stream():
+    assert list(ImageStreamSplitter(io.BytesIO(b''), 'png')) == []
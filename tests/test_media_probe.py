@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""expected_output_frames按目标帧率换算输出帧数"""
+
+import pytest
+
+import media_probe
+from media_probe import (COUNT_DURATION, COUNT_METADATA, COUNT_PACKETS, MediaInfo,
+                         expected_output_frames)
+
+
+def fake_info(fps=25.0, duration=8.0):
+    info = MediaInfo('video.mp4')
+    info.fps = fps
+    info.duration = duration
+    return info
+
+
+@pytest.fixture
+def fake_probe(monkeypatch):
+    """替换probe和count_source_frames，不执行ffprobe"""
+    state = {'info': fake_info(), 'count': (200, COUNT_METADATA), 'calls': []}
+
+    def count_source_frames(filepath, allow_packets=True):
+        state['calls'].append(allow_packets)
+        return state['count']
+
+    monkeypatch.setattr(media_probe, 'probe', lambda filepath, keyframes=False: state['info'])
+    monkeypatch.setattr(media_probe, 'count_source_frames', count_source_frames)
+    return state
+
+
+def test_scales_source_count_by_fps(fake_probe):
+    assert expected_output_frames('video.mp4', 25) == (200, COUNT_METADATA)
+    assert expected_output_frames('video.mp4', 10) == (80, COUNT_METADATA)
+    assert expected_output_frames('video.mp4', 2.5) == (20, COUNT_METADATA)
+
+
+def test_passes_allow_packets(fake_probe):
+    fake_probe['count'] = (300, COUNT_PACKETS)
+    assert expected_output_frames('video.mp4', 5, allow_packets=False) == (60, COUNT_PACKETS)
+    assert fake_probe['calls'] == [False]
+
+
+def test_falls_back_to_duration(fake_probe):
+    fake_probe['count'] = (0, None)
+    assert expected_output_frames('video.mp4', 12) == (96, COUNT_DURATION)
+    fake_probe['info'] = fake_info(fps=None, duration=4.0)
+    fake_probe['count'] = (100, COUNT_METADATA)
+    assert expected_output_frames('video.mp4', 6) == (24, COUNT_DURATION)
+
+
+def test_unknown(fake_probe):
+    assert expected_output_frames('video.mp4', 0) == (0, None)
+    fake_probe['count'] = (0, None)
+    fake_probe['info'] = fake_info(duration=0.0)
+    assert expected_output_frames('video.mp4', 10) == (0, None)
+    fake_probe['info'] = None
+    assert expected_output_frames('video.mp4', 10) == (0, None)